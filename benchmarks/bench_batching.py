@@ -0,0 +1,89 @@
+"""
+Benchmark de débit : recherches unitaires vs recherches par lot (CPU)
+
+1. Appels directs : search_documents requête par requête vs search_documents_batch
+2. Requêtes concurrentes : une recherche par requête vs micro-batcher
+
+Nécessite une collection peuplée (python -m helpers.init_data).
+
+Usage:
+    python -m benchmarks.bench_batching --queries 512 --batch-size 32 --concurrency 64
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.batcher import QueryBatcher
+from helpers.chromadb import get_rag_system
+
+
+def load_queries(dataset_path: str, count: int):
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        questions = [item['question'] for item in json.load(f)['questions'] if 'question' in item]
+    return [questions[i % len(questions)] for i in range(count)]
+
+
+def bench_direct(rag, queries, batch_size):
+    start = time.perf_counter()
+    for query in queries:
+        rag.search_documents(query, n_results=5)
+    single_qps = len(queries) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        rag.search_documents_batch(queries[i:i + batch_size], n_results=5)
+    batch_qps = len(queries) / (time.perf_counter() - start)
+    return single_qps, batch_qps
+
+
+async def bench_concurrent(rag, queries, concurrency, batcher=None):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query):
+        async with semaphore:
+            if batcher is not None:
+                await batcher.search(query, 5)
+            else:
+                query_embedding = await rag.embed_query_async(query)
+                await rag.search_by_embedding_async(query_embedding, 5)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(query) for query in queries))
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QPS unitaire vs par lot")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--window-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    rag = get_rag_system()
+    # Mesurer le chemin embedding + requête vectorielle, pas le chemin rapide
+    rag.exact_match_enabled = False
+    queries = load_queries(args.dataset, args.queries)
+    rag.search_documents(queries[0])  # chauffe du modèle
+
+    single_qps, batch_qps = bench_direct(rag, queries, args.batch_size)
+    print(f"Appels directs   : unitaire {single_qps:8.1f} QPS | lot de {args.batch_size} {batch_qps:8.1f} QPS "
+          f"(x{batch_qps / single_qps:.2f})")
+
+    unbatched = asyncio.run(bench_concurrent(rag, queries, args.concurrency))
+    batcher = QueryBatcher(rag, window_ms=args.window_ms, max_batch_size=args.batch_size)
+    batched = asyncio.run(bench_concurrent(rag, queries, args.concurrency, batcher))
+    print(f"Concurrence {args.concurrency:<4} : unitaire {unbatched:8.1f} QPS | micro-batch {batched:8.1f} QPS "
+          f"(x{batched / unbatched:.2f}, lot moyen {batcher.stats()['average_batch_size']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Démarrage à froid de l'API : profil des imports et ouverture de l'index
+
+1. Profil des imports de main (python -X importtime, processus neuf) : durée
+   totale, paquets les plus coûteux, et vérification que pandas, ChromaDB et
+   google.generativeai ne sont pas importés au démarrage (ils sont chargés à
+   l'ingestion ou au préchauffage). Code de sortie non nul si un module
+   interdit est importé ou si --max-import-seconds est dépassé.
+2. Ouverture de l'index dans un processus neuf, pour --documents documents
+   synthétiques : PersistentClient ChromaDB (chemin actuel) contre snapshot
+   en un seul fichier (float32 et float16). Mesure l'import, la construction
+   du système RAG, la première recherche (chargement de l'index HNSW ou
+   projection du fichier) et la mémoire (RSS, dont pages anonymes).
+   Avec --drop-caches (root), le cache de pages est vidé avant chaque mesure.
+
+Usage:
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --documents 200000 --drop-caches
+    python -m benchmarks.bench_cold_start --imports-only --max-import-seconds 1.5
+"""
+
+import sys
+import os
+import argparse
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules lourds qui ne doivent pas être chargés à l'import de l'API
+FORBIDDEN_IMPORTS = ("pandas", "chromadb", "google.generativeai")
+
+MODES = {
+    "chroma": {"SNAPSHOT_SERVING_ENABLED": "false", "VECTOR_ENGINE": "chroma"},
+    "snapshot-float32": {"SNAPSHOT_SERVING_ENABLED": "true", "SNAPSHOT_FILE": "float32.snap"},
+    "snapshot-float16": {"SNAPSHOT_SERVING_ENABLED": "true", "SNAPSHOT_FILE": "float16.snap"},
+}
+
+
+def import_profile(top: int):
+    """
+    Imports de main dans un processus neuf : (durée totale, modules les plus coûteux, modules interdits)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True,
+        env={**os.environ, "METRICS_ENABLED": "false"}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), depth, int(cumulative) / 1e6))
+
+    total = next(seconds for name, _, seconds in modules if name == "main")
+    # Modules importés directement par main
+    heaviest = sorted((m for m in modules if m[1] == 1), key=lambda m: m[2], reverse=True)[:top]
+    names = {name for name, _, _ in modules}
+    forbidden = [name for name in FORBIDDEN_IMPORTS if name in names]
+    return total, heaviest, forbidden
+
+
+def process_memory() -> dict:
+    values = {}
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM", "RssAnon", "RssFile"):
+                values[key] = int(value.split()[0]) * 1024
+    return values
+
+
+def child(mode: str, dimension: int):
+    """
+    Processus mesuré : import, construction du système RAG, première recherche
+    """
+    start = time.perf_counter()
+    import numpy as np
+    from helpers.chromadb import get_rag_system
+    imported = time.perf_counter()
+
+    rag = get_rag_system()
+    built = time.perf_counter()
+
+    query = np.random.default_rng(0).standard_normal(dimension).astype(np.float32)
+    results = rag.search_by_embeddings([query.tolist()], 5)
+    searched = time.perf_counter()
+
+    print(json.dumps({
+        "mode": mode,
+        "import": imported - start,
+        "system": built - imported,
+        "first_search": searched - built,
+        "results": len(results[0]),
+        "memory": process_memory()
+    }))
+
+
+def build_collection(workdir: str, documents: int, dimension: int):
+    """
+    Collection ChromaDB de documents synthétiques et ses deux snapshots (float32, float16)
+    """
+    import numpy as np
+    from benchmarks.bench_ingestion import synthetic_records
+    from helpers.chromadb import RAGSystem
+    from helpers.snapshot import export_snapshot
+
+    os.environ["VECTOR_ENGINE"] = "chroma"
+    rag = RAGSystem()
+    ids, texts, metadatas = synthetic_records(documents)
+    rng = np.random.default_rng(0)
+    for start in range(0, documents, 5000):
+        vectors = rng.standard_normal((len(ids[start:start + 5000]), dimension), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        rag.collection.add(
+            ids=ids[start:start + 5000],
+            embeddings=vectors.tolist(),
+            metadatas=metadatas[start:start + 5000],
+            documents=texts[start:start + 5000]
+        )
+    for dtype in ("float32", "float16"):
+        export_snapshot(rag, os.path.join(workdir, f"{dtype}.snap"), dtype=dtype)
+
+
+def drop_caches() -> bool:
+    try:
+        subprocess.run(["sync"], check=True)
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+
+def directory_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(folder, name))
+        for folder, _, names in os.walk(path) for name in names
+    )
+
+
+def measure(mode: str, workdir: str, args) -> dict:
+    env = {
+        **os.environ,
+        **MODES[mode],
+        "PYTHONPATH": ROOT,
+        "EMBEDDING_CACHE_PATH": "",
+        "EXACT_MATCH_ENABLED": "false",
+        "BENCH_FAKE_EMBEDDINGS": "true" if args.fake_embeddings else "false"
+    }
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_cold_start", "--child", mode, "--dimension", str(args.dimension)],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    measured["wall"] = wall
+    return measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil des imports et démarrage à froid de l'index")
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--repeat", type=int, default=3, help="Mesures par mode (médiane)")
+    parser.add_argument("--top", type=int, default=10, help="Modules affichés dans le profil des imports")
+    parser.add_argument("--max-import-seconds", type=float, default=None, help="Budget d'import de main")
+    parser.add_argument("--imports-only", action="store_true")
+    parser.add_argument("--drop-caches", action="store_true", help="Vider le cache de pages avant chaque mesure (root)")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Embedding par hachage (sans modèle ONNX)")
+    parser.add_argument("--child", choices=sorted(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if os.getenv("BENCH_FAKE_EMBEDDINGS", "false").lower() == "true":
+            from chromadb.utils import embedding_functions
+            from benchmarks.bench_ingestion import HashEmbeddingFunction
+            embedding_functions.DefaultEmbeddingFunction = HashEmbeddingFunction
+        child(args.child, args.dimension)
+        return
+
+    total, heaviest, forbidden = import_profile(args.top)
+    print(f"\nImport de main : {total:.3f}s")
+    for name, _, seconds in heaviest:
+        print(f"  {name:<40}{seconds:>8.3f}s")
+    failed = bool(forbidden)
+    if forbidden:
+        print(f"❌ Modules importés au démarrage : {', '.join(forbidden)}")
+    else:
+        print(f"✅ Non importés au démarrage : {', '.join(FORBIDDEN_IMPORTS)}")
+    if args.max_import_seconds is not None and total > args.max_import_seconds:
+        print(f"❌ Import de main au-delà du budget ({args.max_import_seconds:.3f}s)")
+        failed = True
+
+    if not args.imports_only:
+        workdir = tempfile.mkdtemp(prefix="bench_cold_start_")
+        cwd = os.getcwd()
+        try:
+            os.chdir(workdir)
+            print(f"\nConstruction de la collection ({args.documents} documents, dimension {args.dimension})...")
+            build_collection(workdir, args.documents, args.dimension)
+        finally:
+            os.chdir(cwd)
+        try:
+            dropped = args.drop_caches and drop_caches()
+            print(f"Cache de pages : {'vidé avant chaque mesure' if dropped else 'chaud (fichiers récemment écrits)'}")
+            print(f"{'mode':>18}{'disque':>10}{'total':>9}{'import':>9}{'système':>9}{'1re req.':>10}"
+                  f"{'RSS':>10}{'pic RSS':>10}{'anonyme':>10}")
+            sizes = {
+                "chroma": directory_size(os.path.join(workdir, "data", "chroma_langchain_db")),
+                "snapshot-float32": directory_size(os.path.join(workdir, "float32.snap")),
+                "snapshot-float16": directory_size(os.path.join(workdir, "float16.snap")),
+            }
+            for mode in MODES:
+                runs = []
+                for _ in range(args.repeat):
+                    if dropped:
+                        drop_caches()
+                    runs.append(measure(mode, workdir, args))
+                run = sorted(runs, key=lambda r: r["wall"])[len(runs) // 2]
+                memory = run["memory"]
+                print(f"{mode:>18}{sizes[mode] / 1e6:>7.0f} Mo{run['wall']:>8.2f}s{run['import']:>8.2f}s"
+                      f"{run['system']:>8.2f}s{run['first_search']:>9.2f}s"
+                      f"{memory['VmRSS'] / 1e6:>7.0f} Mo{memory['VmHWM'] / 1e6:>7.0f} Mo{memory['RssAnon'] / 1e6:>7.0f} Mo")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
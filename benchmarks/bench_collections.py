@@ -0,0 +1,199 @@
+"""
+Multi-collections : mémoire et latence selon le nombre de collections servies
+
+Crée --max-collections collections synthétiques (--documents documents
+chacune, vecteurs aléatoires) dans une base temporaire, puis, pour chaque
+nombre de collections servies, mesure dans un processus neuf :
+  - toutes chargées (registre non borné) : durée de chargement, RSS et
+    mémoire estimée par le registre, latence d'une recherche (registre + index)
+    avec des collections tirées uniformément
+  - registre borné à --max-loaded collections, accès selon une loi de Zipf
+    (quelques boutiques très actives, une longue traîne) : taux de succès du
+    registre, évictions, latence p50 / p95 / p99 (rechargements compris) et RSS
+Les requêtes sont des vecteurs aléatoires : le coût de l'embedding, identique
+quel que soit le nombre de collections, n'est pas mesuré.
+
+Usage:
+    python -m benchmarks.bench_collections
+    python -m benchmarks.bench_collections --collections 1 10 100 500 --max-collections 500 --max-loaded 64
+"""
+
+import sys
+import os
+import argparse
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def collection_name(i: int) -> str:
+    return f"tenant_{i:04d}"
+
+
+def build_collections(count: int, documents: int, dimension: int):
+    """
+    count collections de documents synthétiques (dans ./data/chroma_langchain_db)
+    """
+    import numpy as np
+    from benchmarks.bench_ingestion import synthetic_records
+    from helpers.chromadb import get_chroma_client
+
+    client, _ = get_chroma_client()
+    rng = np.random.default_rng(0)
+    ids, texts, metadatas = synthetic_records(documents)
+    for i in range(count):
+        collection = client.get_or_create_collection(collection_name(i))
+        vectors = rng.standard_normal((documents, dimension), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        collection.add(ids=ids, embeddings=vectors.tolist(), metadatas=metadatas, documents=texts)
+
+
+def process_memory() -> dict:
+    values = {}
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0]) * 1024
+    return values
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def child(count: int, scenario: str, queries: int, dimension: int, zipf: float):
+    """
+    Processus mesuré : registre, chargement des collections et recherches
+    """
+    import numpy as np
+    from helpers.collection_registry import get_collection_registry
+
+    registry = get_collection_registry()
+    baseline = process_memory()["VmRSS"]
+    names = [collection_name(i) for i in range(count)]
+    rng = np.random.default_rng(1)
+
+    load_seconds = 0.0
+    if scenario == "all":
+        start = time.perf_counter()
+        for name in names:
+            registry.get(name)
+        load_seconds = time.perf_counter() - start
+        picks = rng.integers(0, count, queries)
+    else:
+        # Zipf tronquée : la collection de rang r est tirée avec un poids 1 / r^s
+        weights = 1.0 / np.arange(1, count + 1) ** zipf
+        picks = rng.choice(count, size=queries, p=weights / weights.sum())
+
+    vectors = rng.standard_normal((queries, dimension)).astype(np.float32)
+    latencies = []
+    for pick, vector in zip(picks, vectors):
+        start = time.perf_counter()
+        rag = registry.get(names[pick])
+        rag.search_by_embedding(vector.tolist(), 5)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    stats = registry.stats()
+    memory = process_memory()
+    print(json.dumps({
+        "load_seconds": load_seconds,
+        "rss": memory["VmRSS"] - baseline,
+        "peak": memory["VmHWM"],
+        "estimated": stats["bytes"],
+        "loaded": stats["loaded"],
+        "hit_rate": stats["hit_rate"],
+        "evictions": stats["evictions"],
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99)
+    }))
+
+
+def measure(workdir: str, count: int, scenario: str, args) -> dict:
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "SNAPSHOT_SERVING_ENABLED": "false",
+        "DEFAULT_COLLECTION": collection_name(0),
+        "COLLECTIONS_MAX_LOADED": str(count if scenario == "all" else args.max_loaded),
+        "COLLECTIONS_MAX_BYTES": str(1 << 40),
+        "EMBEDDING_CACHE_PATH": "",
+        "METRICS_ENABLED": "false",
+        "BENCH_FAKE_EMBEDDINGS": "true" if args.fake_embeddings else "false"
+    }
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_collections", "--child", str(count), "--scenario", scenario,
+         "--queries", str(args.queries), "--dimension", str(args.dimension), "--zipf", str(args.zipf)],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire et latence selon le nombre de collections servies")
+    parser.add_argument("--collections", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--max-collections", type=int, default=None, help="Collections créées (défaut: le plus grand nombre mesuré)")
+    parser.add_argument("--documents", type=int, default=500, help="Documents par collection")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--max-loaded", type=int, default=32, help="Taille du registre borné")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Exposant de la loi de Zipf des accès")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Embedding par hachage (sans modèle ONNX)")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--scenario", choices=("all", "zipf"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if os.getenv("BENCH_FAKE_EMBEDDINGS", "false").lower() == "true" or args.fake_embeddings:
+        from chromadb.utils import embedding_functions
+        from benchmarks.bench_ingestion import HashEmbeddingFunction
+        embedding_functions.DefaultEmbeddingFunction = HashEmbeddingFunction
+
+    if args.child:
+        child(args.child, args.scenario, args.queries, args.dimension, args.zipf)
+        return
+
+    total = args.max_collections or max(args.collections)
+    workdir = tempfile.mkdtemp(prefix="bench_collections_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        print(f"\nCréation de {total} collections de {args.documents} documents (dimension {args.dimension})...")
+        start = time.perf_counter()
+        build_collections(total, args.documents, args.dimension)
+        print(f"   {time.perf_counter() - start:.1f}s")
+    finally:
+        os.chdir(cwd)
+
+    try:
+        print(f"\nToutes chargées, accès uniformes ({args.queries} requêtes)")
+        print(f"{'collections':>12}{'chargement':>12}{'RSS':>10}{'estimée':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}")
+        for count in args.collections:
+            run = measure(workdir, count, "all", args)
+            print(f"{count:>12}{run['load_seconds']:>11.2f}s{run['rss'] / 1e6:>7.0f} Mo{run['estimated'] / 1e6:>7.0f} Mo"
+                  f"{run['p50']:>10.2f}{run['p95']:>10.2f}{run['p99']:>10.2f}")
+
+        print(f"\nRegistre borné à {args.max_loaded} collections, accès Zipf (s={args.zipf})")
+        print(f"{'collections':>12}{'chargées':>10}{'succès':>9}{'évictions':>11}{'RSS':>10}"
+              f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}")
+        for count in args.collections:
+            run = measure(workdir, count, "zipf", args)
+            print(f"{count:>12}{run['loaded']:>10}{run['hit_rate']:>9.1%}{run['evictions']:>11}{run['rss'] / 1e6:>7.0f} Mo"
+                  f"{run['p50']:>10.2f}{run['p95']:>10.2f}{run['p99']:>10.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark de concurrence : latence de /health pendant que /chat est saturé
+
+Lance l'application en mémoire (httpx + ASGI) avec un LLM de substitution lent
+et une collection factice, puis compare la latence p50/p99 de /health au repos
+et sous charge. Avec le pipeline asynchrone, le p99 doit rester stable.
+
+Usage:
+    python -m benchmarks.bench_concurrency --concurrency 50 --llm-delay 2.0
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import llm
+from helpers import answer_cache as cache_module
+from helpers import chromadb as rag_module
+from helpers.answer_cache import SemanticAnswerCache
+from helpers.chromadb import RAGSystem
+from llm import LLMGenerator
+from main import app
+
+
+class SlowResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class SlowModel:
+    """
+    LLM de substitution : appel synchrone bloquant, comme generate_content
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def generate_content(self, prompt: str) -> SlowResponse:
+        time.sleep(self.delay)
+        return SlowResponse("Réponse simulée")
+
+
+class FakeEmbeddingFunction:
+    """
+    Embedding factice simulant le coût du modèle ONNX
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def __call__(self, input):
+        time.sleep(self.delay)
+        return [[1.0, 0.0, 0.0] for _ in input]
+
+
+class FakeCollection:
+    """
+    Collection factice (requête HNSW instantanée)
+    """
+
+    def query(self, query_embeddings, n_results):
+        return {
+            "ids": [[f"doc_{i}" for i in range(n_results)]],
+            "documents": [[f"Question: q{i}\nReponse: a{i}" for i in range(n_results)]],
+            "metadatas": [[{"question": f"q{i}", "answer": f"a{i}"} for i in range(n_results)]],
+            "distances": [[0.1 * i for i in range(n_results)]],
+        }
+
+    def count(self) -> int:
+        return 0
+
+
+class FakeRAGSystem(RAGSystem):
+    def __init__(self, delay: float):
+        self.search_delay = delay
+        super().__init__()
+
+    def initialize_chromadb(self):
+        self.client = None
+        self.embedding_function = FakeEmbeddingFunction(self.search_delay)
+        self.collection = FakeCollection()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def sample_health(client, duration: float, interval: float):
+    latencies = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def chat_worker(client, stop: asyncio.Event, counter: list):
+    while not stop.is_set():
+        await client.post("/chat", json={"query": "How can I track my order?"})
+        counter[0] += 1
+
+
+async def run(args):
+    # Injecter les systèmes de substitution dans les singletons
+    rag_module.rag_system = FakeRAGSystem(args.search_delay)
+    generator = LLMGenerator(backend="none")
+    generator.use_model = True
+    generator.model = SlowModel(args.llm_delay)
+    llm.llm_generator = generator
+    # Désactiver le cache de réponses : chaque /chat doit appeler le LLM
+    cache_module.answer_cache = SemanticAnswerCache(max_entries=0)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        idle = await sample_health(client, args.duration, args.interval)
+
+        stop = asyncio.Event()
+        counter = [0]
+        workers = [
+            asyncio.create_task(chat_worker(client, stop, counter))
+            for _ in range(args.concurrency)
+        ]
+        loaded = await sample_health(client, args.duration, args.interval)
+        stop.set()
+        await asyncio.gather(*workers)
+
+    print(f"Concurrence /chat : {args.concurrency} | délai LLM : {args.llm_delay}s")
+    print(f"Requêtes /chat terminées : {counter[0]}")
+    print(f"{'':12}{'p50 (ms)':>12}{'p99 (ms)':>12}{'n':>8}")
+    for label, values in (("repos", idle), ("charge", loaded)):
+        print(f"{label:12}{percentile(values, 50):>12.2f}{percentile(values, 99):>12.2f}{len(values):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence de /health sous charge /chat")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-delay", type=float, default=2.0)
+    parser.add_argument("--search-delay", type=float, default=0.02)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.01)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Rejeu d'un journal de requêtes : tokens du prompt et latence avec l'assemblage du contexte
+
+Indexe le dataset dans une collection temporaire, rejoue les requêtes du journal
+(recherche dense, 5 documents comme /chat) et construit le prompt deux fois :
+  - "brut"   : tous les documents retrouvés (comportement historique)
+  - "filtré" : distance maximale, doublons, budget de tokens et réponse directe
+               si le premier document est décisif (variables CONTEXT_* ou options)
+La latence de bout en bout est estimée : recherche mesurée + appel LLM simulé
+(--llm-base-ms + --llm-ms-per-token × tokens du prompt), nulle si le LLM est évité.
+
+Le journal est un fichier texte (une requête par ligne) ou JSONL {"query": ...} ;
+sans fichier, les requêtes synthétiques de bench_retrieval sont utilisées.
+
+Usage:
+    python -m benchmarks.bench_context
+    python -m benchmarks.bench_context --log queries.jsonl --token-budget 400 --decisive-distance 0.3
+"""
+
+import sys
+import os
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_retrieval import percentile, synthetic_queries
+from helpers.chromadb import RAGSystem
+from helpers.context_builder import ContextBuilder, context_builder_from_env, estimate_tokens
+from helpers.dataset_loader import iter_records
+from llm import LLMGenerator
+
+
+def load_log(path: str):
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return queries
+
+
+def replay(generator, builder, retrievals, args):
+    generator.context_builder = builder
+    tokens = []
+    latencies = []
+    skipped = 0
+    for query, documents, search_ms in retrievals:
+        if builder.decisive_document(documents) is not None:
+            skipped += 1
+            latencies.append(search_ms)
+            continue
+        prompt_tokens = estimate_tokens(generator._build_prompt(query, documents))
+        tokens.append(prompt_tokens)
+        latencies.append(search_ms + args.llm_base_ms + args.llm_ms_per_token * prompt_tokens)
+    return {
+        "tokens": sum(tokens),
+        "mean_tokens": sum(tokens) / len(tokens) if tokens else 0.0,
+        "skipped": skipped,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "mean_latency": sum(latencies) / len(latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens du prompt et latence avec l'assemblage du contexte")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--log", help="Journal de requêtes (texte ou JSONL {query})")
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--max-distance", type=float, help="Remplace CONTEXT_MAX_DISTANCE")
+    parser.add_argument("--dedup-threshold", type=float, help="Remplace CONTEXT_DEDUP_THRESHOLD")
+    parser.add_argument("--token-budget", type=int, help="Remplace CONTEXT_TOKEN_BUDGET")
+    parser.add_argument("--decisive-distance", type=float, help="Remplace CONTEXT_DECISIVE_DISTANCE")
+    parser.add_argument("--llm-base-ms", type=float, default=400.0, help="Latence fixe simulée du LLM")
+    parser.add_argument("--llm-ms-per-token", type=float, default=0.5, help="Coût simulé par token du prompt")
+    args = parser.parse_args()
+
+    faq = list(iter_records(os.path.abspath(args.dataset)))
+    if args.log:
+        queries = load_log(args.log)
+    else:
+        queries = [item["query"] for item in synthetic_queries(faq)]
+
+    filtered = context_builder_from_env()
+    for option in ("max_distance", "dedup_threshold", "token_budget", "decisive_distance"):
+        if getattr(args, option) is not None:
+            setattr(filtered, option, getattr(args, option))
+
+    # Collection temporaire : RAGSystem utilise ./data/chroma_langchain_db
+    workdir = tempfile.mkdtemp(prefix="bench_context_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        rag = RAGSystem(collection_name="bench_context")
+        ids, documents, metadatas = rag.build_records(pd.DataFrame(faq, columns=["Questions", "Answers"]))
+        rag.write_records(ids, documents, metadatas, workers=1)
+        rag.load_vector_engine()
+
+        retrievals = []
+        for query in queries:
+            start = time.perf_counter()
+            results = rag.search_documents(query, n_results=args.n_results, mode="dense")
+            retrievals.append((query, results, (time.perf_counter() - start) * 1000))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    generator = LLMGenerator(backend="none")
+    baseline = replay(generator, ContextBuilder(), retrievals, args)
+    result = replay(generator, filtered, retrievals, args)
+
+    print(f"\nRequêtes rejouées : {len(retrievals)} | documents par requête : {args.n_results}")
+    print(f"Filtres : distance max {filtered.max_distance} | doublons {filtered.dedup_threshold} | "
+          f"budget {filtered.token_budget} tokens | décisif {filtered.decisive_distance}")
+    print(f"{'':10}{'tokens':>12}{'moy./prompt':>14}{'LLM évité':>12}{'p50 (ms)':>12}{'p95 (ms)':>12}{'moy. (ms)':>12}")
+    for label, stats in (("brut", baseline), ("filtré", result)):
+        print(f"{label:<10}{stats['tokens']:>12}{stats['mean_tokens']:>14.1f}{stats['skipped']:>12}"
+              f"{stats['p50']:>12.1f}{stats['p95']:>12.1f}{stats['mean_latency']:>12.1f}")
+
+    reduction = 1 - result["tokens"] / baseline["tokens"] if baseline["tokens"] else 0.0
+    speedup = 1 - result["mean_latency"] / baseline["mean_latency"]
+    print(f"\nRéduction des tokens du prompt : {reduction:.1%} | latence moyenne : -{speedup:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Regroupement des quasi-doublons : taille de la collection, latence et diversité
+
+Indexe le dataset deux fois dans une base temporaire : tel quel, puis avec
+le regroupement des quasi-doublons (MinHash des réponses + similarité des
+embeddings). Rapporte la taille de la collection et des index, la durée du
+regroupement, les groupes formés, puis rejoue un jeu de requêtes étiquetées
+(JSONL {"query", "question"} ou jeu synthétique de benchmarks.bench_retrieval) :
+  - recall@k (une formulation regroupée compte pour son document canonique)
+  - latence p50 / p95 de la recherche
+  - diversité du top-k : réponses quasi identiques à une réponse mieux classée
+    (Jaccard des 3-grammes >= --answer-threshold) et réponses distinctes
+
+Avec --fake-embeddings, les embeddings par hachage ne rapprochent pas les
+paraphrases : le seuil des embeddings vaut 0 sauf --embedding-threshold.
+
+Usage:
+    python -m benchmarks.bench_dedup
+    python -m benchmarks.bench_dedup --answer-threshold 0.8 --embedding-threshold 0.92 --k 5
+    python -m benchmarks.bench_dedup --fake-embeddings --mode hybrid
+"""
+
+import sys
+import os
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_retrieval import percentile, synthetic_queries
+from helpers.dataset_loader import iter_records
+from helpers.dedup import MinHasher
+
+
+def index(rag, faq, dedup: bool, settings: dict) -> dict:
+    """
+    Écrit le dataset dans la collection, avec ou sans regroupement ; durées et résumé
+    """
+    ids, documents, metadatas = rag.build_records(pd.DataFrame(faq, columns=["Questions", "Answers"]))
+    rag.dedup_settings = {**settings, "enabled": dedup}
+    start = time.perf_counter()
+    summary = {"rows": len(ids), "documents": len(ids), "groups": 0, "largest_group": 1, "seconds": 0.0}
+    with rag.make_ingestor(workers=1) as ingestor:
+        embeddings = None
+        if dedup:
+            ids, documents, metadatas, embeddings, summary = rag.collapse_near_duplicates(
+                ids, documents, metadatas, ingestor
+            )
+        ingestor.ingest(ids, documents, metadatas, on_batch=rag.index_batch, embeddings=embeddings)
+    rag.load_vector_engine()
+    summary["ingest_seconds"] = time.perf_counter() - start
+    return summary
+
+
+alternates_cache = {}
+
+
+def rag_alternates(rag, doc_id: str) -> list:
+    """
+    Formulations regroupées sous un document (métadonnée alternate_questions)
+    """
+    key = (rag.collection_name, doc_id)
+    if key not in alternates_cache:
+        metadata = rag.collection.get(ids=[doc_id], include=["metadatas"])["metadatas"][0]
+        alternates_cache[key] = metadata.get("alternate_questions", "").splitlines()
+    return alternates_cache[key]
+
+
+def evaluate(rag, labeled, k: int, mode: str, answer_threshold: float) -> dict:
+    """
+    Recall@k, latences et redondance du top-k sur le jeu étiqueté
+    """
+    hasher = MinHasher()
+    shingles = {}
+
+    def answer_shingles(answer):
+        if answer not in shingles:
+            shingles[answer] = set(hasher.shingles(answer).tolist())
+        return shingles[answer]
+
+    hits = redundant = distinct = 0
+    latencies = []
+    for item in labeled:
+        start = time.perf_counter()
+        results = rag.search_documents(item["query"], n_results=k, mode=mode, exact_match=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        phrasings = [{doc["question"], *rag_alternates(rag, doc["id"])} for doc in results]
+        hits += any(item["question"] in questions for questions in phrasings)
+        kept = []
+        for doc in results:
+            terms = answer_shingles(doc["answer"])
+            if any(len(terms & other) / max(1, len(terms | other)) >= answer_threshold for other in kept):
+                redundant += 1
+            else:
+                kept.append(terms)
+        distinct += len(kept)
+
+    return {
+        "recall": hits / len(labeled),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "redundant": redundant / len(labeled),
+        "distinct": distinct / len(labeled)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Taille, latence et diversité avec et sans regroupement des quasi-doublons")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--queries", help="Jeu étiqueté JSONL {query, question}")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--mode", default="dense", choices=("dense", "lexical", "hybrid"))
+    parser.add_argument("--answer-threshold", type=float, default=0.7, help="Jaccard MinHash minimal des réponses")
+    parser.add_argument("--embedding-threshold", type=float, default=None, help="Cosinus minimal des embeddings (défaut: 0.9)")
+    parser.add_argument("--show-groups", type=int, default=10, help="Groupes affichés")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Embedding par hachage (sans modèle ONNX)")
+    args = parser.parse_args()
+
+    if args.embedding_threshold is None:
+        args.embedding_threshold = 0.0 if args.fake_embeddings else 0.9
+    if args.fake_embeddings:
+        from chromadb.utils import embedding_functions
+        from benchmarks.bench_ingestion import HashEmbeddingFunction
+        embedding_functions.DefaultEmbeddingFunction = HashEmbeddingFunction
+
+    faq = list(iter_records(os.path.abspath(args.dataset)))
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            labeled = [json.loads(line) for line in f if line.strip()]
+    else:
+        labeled = synthetic_queries(faq)
+
+    # Collections temporaires : RAGSystem utilise ./data/chroma_langchain_db
+    os.environ["RERANK_ENABLED"] = "false"
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    from helpers.chromadb import RAGSystem
+    from helpers.dedup import dedup_settings_from_env
+
+    settings = {
+        **dedup_settings_from_env(),
+        "answer_threshold": args.answer_threshold,
+        "embedding_threshold": args.embedding_threshold
+    }
+    workdir = tempfile.mkdtemp(prefix="bench_dedup_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        runs = {}
+        for label, dedup in (("tel quel", False), ("regroupé", True)):
+            rag = RAGSystem(collection_name="bench_dedup" if dedup else "bench_plain")
+            summary = index(rag, faq, dedup, settings)
+            memory = rag.memory_bytes()
+            runs[label] = (rag, summary, memory, evaluate(rag, labeled, args.k, args.mode, args.answer_threshold))
+
+        plain, grouped = runs["tel quel"][1], runs["regroupé"][1]
+        print(f"\nLignes : {plain['rows']} | documents : {plain['documents']} -> {grouped['documents']} "
+              f"(-{1 - grouped['documents'] / plain['documents']:.1%}) | groupes : {grouped['groups']} "
+              f"(plus grand : {grouped['largest_group']}) | regroupement : {grouped['seconds'] * 1000:.0f} ms")
+        print(f"Seuils : Jaccard des réponses >= {args.answer_threshold}, cosinus des embeddings >= {args.embedding_threshold}")
+
+        print(f"\n{len(labeled)} requêtes, mode {args.mode}, top {args.k}")
+        print(f"{'':>10}{'documents':>11}{'index':>10}{'ingestion':>11}{f'recall@{args.k}':>10}"
+              f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'redondants':>12}{'distincts':>11}")
+        for label, (rag, summary, memory, result) in runs.items():
+            print(f"{label:>10}{summary['documents']:>11}{memory / 1e6:>7.2f} Mo{summary['ingest_seconds']:>10.2f}s"
+                  f"{result['recall']:>10.3f}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+                  f"{result['redundant']:>12.2f}{result['distinct']:>11.2f}")
+
+        rag = runs["regroupé"][0]
+        groups = rag.collection.get(where={"group_size": {"$gt": 1}}, include=["metadatas"])["metadatas"]
+        if groups and args.show_groups:
+            print(f"\nGroupes ({min(len(groups), args.show_groups)}/{len(groups)}) :")
+            for metadata in groups[:args.show_groups]:
+                print(f"  ✅ {metadata['question']}")
+                for question in metadata["alternate_questions"].splitlines():
+                    print(f"     ↳ {question}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Comparaison des backends d'embedding : débit, latence, recall et cache persistant
+
+Pour chaque backend (default, onnx, onnx-int8) :
+  - débit d'embedding des documents du dataset (textes/s), par lots de --batch-size
+  - latence d'une requête seule (p50, p95)
+  - recall@k de la recherche exhaustive sur les requêtes synthétiques de bench_retrieval
+  - écart au backend par défaut (similarité cosinus moyenne des vecteurs)
+Puis, pour le premier backend, le débit avec le cache persistant à froid
+(tous les textes calculés) et à chaud (relecture, comme une réingestion).
+
+Usage:
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --backends onnx onnx-int8 --threads 2 --batch-size 64
+"""
+
+import sys
+import os
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chromadb.utils import embedding_functions
+
+from benchmarks.bench_ingestion import HashEmbeddingFunction
+from benchmarks.bench_retrieval import percentile, synthetic_queries
+from helpers.chromadb import RAGSystem, document_id
+from helpers.dataset_loader import iter_records
+from helpers.embeddings import BACKENDS, EmbeddingFunctionFactory
+
+
+def embed_all(embedding_function, texts, batch_size: int) -> np.ndarray:
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(embedding_function(texts[i:i + batch_size]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def recall_at_k(document_vectors, ids, query_vectors, labeled, k: int) -> float:
+    distances = (
+        (query_vectors ** 2).sum(axis=1)[:, None]
+        - 2 * query_vectors @ document_vectors.T
+        + (document_vectors ** 2).sum(axis=1)[None, :]
+    )
+    top = np.argsort(distances, axis=1)[:, :k]
+    hits = sum(
+        document_id(item["question"]) in {ids[row] for row in rows}
+        for item, rows in zip(labeled, top)
+    )
+    return hits / len(labeled)
+
+
+def evaluate(factory, documents, ids, labeled, args):
+    embedding_function = factory()
+    # Chargement du modèle hors mesure
+    embedding_function(["warm-up"])
+
+    start = time.perf_counter()
+    document_vectors = embed_all(embedding_function, documents, args.batch_size)
+    throughput = len(documents) / (time.perf_counter() - start)
+
+    latencies = []
+    query_vectors = []
+    for item in labeled:
+        start = time.perf_counter()
+        query_vectors.append(embedding_function([item["query"]])[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "vectors": document_vectors,
+        "throughput": throughput,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "recall": recall_at_k(document_vectors, ids, np.asarray(query_vectors, dtype=np.float32), labeled, args.k)
+    }
+
+
+def cache_passes(backend: str, documents, args):
+    """
+    Débit à froid puis à chaud avec le cache persistant (fichier temporaire)
+    """
+    directory = tempfile.mkdtemp(prefix="bench_embeddings_")
+    try:
+        results = []
+        for _ in range(2):
+            factory = EmbeddingFunctionFactory(
+                backend, args.threads, args.batch_size, cache_path=os.path.join(directory, "cache.sqlite")
+            )
+            embedding_function = factory()
+            start = time.perf_counter()
+            embed_all(embedding_function, documents, args.batch_size)
+            results.append(len(documents) / (time.perf_counter() - start))
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit, latence et recall des backends d'embedding")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--threads", type=int, default=0, help="Threads intra-op ONNX (0 = défaut)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=5, help="Copies du dataset embeddées pour la mesure de débit")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--fake-embeddings", action="store_true", help="Embedding par hachage pour le backend default")
+    args = parser.parse_args()
+
+    if args.fake_embeddings:
+        embedding_functions.DefaultEmbeddingFunction = HashEmbeddingFunction
+
+    faq = list(iter_records(os.path.abspath(args.dataset)))
+    ids, documents, _ = RAGSystem.build_records(pd.DataFrame(faq, columns=["Questions", "Answers"]))
+    labeled = synthetic_queries(faq)
+    # Textes distincts pour le débit : copies numérotées du dataset
+    corpus = [f"{document} ({copy})" if copy else document for copy in range(args.repeat) for document in documents]
+
+    print(f"\nDocuments : {len(documents)} (x{args.repeat} pour le débit) | requêtes : {len(labeled)} | "
+          f"threads : {args.threads or 'défaut'} | lot : {args.batch_size}")
+    print(f"{'backend':>10}{'textes/s':>12}{'p50 (ms)':>11}{'p95 (ms)':>11}{f'recall@{args.k}':>11}{'cos/défaut':>12}")
+
+    reference = None
+    available = []
+    for backend in args.backends:
+        factory = EmbeddingFunctionFactory(backend, args.threads, args.batch_size)
+        try:
+            result = evaluate(factory, documents, ids, labeled, args)
+            start = time.perf_counter()
+            embed_all(factory(), corpus, args.batch_size)
+            result["throughput"] = len(corpus) / (time.perf_counter() - start)
+        except Exception as e:
+            print(f"{backend:>10}   indisponible : {e}")
+            continue
+        available.append(backend)
+
+        vectors = result["vectors"]
+        if backend == "default":
+            reference = vectors
+        agreement = "-"
+        if reference is not None and reference.shape == vectors.shape:
+            cosine = (reference * vectors).sum(axis=1) / (
+                np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1) + 1e-12
+            )
+            agreement = f"{cosine.mean():.4f}"
+        print(f"{backend:>10}{result['throughput']:>12.1f}{result['p50']:>11.2f}{result['p95']:>11.2f}"
+              f"{result['recall']:>11.3f}{agreement:>12}")
+
+    if available:
+        cold, warm = cache_passes(available[0], corpus, args)
+        print(f"\nCache persistant ({available[0]}) : {cold:.1f} textes/s à froid, "
+              f"{warm:.1f} textes/s à chaud (x{warm / cold:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark du chemin rapide par question normalisée
+
+Rejoue un journal de requêtes (un fichier texte, une requête par ligne) contre
+l'index des questions et rapporte le taux de succès et la latence de recherche.
+Sans journal, un journal synthétique est généré depuis le dataset : question
+exacte, variante casse/ponctuation et reformulation (qui doit manquer).
+
+Usage:
+    python -m benchmarks.bench_exact_match
+    python -m benchmarks.bench_exact_match --log queries.txt --compare
+"""
+
+import sys
+import os
+import argparse
+import json
+import random
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.question_index import QuestionIndex
+
+
+def load_faq(dataset_path: str):
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return [item for item in data['questions'] if 'question' in item and 'answer' in item]
+
+
+def synthetic_log(faq, seed: int = 0):
+    rng = random.Random(seed)
+    queries = []
+    for item in faq:
+        question = item['question']
+        queries.append(question)
+        queries.append(question.upper().rstrip('?') + ' ?!')
+        queries.append(f"Hello, {question.lower()} Thanks")
+    rng.shuffle(queries)
+    return queries
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Taux de succès et latence du chemin rapide")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--log", help="Journal de requêtes (une par ligne)")
+    parser.add_argument("--compare", action="store_true",
+                        help="Mesurer aussi la recherche vectorielle (collection peuplée requise)")
+    args = parser.parse_args()
+
+    faq = load_faq(args.dataset)
+    index = QuestionIndex()
+    index.add_many(
+        [f"doc_{i}" for i in range(len(faq))],
+        [{"question": item['question'], "answer": item['answer']} for item in faq]
+    )
+
+    if args.log:
+        with open(args.log, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = synthetic_log(faq)
+
+    hits = 0
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        result = index.lookup(query)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        hits += result is not None
+
+    print(f"Requêtes rejouées : {len(queries)} | questions indexées : {len(index)}")
+    print(f"Taux de succès : {hits / len(queries):.1%}")
+    print(f"Latence index  : p50 {percentile(latencies, 50):.1f} µs | p99 {percentile(latencies, 99):.1f} µs")
+
+    if args.compare:
+        from helpers.chromadb import get_rag_system
+
+        rag = get_rag_system()
+        rag.exact_match_enabled = False
+        vector_latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            rag.search_documents(query, n_results=5)
+            vector_latencies.append((time.perf_counter() - start) * 1e6)
+        print(f"Latence vecteur: p50 {percentile(vector_latencies, 50):.1f} µs | "
+              f"p99 {percentile(vector_latencies, 99):.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
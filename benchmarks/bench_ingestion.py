@@ -0,0 +1,103 @@
+"""
+Benchmark du débit d'ingestion en fonction de la taille du dataset
+
+Pour chaque taille, un dataset synthétique est ingéré dans une collection
+temporaire avec :
+  - l'ancien chemin (collection.add par lots de 50, embedding séquentiel implicite)
+  - le pipeline BulkIngestor avec 1 processus
+  - le pipeline BulkIngestor avec N processus
+
+Usage:
+    python -m benchmarks.bench_ingestion --sizes 1000 5000 20000 --workers 4
+    python -m benchmarks.bench_ingestion --fake-embeddings   # plafond d'écriture ChromaDB seul
+"""
+
+import sys
+import os
+import argparse
+import hashlib
+import shutil
+import tempfile
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+from chromadb.utils import embedding_functions
+
+from helpers.chromadb import content_hash, document_id
+from helpers.ingestion import BulkIngestor
+
+
+class HashEmbeddingFunction:
+    """
+    Embedding déterministe quasi gratuit, pour mesurer le seul coût d'écriture
+    """
+
+    def __call__(self, input):
+        embeddings = []
+        for text in input:
+            digest = hashlib.sha256(text.encode("utf-8")).digest()
+            embeddings.append([b / 255 for b in digest[:32]])
+        return embeddings
+
+
+def synthetic_records(size: int):
+    ids, documents, metadatas = [], [], []
+    for i in range(size):
+        question = f"How do I handle request number {i} for product {i % 997}?"
+        answer = f"For request {i}, open your account, select the order and follow step {i % 7}."
+        ids.append(document_id(question))
+        documents.append(f"Question: {question}\nReponse: {answer}")
+        metadatas.append({
+            "question": question,
+            "answer": answer,
+            "index": i,
+            "content_hash": content_hash(question, answer)
+        })
+    return ids, documents, metadatas
+
+
+def run_legacy(collection, ids, documents, metadatas):
+    start = time.perf_counter()
+    for i in range(0, len(ids), 50):
+        collection.add(ids=ids[i:i+50], documents=documents[i:i+50], metadatas=metadatas[i:i+50])
+    return len(ids) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit d'ingestion vs taille du dataset")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    factory = HashEmbeddingFunction if args.fake_embeddings else embedding_functions.DefaultEmbeddingFunction
+
+    print(f"{'lignes':>8}{'ancien (l/s)':>16}{'1 processus':>16}{f'{args.workers} processus':>16}")
+    for size in args.sizes:
+        ids, documents, metadatas = synthetic_records(size)
+        results = []
+        for mode in ("legacy", 1, args.workers):
+            if mode == "legacy" and args.skip_legacy:
+                results.append(float("nan"))
+                continue
+            path = tempfile.mkdtemp(prefix="bench_ingestion_")
+            try:
+                client = chromadb.PersistentClient(path=path)
+                collection = client.create_collection("bench_ingestion", embedding_function=factory())
+                if mode == "legacy":
+                    results.append(run_legacy(collection, ids, documents, metadatas))
+                else:
+                    ingestor = BulkIngestor(collection, factory, workers=mode, batch_size=args.batch_size)
+                    results.append(ingestor.ingest(ids, documents, metadatas)["rows_per_second"])
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+        print(f"{size:>8}{results[0]:>16.1f}{results[1]:>16.1f}{results[2]:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Rafale de questions identiques sur /chat : regroupement, limite de concurrence et délai
+
+Scénario « campagne promo » : --requests requêtes /chat simultanées réparties
+sur --distinct questions, avec un faux LLM asynchrone de latence fixe. Compare
+le nombre d'appels LLM, la latence p50/p99 et la durée totale avec et sans
+regroupement (single-flight).
+
+Scénario « ralentissement » : le faux LLM répond après --slow-delay secondes,
+au-delà du délai maximal --timeout ; chaque requête doit obtenir la réponse de
+secours peu après le délai au lieu de rester bloquée.
+
+Usage:
+    python -m benchmarks.bench_llm_coalescing --requests 500 --distinct 5 --llm-delay 0.5
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import llm
+from benchmarks.bench_concurrency import FakeRAGSystem, percentile
+from benchmarks.bench_streaming import FakeStreamingModel
+from helpers import answer_cache as cache_module
+from helpers import chromadb as rag_module
+from helpers.answer_cache import SemanticAnswerCache
+from helpers.llm_guard import LLMCallGuard
+from llm import LLMGenerator
+from main import app
+
+
+class CountingModel(FakeStreamingModel):
+    """
+    Faux LLM asynchrone qui compte les appels reçus
+    """
+
+    def __init__(self, delay: float):
+        super().__init__(delay, tokens=20, token_delay=0.0)
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        return await super().generate_content_async(prompt, stream=stream)
+
+
+async def burst(args, llm_delay: float, coalescing: bool, timeout: float):
+    model = CountingModel(llm_delay)
+    generator = LLMGenerator(backend="none")
+    generator.use_model = True
+    generator.model = model
+    generator.guard = LLMCallGuard(
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        timeout_seconds=timeout,
+        coalescing=coalescing
+    )
+    llm.llm_generator = generator
+
+    latencies = []
+    fallbacks = 0
+
+    async def one(client, i):
+        nonlocal fallbacks
+        start = time.perf_counter()
+        response = await client.post("/chat", json={"query": f"Promo question {i % args.distinct}?"})
+        latencies.append((time.perf_counter() - start) * 1000)
+        fallbacks += response.json()["response"].startswith("Basé sur notre FAQ")
+
+    transport = httpx.ASGITransport(app=app)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[one(client, i) for i in range(args.requests)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        "llm_calls": model.calls,
+        "fallbacks": fallbacks,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "seconds": elapsed,
+        "stats": generator.guard.stats()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regroupement et délai des appels LLM")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=5)
+    parser.add_argument("--llm-delay", type=float, default=0.5)
+    parser.add_argument("--slow-delay", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=1000)
+    args = parser.parse_args()
+
+    rag_module.rag_system = FakeRAGSystem(0.0)
+    cache_module.answer_cache = SemanticAnswerCache(max_entries=0)
+
+    print(f"Rafale : {args.requests} requêtes /chat, {args.distinct} questions distinctes, "
+          f"LLM {args.llm_delay}s, concurrence LLM {args.max_concurrency}")
+    print(f"{'':26}{'appels LLM':>12}{'secours':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}{'durée (s)':>12}")
+    scenarios = (
+        ("sans regroupement", args.llm_delay, False, None),
+        ("avec regroupement", args.llm_delay, True, None),
+        (f"ralentissement {args.slow_delay}s", args.slow_delay, True, args.timeout),
+    )
+    for label, delay, coalescing, timeout in scenarios:
+        result = asyncio.run(burst(args, delay, coalescing, timeout))
+        print(f"{label:<26}{result['llm_calls']:>12}{result['fallbacks']:>10}{result['p50']:>12.1f}"
+              f"{result['p99']:>12.1f}{result['seconds']:>12.2f}")
+        print(f"   └ regroupement {result['stats']['coalescing_ratio']:.1%} | "
+              f"délais dépassés {result['stats']['timeouts']} | refusés {result['stats']['rejected']}")
+
+
+if __name__ == "__main__":
+    main()
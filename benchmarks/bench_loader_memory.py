@@ -0,0 +1,121 @@
+"""
+Vérification de la mémoire du chargement en flux du dataset
+
+Génère des fichiers JSON, JSONL et CSV de tailles croissantes, puis mesure
+dans un sous-processus le pic de RSS pendant la lecture par morceaux
+(iter_dataframes + build_records, comme l'ingestion --sync). Le pic doit
+rester à peu près constant quand la taille du fichier augmente ; le script
+échoue (code 1) si le plus gros fichier dépasse le plus petit de plus de
+--tolerance. L'ancien chargement complet (json.load) est mesuré à titre de
+comparaison.
+
+Usage:
+    python -m benchmarks.bench_loader_memory --sizes-mb 50 200
+    python -m benchmarks.bench_loader_memory --sizes-mb 500 2000 --formats jsonl
+"""
+
+import sys
+import os
+import argparse
+import json
+import resource
+import subprocess
+import tempfile
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def generate(path: str, file_format: str, size_mb: int):
+    target = size_mb * 1024 * 1024
+    written = 0
+    i = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        if file_format == "json":
+            f.write('{"questions": [\n')
+        elif file_format == "csv":
+            f.write('question,answer\n')
+        while written < target:
+            question = f"How do I return item {i} bought in store {i % 113}?"
+            answer = f"Item {i} can be returned within 30 days. " + "Keep the receipt. " * 8
+            if file_format == "json":
+                line = ("," if i else "") + json.dumps({"question": question, "answer": answer}) + "\n"
+            elif file_format == "jsonl":
+                line = json.dumps({"question": question, "answer": answer}) + "\n"
+            else:
+                line = f'"{question}","{answer}"\n'
+            f.write(line)
+            written += len(line)
+            i += 1
+        if file_format == "json":
+            f.write(']}\n')
+
+
+def child(path: str, mode: str):
+    """
+    Exécuté dans un sous-processus : lit le fichier et affiche le pic de RSS (Mo)
+    """
+    rows = 0
+    if mode == "stream":
+        from helpers.chromadb import RAGSystem
+        from helpers.dataset_loader import iter_dataframes
+
+        seen = set()
+        for df in iter_dataframes(path, chunk_size=10000):
+            ids, _, _ = RAGSystem.build_records(df, seen)
+            rows += len(ids)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = len(json.load(f)['questions'])
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"rows": rows, "peak_mb": round(peak_kb / 1024, 1)}))
+
+
+def measure(path: str, mode: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_loader_memory", "--child", path, mode],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pic de RSS du chargement en flux")
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--formats", nargs="+", default=["json", "jsonl", "csv"])
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="bench_loader_") as tmp:
+        print(f"{'format':>8}{'taille':>10}{'lignes':>12}{'pic flux':>12}{'pic json.load':>16}")
+        for file_format in args.formats:
+            peaks = []
+            for size_mb in args.sizes_mb:
+                path = os.path.join(tmp, f"dataset_{size_mb}.{file_format}")
+                generate(path, file_format, size_mb)
+                streamed = measure(path, "stream")
+                full = measure(path, "full")["peak_mb"] if file_format == "json" else None
+                peaks.append(streamed["peak_mb"])
+                full_text = f"{full:.1f} Mo" if full is not None else "-"
+                print(f"{file_format:>8}{size_mb:>7} Mo{streamed['rows']:>12}"
+                      f"{streamed['peak_mb']:>9.1f} Mo{full_text:>16}")
+                os.remove(path)
+            if peaks[-1] > peaks[0] * args.tolerance:
+                print(f"❌ {file_format}: le pic de RSS augmente avec la taille du fichier")
+                failed = True
+
+    if failed:
+        sys.exit(1)
+    print("✅ Pic de RSS stable quelle que soit la taille du fichier")
+
+
+if __name__ == "__main__":
+    main()
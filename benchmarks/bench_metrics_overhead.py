@@ -0,0 +1,132 @@
+"""
+Surcoût de l'instrumentation (/metrics, Server-Timing) sur la latence des requêtes
+
+Mesure le coût unitaire d'une étape chronométrée et du middleware, compte le
+nombre d'étapes par requête /chat, et rapporte ce surcoût à la latence moyenne
+d'un /chat en processus (collection factice, embedding simulé, réponse de secours).
+Le script échoue (code 1) si le surcoût dépasse --max-overhead (1 % par défaut).
+La latence de bout en bout avec et sans instrumentation est affichée pour information.
+
+Usage:
+    python -m benchmarks.bench_metrics_overhead --search-delay 0.005 --requests 300
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import llm
+from benchmarks.bench_concurrency import FakeRAGSystem
+from helpers import answer_cache as cache_module
+from helpers import chromadb as rag_module
+from helpers import metrics as metrics_module
+from helpers.answer_cache import SemanticAnswerCache
+from helpers.metrics import Metrics, MetricsMiddleware, get_metrics
+from llm import LLMGenerator
+from main import app
+
+
+def stage_cost(iterations: int) -> float:
+    """
+    Coût (secondes) d'une étape chronométrée vide, instrumentation active
+    """
+    metrics = get_metrics()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with metrics.stage("bench"):
+            pass
+    return (time.perf_counter() - start) / iterations
+
+
+async def middleware_cost(iterations: int) -> float:
+    """
+    Surcoût (secondes) du middleware autour d'une application ASGI vide
+    """
+    class Routes:
+        routes = []
+
+    async def bare_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "path": "/bench", "app": Routes()}
+    wrapped = MetricsMiddleware(bare_app)
+    timings = []
+    for app_under_test in (bare_app, wrapped):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await app_under_test(scope, receive, send)
+        timings.append((time.perf_counter() - start) / iterations)
+    return max(timings[1] - timings[0], 0.0)
+
+
+async def chat_latency(requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(10):
+            await client.post("/chat", json={"query": "How can I track my order?"})
+        start = time.perf_counter()
+        for i in range(requests):
+            await client.post("/chat", json={"query": f"How can I track my order {i}?"})
+        return (time.perf_counter() - start) / requests
+
+
+def stage_observations() -> int:
+    histograms = get_metrics()._histograms.get("rag_stage_duration_seconds", {})
+    return sum(h.count for key, h in histograms.items() if key != (("stage", "bench"),))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Surcoût de l'instrumentation")
+    parser.add_argument("--search-delay", type=float, default=0.005, help="Coût simulé de l'embedding (s)")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--max-overhead", type=float, default=0.01)
+    args = parser.parse_args()
+
+    rag_module.rag_system = FakeRAGSystem(args.search_delay)
+    llm.llm_generator = LLMGenerator(backend="none")
+    cache_module.answer_cache = SemanticAnswerCache(max_entries=0)
+
+    # Sans instrumentation
+    metrics_module.metrics = Metrics(enabled=False)
+    latency_off = asyncio.run(chat_latency(args.requests))
+
+    # Avec instrumentation et en-tête Server-Timing
+    metrics_module.metrics = Metrics(enabled=True, timing_header=True)
+    latency_on = asyncio.run(chat_latency(args.requests))
+    stages_per_request = stage_observations() / (args.requests + 10)
+
+    per_stage = stage_cost(args.iterations)
+    per_request_middleware = asyncio.run(middleware_cost(args.iterations // 10))
+    overhead = stages_per_request * per_stage + per_request_middleware
+    ratio = overhead / latency_on
+
+    print(f"Étape chronométrée       : {per_stage * 1e6:8.2f} µs")
+    print(f"Middleware               : {per_request_middleware * 1e6:8.2f} µs / requête")
+    print(f"Étapes par /chat         : {stages_per_request:8.2f}")
+    print(f"Surcoût estimé           : {overhead * 1e6:8.2f} µs / requête")
+    print(f"Latence /chat            : {latency_on * 1000:8.2f} ms (sans instrumentation: {latency_off * 1000:.2f} ms)")
+    print(f"Surcoût relatif          : {ratio:8.3%} (seuil {args.max_overhead:.0%})")
+
+    if ratio > args.max_overhead:
+        print("❌ Surcoût de l'instrumentation trop élevé")
+        sys.exit(1)
+    print("✅ Surcoût de l'instrumentation sous le seuil")
+
+
+if __name__ == "__main__":
+    main()
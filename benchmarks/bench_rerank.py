@@ -0,0 +1,172 @@
+"""
+Re-ranking par cross-encoder : latence ajoutée et précision gagnée
+
+Indexe le dataset dans une collection temporaire, puis rejoue un jeu de
+requêtes étiquetées (JSONL {"query", "question"} ou jeu synthétique de
+benchmarks.bench_retrieval, construit depuis les questions du dataset) :
+  - sans re-ranking : top-k de la première étape
+  - avec re-ranking : --candidates candidats reclassés par le cross-encoder,
+    premier passage (cache vide) puis second passage (scores en cache)
+Rapporte recall@1, recall@k, MRR, latence p50 / p95 et latence ajoutée par
+requête, ainsi que les abandons dus au budget (--budget-ms).
+
+Le cross-encoder est un export ONNX (--model-dir, ex: ms-marco-MiniLM-L-6-v2).
+Sans modèle, --fake-reranker note les paires par recouvrement pondéré des
+termes (IDF) et simule --pair-ms ms de calcul par paire : la latence et le
+budget sont mesurables, la précision n'est pas celle d'un cross-encoder.
+
+Usage:
+    python -m benchmarks.bench_rerank --model-dir data/models/ms-marco-MiniLM-L-6-v2
+    python -m benchmarks.bench_rerank --model-dir data/models/ms-marco-MiniLM-L-6-v2 --candidates 20 --budget-ms 30
+    python -m benchmarks.bench_rerank --fake-reranker --pair-ms 0.5 --fake-embeddings
+"""
+
+import sys
+import os
+import argparse
+import json
+import math
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_retrieval import percentile, synthetic_queries
+from helpers.dataset_loader import iter_records
+from helpers.lexical_index import tokenize
+from helpers.reranker import CrossEncoderScorer, Reranker
+
+
+class TermOverlapScorer:
+    """
+    Notation factice : somme des IDF des termes de la requête présents dans le document
+    """
+
+    def __init__(self, texts, pair_ms: float = 0.0, batch_size: int = 16):
+        frequencies = Counter(term for text in texts for term in set(tokenize(text)))
+        self.idf = {term: math.log(1 + len(texts) / count) for term, count in frequencies.items()}
+        self.pair_ms = pair_ms
+        self.batch_size = batch_size
+
+    def load(self):
+        pass
+
+    def batches(self, texts):
+        return [list(range(i, min(i + self.batch_size, len(texts)))) for i in range(0, len(texts), self.batch_size)]
+
+    def score(self, query, texts):
+        if self.pair_ms:
+            time.sleep(self.pair_ms * len(texts) / 1000)
+        terms = set(tokenize(query))
+        return np.array([
+            sum(self.idf.get(term, 0.0) for term in terms & set(tokenize(text))) for text in texts
+        ], dtype=np.float32)
+
+
+def evaluate(rag, labeled, k: int, label: str, baseline=None):
+    """
+    Recall@1, recall@k, MRR et latences d'un passage sur le jeu étiqueté
+    """
+    from helpers.chromadb import document_id
+
+    hits_1 = hits_k = 0
+    reciprocal_ranks = 0.0
+    latencies = []
+    for item in labeled:
+        start = time.perf_counter()
+        results = rag.search_documents(item["query"], n_results=k, exact_match=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids = [doc["id"] for doc in results]
+        expected = document_id(item["question"])
+        if expected in ids:
+            rank = ids.index(expected) + 1
+            hits_1 += rank == 1
+            hits_k += 1
+            reciprocal_ranks += 1 / rank
+
+    mean = sum(latencies) / len(latencies)
+    added = f"{mean - baseline:>+12.2f}" if baseline is not None else ""
+    print(f"{label:>24}{hits_1 / len(labeled):>10.3f}{hits_k / len(labeled):>10.3f}"
+          f"{reciprocal_ranks / len(labeled):>8.3f}{percentile(latencies, 50):>10.2f}"
+          f"{percentile(latencies, 95):>10.2f}{added}")
+    return mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence ajoutée et précision du re-ranking par cross-encoder")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--queries", help="Jeu étiqueté JSONL {query, question}")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--mode", default="dense", choices=("dense", "lexical", "hybrid"))
+    parser.add_argument("--candidates", type=int, default=50, help="Candidats de la première étape")
+    parser.add_argument("--budget-ms", type=float, default=0, help="Budget de notation par requête (0 = illimité)")
+    parser.add_argument("--model-dir", help="Cross-encoder ONNX (model.onnx, tokenizer.json)")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--fake-reranker", action="store_true", help="Notation par recouvrement des termes (sans modèle)")
+    parser.add_argument("--pair-ms", type=float, default=0.2, help="Coût simulé d'une paire avec --fake-reranker")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Embedding par hachage (sans modèle ONNX)")
+    args = parser.parse_args()
+
+    if not args.fake_reranker and not args.model_dir:
+        parser.error("--model-dir ou --fake-reranker requis")
+    if args.fake_embeddings:
+        from chromadb.utils import embedding_functions
+        from benchmarks.bench_ingestion import HashEmbeddingFunction
+        embedding_functions.DefaultEmbeddingFunction = HashEmbeddingFunction
+
+    faq = list(iter_records(os.path.abspath(args.dataset)))
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            labeled = [json.loads(line) for line in f if line.strip()]
+    else:
+        labeled = synthetic_queries(faq)
+
+    # Collection temporaire : RAGSystem utilise ./data/chroma_langchain_db
+    os.environ["RERANK_ENABLED"] = "false"
+    os.environ["RETRIEVAL_MODE"] = args.mode
+    from helpers.chromadb import RAGSystem
+
+    workdir = tempfile.mkdtemp(prefix="bench_rerank_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        rag = RAGSystem(collection_name="bench_rerank")
+        ids, documents, metadatas = rag.build_records(pd.DataFrame(faq, columns=["Questions", "Answers"]))
+        rag.write_records(ids, documents, metadatas, workers=1)
+        rag.load_vector_engine()
+        rag.rebuild_indexes()
+
+        if args.fake_reranker:
+            scorer = TermOverlapScorer(documents, pair_ms=args.pair_ms, batch_size=args.batch_size)
+        else:
+            scorer = CrossEncoderScorer(args.model_dir, threads=args.threads, batch_size=args.batch_size)
+        scorer.load()
+
+        print(f"\nDocuments : {len(ids)} | requêtes étiquetées : {len(labeled)} | mode : {args.mode}")
+        print(f"Scorer : {'factice (recouvrement des termes)' if args.fake_reranker else args.model_dir}, "
+              f"{args.candidates} candidats, budget {f'{args.budget_ms:g} ms' if args.budget_ms else 'illimité'}")
+        print(f"{'':>24}{'recall@1':>10}{f'recall@{args.k}':>10}{'MRR':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}{'ajout (ms)':>12}")
+
+        rag.reranker = None
+        baseline = evaluate(rag, labeled, args.k, "sans re-ranking")
+        rag.reranker = Reranker(scorer, candidates=args.candidates, budget_ms=args.budget_ms)
+        evaluate(rag, labeled, args.k, "re-ranking (cache vide)", baseline)
+        evaluate(rag, labeled, args.k, "re-ranking (en cache)", baseline)
+
+        stats = rag.reranker.stats()
+        print(f"\nCoût moyen d'une paire : {stats['pair_ms']} ms | entrées en cache : {stats['cache_entries']}")
+        print(f"Abandons (ordre de la première étape) : {stats['fallbacks']}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Évaluation hors ligne de la recherche : dense, lexicale (BM25) et hybride (RRF)
+
+Indexe le dataset dans une collection temporaire puis rejoue un jeu de
+requêtes étiquetées et rapporte, pour chaque mode, le recall@k et la latence.
+Le jeu étiqueté est un fichier JSONL {"query": ..., "question": <question FAQ attendue>} ;
+sans fichier, un jeu synthétique est généré depuis le dataset (mots-clés rares
+de la question, et question tronquée). Le chemin rapide par question exacte
+est désactivé pour mesurer la seule recherche.
+
+--scale N mesure aussi la mémoire et la latence de l'index BM25 seul sur N
+documents synthétiques (ex: 1000000).
+
+Usage:
+    python -m benchmarks.bench_retrieval
+    python -m benchmarks.bench_retrieval --queries labeled.jsonl --k 5
+    python -m benchmarks.bench_retrieval --scale 1000000
+"""
+
+import sys
+import os
+import argparse
+import json
+import random
+import resource
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+import pandas as pd
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.chromadb import RAGSystem, document_id
+from helpers.dataset_loader import iter_records
+from helpers.lexical_index import LexicalIndex, tokenize
+
+MODES = ("dense", "lexical", "hybrid")
+
+
+def synthetic_queries(faq, seed: int = 0):
+    """
+    Deux requêtes par entrée : les 3 mots les plus rares de la question,
+    et la question sans ses deux premiers mots
+    """
+    rng = random.Random(seed)
+    frequencies = Counter(term for question, _ in faq for term in set(tokenize(question)))
+    labeled = []
+    for question, _ in faq:
+        terms = [term for term in dict.fromkeys(tokenize(question)) if len(term) > 2]
+        keywords = sorted(terms, key=lambda term: frequencies[term])[:3]
+        rng.shuffle(keywords)
+        if keywords:
+            labeled.append({"query": " ".join(keywords), "question": question})
+        words = question.split()
+        if len(words) > 4:
+            labeled.append({"query": " ".join(words[2:]), "question": question})
+    return labeled
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def evaluate(rag, labeled, k: int):
+    print(f"{'mode':>8}{f'recall@{k}':>12}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+    for mode in MODES:
+        hits = 0
+        latencies = []
+        for item in labeled:
+            start = time.perf_counter()
+            results = rag.search_documents(item["query"], n_results=k, mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += document_id(item["question"]) in [doc["id"] for doc in results]
+        print(f"{mode:>8}{hits / len(labeled):>12.3f}"
+              f"{percentile(latencies, 50):>12.2f}{percentile(latencies, 95):>12.2f}")
+
+
+def scale_test(size: int, queries: int = 200):
+    """
+    Mémoire et latence de l'index BM25 seul sur un corpus synthétique
+    """
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(50000)]
+    # Pic de mémoire résidente (Ko sous Linux) avant la construction
+    peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = LexicalIndex()
+    start = time.perf_counter()
+    for offset in range(0, size, 10000):
+        batch = range(offset, min(offset + 10000, size))
+        index.add_many(
+            [f"doc_{i}" for i in batch],
+            [
+                {
+                    "question": f"order {i} " + " ".join(rng.choices(vocabulary, k=8)),
+                    "answer": " ".join(rng.choices(vocabulary, k=25))
+                }
+                for i in batch
+            ]
+        )
+    build_seconds = time.perf_counter() - start
+    rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_before) * 1024
+
+    latencies = []
+    for _ in range(queries):
+        query = f"order {rng.randrange(size)} " + " ".join(rng.choices(vocabulary, k=3))
+        start = time.perf_counter()
+        index.search(query, 5)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    print(f"\nIndex BM25 seul : {size} documents indexés en {build_seconds:.1f}s")
+    print(f"   mémoire  : {index.memory_bytes() / 1e6:.1f} Mo estimés (memory_bytes), "
+          f"+{rss / 1e6:.1f} Mo de pic RSS pendant la construction")
+    print(f"   latence  : p50 {percentile(latencies, 50):.2f} ms | p95 {percentile(latencies, 95):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k et latence des modes de recherche")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--queries", help="Jeu étiqueté JSONL {query, question}")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=0, help="Taille du test de montée en charge BM25")
+    args = parser.parse_args()
+
+    faq = list(iter_records(os.path.abspath(args.dataset)))
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            labeled = [json.loads(line) for line in f if line.strip()]
+    else:
+        labeled = synthetic_queries(faq)
+
+    # Collection temporaire : RAGSystem utilise ./data/chroma_langchain_db
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        rag = RAGSystem(collection_name="bench_retrieval")
+        rag.exact_match_enabled = False
+        ids, documents, metadatas = rag.build_records(pd.DataFrame(faq, columns=["Questions", "Answers"]))
+        rag.write_records(ids, documents, metadatas, workers=1)
+        rag.load_vector_engine()
+
+        print(f"\nDocuments : {len(ids)} | requêtes étiquetées : {len(labeled)}")
+        evaluate(rag, labeled, args.k)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.scale:
+        scale_test(args.scale)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Sérialisation des réponses : durée et taille avant / après
+
+Construit des résultats de recherche réalistes depuis le dataset (--k
+documents par requête, lots de --batch requêtes) et mesure, sans recherche :
+  - encodage seul : jsonable_encoder + json.dumps (FastAPI par défaut) contre orjson
+  - requêtes complètes sur une application FastAPI en processus :
+      avant : dict retourné (jsonable_encoder + JSONResponse) et /chat
+              validé par un response_model List[Dict]
+      après : FastJSONResponse retournée directement, champs id + distance
+              seulement, puis gzip
+Rapporte la durée p50 / p95 par réponse et la taille du corps.
+
+Usage:
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --batch 256 --k 10 --requests 300
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from benchmarks.bench_retrieval import percentile
+from helpers import serialization
+from helpers.chromadb import document_id
+from helpers.dataset_loader import iter_records
+from helpers.serialization import FastJSONResponse, json_response, select_fields
+
+
+class LegacyChatResponse(BaseModel):
+    query: str
+    top_documents: List[Dict]
+    response: str
+    session: Optional[Dict] = None
+
+
+def build_results(faq, batch: int, k: int) -> List[List[Dict]]:
+    results = []
+    for i in range(batch):
+        results.append([
+            {
+                "id": document_id(question),
+                "document": f"Question: {question}\nReponse: {answer}",
+                "question": question,
+                "answer": answer,
+                "distance": 0.25 + 0.05 * rank + i * 1e-4
+            }
+            for rank, (question, answer) in enumerate(faq[(i * k + j) % len(faq)] for j in range(k))
+        ])
+    return results
+
+
+def batch_payload(results, fields=None) -> Dict:
+    return {
+        "n_queries": len(results),
+        "results": [
+            {"query": f"requête {i}", "n_results": len(docs), "documents": select_fields(docs, fields)}
+            for i, docs in enumerate(results)
+        ]
+    }
+
+
+def build_app(results) -> FastAPI:
+    """
+    Routes avant / après renvoyant des résultats déjà calculés
+    """
+    app = FastAPI()
+    chat = {"query": "requête", "top_documents": results[0], "response": results[0][0]["answer"], "session": None}
+
+    @app.post("/before/batch")
+    async def before_batch():
+        return batch_payload(results)
+
+    @app.post("/before/chat", response_model=LegacyChatResponse)
+    async def before_chat():
+        return LegacyChatResponse(**chat)
+
+    @app.post("/after/batch")
+    async def after_batch(request: Request):
+        return json_response(batch_payload(results), request.headers.get("accept-encoding"))
+
+    @app.post("/after/batch-fields")
+    async def after_batch_fields(request: Request):
+        return json_response(batch_payload(results, ["id", "distance"]), request.headers.get("accept-encoding"))
+
+    @app.post("/after/chat")
+    async def after_chat():
+        return FastJSONResponse(chat)
+
+    return app
+
+
+async def measure_routes(app, requests: int):
+    routes = (
+        ("avant  /search/batch", "/before/batch", "identity"),
+        ("après  /search/batch", "/after/batch", "identity"),
+        ("après  id + distance", "/after/batch-fields", "identity"),
+        ("après  gzip", "/after/batch", "gzip"),
+        ("après  id + distance + gzip", "/after/batch-fields", "gzip"),
+        ("avant  /chat", "/before/chat", "identity"),
+        ("après  /chat", "/after/chat", "identity"),
+    )
+    print(f"\n{'réponse':>30}{'p50 (ms)':>10}{'p95 (ms)':>10}{'octets':>10}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label, path, encoding in routes:
+            headers = {"accept-encoding": encoding}
+            await client.post(path, headers=headers)
+            latencies = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = await client.post(path, headers=headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+            size = int(response.headers["content-length"])
+            print(f"{label:>30}{percentile(latencies, 50):>10.3f}{percentile(latencies, 95):>10.3f}{size:>10}")
+
+
+def measure_encoding(results, repeat: int):
+    payload = batch_payload(results)
+    timings = {}
+    for label, encode in (
+        ("jsonable_encoder + json", lambda: json.dumps(jsonable_encoder(payload), ensure_ascii=False).encode("utf-8")),
+        ("json seul", lambda: json.dumps(payload, ensure_ascii=False).encode("utf-8")),
+        ("orjson" if serialization.orjson is not None else "json compact (orjson absent)", lambda: serialization.dumps(payload)),
+    ):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            body = encode()
+        timings[label] = ((time.perf_counter() - start) / repeat * 1000, len(body))
+
+    print(f"\nEncodage d'une réponse de {len(results)} requêtes ({repeat} répétitions)")
+    print(f"{'':>30}{'ms':>10}{'octets':>10}")
+    for label, (milliseconds, size) in timings.items():
+        print(f"{label:>30}{milliseconds:>10.3f}{size:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durée et taille de la sérialisation des réponses")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--batch", type=int, default=64, help="Requêtes par réponse /search/batch")
+    parser.add_argument("--k", type=int, default=5, help="Documents par requête")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes mesurées par route")
+    args = parser.parse_args()
+
+    faq = list(iter_records(os.path.abspath(args.dataset)))
+    results = build_results(faq, args.batch, args.k)
+    # Compression de toute réponse quand le client l'accepte
+    serialization.GZIP_MIN_BYTES = 1
+
+    measure_encoding(results, max(10, args.requests // 4))
+    asyncio.run(measure_routes(build_app(results), args.requests))
+
+
+if __name__ == "__main__":
+    main()
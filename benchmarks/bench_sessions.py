@@ -0,0 +1,208 @@
+"""
+Sessions de conversation sur /chat : latence par tour, recherches évitées et mémoire
+
+Indexe le dataset dans une base temporaire, puis rejoue --conversations
+conversations de --turns tours sur /chat (en processus) : une question de
+la FAQ sans ses deux premiers mots, puis des relances ("and ...?", "is it
+...?") dont une reprend un terme de la réponse attendue. Trois façons de
+les envoyer :
+  - sans état, relance seule : le client n'envoie que le dernier message
+  - sans état, historique : le client renvoie toute la conversation
+  - session : session_id, le serveur réécrit la relance et réutilise les
+    documents du tour précédent quand ils la couvrent
+Rapporte la latence p50 / p95 du premier tour et des relances, la part des
+relances servies sans recherche et la part des relances dont les documents
+contiennent la réponse attendue.
+
+Puis remplit un MemorySessionStore de --sessions sessions pleines, plafonné
+à --max-bytes : sessions gardées, mémoire estimée et mesurée (tracemalloc),
+durée d'un get / put.
+
+Le LLM tourne en mode simulation (sans clé API) et le cache sémantique des
+réponses est désactivé : la latence mesurée est celle de la recherche.
+
+Usage:
+    python -m benchmarks.bench_sessions --fake-embeddings
+    python -m benchmarks.bench_sessions --conversations 200 --turns 4 --mode dense --sessions 20000 --max-bytes 8000000
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from benchmarks.bench_retrieval import percentile
+from helpers.dataset_loader import iter_records
+from helpers.sessions import MemorySessionStore, SessionState, content_terms
+
+FOLLOW_UPS = ("is it free?", "how long does it take?", "and what about the fees?", "can I change it later?")
+
+
+def build_conversations(faq, count: int, turns: int, seed: int = 0):
+    """
+    Conversations : question de la FAQ raccourcie, puis turns - 1 relances
+    """
+    rng = random.Random(seed)
+    conversations = []
+    for question, answer in rng.sample(faq, min(count, len(faq))):
+        words = question.split()
+        opening = " ".join(words[2:]) if len(words) > 4 else question
+        terms = [term for term in content_terms(answer) if term not in content_terms(question)]
+        follow_ups = [f"and {rng.choice(terms)}?"] if terms else []
+        follow_ups += rng.sample(FOLLOW_UPS, len(FOLLOW_UPS))
+        conversations.append({"question": question, "turns": [opening] + follow_ups[:turns - 1]})
+    return conversations
+
+
+async def replay(client, conversations, strategy: str, mode: str):
+    """
+    Rejoue les conversations ; latences (premier tour, relances) et résultats des relances
+    """
+    from helpers.chromadb import document_id
+
+    first, follow_ups = [], []
+    reused = found = 0
+    for n, conversation in enumerate(conversations):
+        expected = document_id(conversation["question"])
+        history = []
+        for turn, message in enumerate(conversation["turns"]):
+            history.append(message)
+            body = {"query": message, "mode": mode}
+            if strategy == "history":
+                body["query"] = " ".join(history)
+            elif strategy == "session":
+                body["session_id"] = f"bench-{n}"
+
+            start = time.perf_counter()
+            response = await client.post("/chat", json=body)
+            elapsed = (time.perf_counter() - start) * 1000
+            response.raise_for_status()
+            result = response.json()
+
+            if turn == 0:
+                first.append(elapsed)
+                continue
+            follow_ups.append(elapsed)
+            reused += bool(result["session"] and result["session"]["reused_documents"])
+            found += expected in [doc["id"] for doc in result["top_documents"]]
+    return first, follow_ups, reused, found
+
+
+async def measure_turns(conversations, args):
+    import httpx
+    from main import app
+
+    labels = {
+        "followup": "sans état, relance seule",
+        "history": "sans état, historique",
+        "session": "session"
+    }
+    print(f"\n{len(conversations)} conversations de {args.turns} tours, recherche {args.mode}")
+    print(f"{'':>26}{'1er tour p50':>14}{'p95':>8}{'relance p50':>13}{'p95':>8}"
+          f"{'sans recherche':>16}{'doc attendu':>13}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Premier passage non mesuré (imports, index, exécuteur)
+        await replay(client, conversations[:5], "followup", args.mode)
+        for strategy, label in labels.items():
+            first, follow_ups, reused, found = await replay(client, conversations, strategy, args.mode)
+            print(f"{label:>26}{percentile(first, 50):>14.2f}{percentile(first, 95):>8.2f}"
+                  f"{percentile(follow_ups, 50):>13.2f}{percentile(follow_ups, 95):>8.2f}"
+                  f"{reused / len(follow_ups):>16.1%}{found / len(follow_ups):>13.1%}")
+
+
+def measure_store(faq, sessions: int, max_bytes: int):
+    """
+    Mémoire d'un MemorySessionStore rempli de sessions pleines (4 questions, 5 documents)
+    """
+    rng = random.Random(1)
+    store = MemorySessionStore(ttl_seconds=0, max_sessions=sessions, max_bytes=max_bytes)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(sessions):
+        state = SessionState()
+        documents = [{"id": f"faq_{i}", "question": q, "answer": a, "distance": 0.5} for i, (q, a) in enumerate(rng.sample(faq, 5))]
+        state.record(documents[0]["question"], False, documents, max_turns=4, max_documents=5)
+        for message in FOLLOW_UPS[:3]:
+            state.record(message, True, None, max_turns=4, max_documents=5)
+        store.put(f"session-{n}", state)
+    measured = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    stats = store.stats()
+
+    # Durées hors tracemalloc : lectures puis réécritures de sessions tirées au hasard
+    keys = [f"session-{rng.randrange(sessions)}" for _ in range(10000)]
+    start = time.perf_counter()
+    for key in keys:
+        store.get(key)
+    get_us = (time.perf_counter() - start) / len(keys) * 1e6
+    start = time.perf_counter()
+    for key in keys:
+        store.put(key, state)
+    put_us = (time.perf_counter() - start) / len(keys) * 1e6
+
+    print(f"\nMemorySessionStore : {sessions} sessions écrites, plafond {max_bytes / 1e6:.0f} Mo")
+    print(f"   Gardées : {stats['sessions']} (évincées : {stats['evictions']})")
+    print(f"   Mémoire estimée : {stats['bytes'] / 1e6:.1f} Mo | mesurée (tracemalloc) : {measured / 1e6:.1f} Mo"
+          f" | {measured / max(1, stats['sessions']):.0f} octets / session")
+    print(f"   put : {put_us:.1f} µs | get : {get_us:.2f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence par tour et mémoire des sessions de conversation")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=4, help="Tours par conversation (2 à 5)")
+    parser.add_argument("--mode", default="hybrid", choices=("dense", "lexical", "hybrid"))
+    parser.add_argument("--sessions", type=int, default=10000, help="Sessions écrites pour la mesure mémoire")
+    parser.add_argument("--max-bytes", type=int, default=16 * 1024 * 1024, help="Plafond mémoire du store mesuré")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Embedding par hachage (sans modèle ONNX)")
+    args = parser.parse_args()
+
+    if args.fake_embeddings:
+        from chromadb.utils import embedding_functions
+        from benchmarks.bench_ingestion import HashEmbeddingFunction
+        embedding_functions.DefaultEmbeddingFunction = HashEmbeddingFunction
+
+    faq = list(iter_records(os.path.abspath(args.dataset)))
+    conversations = build_conversations(faq, args.conversations, min(max(args.turns, 2), 5))
+
+    # Base temporaire : RAGSystem utilise ./data/chroma_langchain_db
+    os.environ.update({
+        "SNAPSHOT_SERVING_ENABLED": "false",
+        "STARTUP_WARMUP": "false",
+        "EMBEDDING_CACHE_PATH": "",
+        "ANSWER_CACHE_THRESHOLD": "2",
+        "SESSION_BACKEND": "memory"
+    })
+    workdir = tempfile.mkdtemp(prefix="bench_sessions_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        from helpers.chromadb import get_rag_system
+
+        rag = get_rag_system()
+        ids, documents, metadatas = rag.build_records(pd.DataFrame(faq, columns=["Questions", "Answers"]))
+        rag.write_records(ids, documents, metadatas, workers=1)
+        rag.load_vector_engine()
+        rag.rebuild_indexes()
+
+        asyncio.run(measure_turns(conversations, args))
+        measure_store(faq, args.sessions, args.max_bytes)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
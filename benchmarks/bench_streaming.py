@@ -0,0 +1,130 @@
+"""
+Mesure du temps jusqu'au premier octet (TTFB) de /chat/stream vs /chat
+
+Lance l'API avec uvicorn dans un thread, une collection factice et un faux
+LLM en streaming (délai avant le premier morceau puis débit constant), et
+compare le premier octet, le premier morceau de réponse et la durée totale.
+
+Usage:
+    python -m benchmarks.bench_streaming --first-token-delay 0.5 --tokens 40 --token-delay 0.05
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+
+import llm
+from benchmarks.bench_concurrency import FakeRAGSystem
+from helpers import answer_cache as cache_module
+from helpers import chromadb as rag_module
+from helpers.answer_cache import SemanticAnswerCache
+from llm import LLMGenerator
+from main import app
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStream:
+    def __init__(self, model):
+        self.model = model
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.model.first_token_delay)
+        for i in range(self.model.tokens):
+            if i:
+                await asyncio.sleep(self.model.token_delay)
+            yield FakeChunk(f"mot{i} ")
+
+
+class FakeStreamingModel:
+    """
+    Faux LLM local : même interface asynchrone que le client Gemini
+    """
+
+    def __init__(self, first_token_delay: float, tokens: int, token_delay: float):
+        self.first_token_delay = first_token_delay
+        self.tokens = tokens
+        self.token_delay = token_delay
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        stream_response = FakeStream(self)
+        if stream:
+            return stream_response
+        text = "".join([chunk.text async for chunk in stream_response])
+        return FakeChunk(text)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def measure(base_url: str):
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        payload = {"query": "How can I track my order?"}
+
+        start = time.perf_counter()
+        await client.post("/chat", json=payload)
+        chat_total = time.perf_counter() - start
+
+        first_byte = first_token = None
+        start = time.perf_counter()
+        async with client.stream("POST", "/chat/stream", json=payload) as response:
+            async for line in response.aiter_lines():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                if first_token is None and line.startswith("event: token"):
+                    first_token = time.perf_counter() - start
+        stream_total = time.perf_counter() - start
+
+    return chat_total, first_byte, first_token, stream_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTFB de /chat/stream vs /chat")
+    parser.add_argument("--first-token-delay", type=float, default=0.5)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    rag_module.rag_system = FakeRAGSystem(0.0)
+    generator = LLMGenerator(backend="none")
+    generator.use_model = True
+    generator.model = FakeStreamingModel(args.first_token_delay, args.tokens, args.token_delay)
+    llm.llm_generator = generator
+    cache_module.answer_cache = SemanticAnswerCache(max_entries=0)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    try:
+        chat_total, first_byte, first_token, stream_total = asyncio.run(measure(f"http://127.0.0.1:{port}"))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    print(f"/chat        : réponse complète après {chat_total * 1000:8.1f} ms")
+    print(f"/chat/stream : premier octet {first_byte * 1000:8.1f} ms | premier morceau "
+          f"{first_token * 1000:8.1f} ms | fin {stream_total * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
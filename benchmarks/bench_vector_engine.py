@@ -0,0 +1,137 @@
+"""
+Latence de la recherche dense : ChromaDB (HNSW) contre moteur NumPy exact et IVF
+
+Remplit une collection temporaire avec des vecteurs synthétiques groupés
+(mélange de gaussiennes, dimension 384 comme all-MiniLM-L6-v2) jusqu'à chaque
+taille de --sizes, puis mesure search_by_embeddings avec chaque moteur :
+latence p50 d'une requête seule et d'un lot de --batch requêtes, et recall@k
+de l'IVF par rapport à la recherche exacte. Le point de bascule est la plus
+petite taille où ChromaDB devient plus rapide que la recherche exacte NumPy
+(à reporter dans VECTOR_ENGINE_NUMPY_MAX) ; VECTOR_ENGINE_IVF_MAX ne doit pas
+dépasser la plus grande taille mesurée avec un recall suffisant.
+
+Usage:
+    python -m benchmarks.bench_vector_engine --sizes 1000 10000 50000 100000
+"""
+
+import sys
+import os
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_retrieval import percentile
+from helpers.chromadb import RAGSystem
+from helpers.vector_engine import VectorEngine
+
+
+def synthetic_vectors(rng, size: int, dimension: int, centers: np.ndarray) -> np.ndarray:
+    labels = rng.integers(0, len(centers), size)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((size, dimension), dtype=np.float32)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def latency(rag, queries, batch: int, repeats: int):
+    single = []
+    for query in queries[:repeats]:
+        start = time.perf_counter()
+        rag.search_by_embeddings([query.tolist()], 5)
+        single.append((time.perf_counter() - start) * 1000)
+    batched = []
+    for i in range(max(repeats // batch, 3)):
+        chunk = [query.tolist() for query in queries[(i * batch) % len(queries):][:batch]]
+        start = time.perf_counter()
+        rag.search_by_embeddings(chunk, 5)
+        batched.append((time.perf_counter() - start) * 1000)
+    return percentile(single, 50), percentile(batched, 50)
+
+
+def recall(engine, exact, queries, k: int) -> float:
+    approximate = engine.search(queries.tolist(), k)
+    reference = exact.search(queries.tolist(), k)
+    hits = sum(
+        len({doc["id"] for doc in a} & {doc["id"] for doc in b})
+        for a, b in zip(approximate, reference)
+    )
+    return hits / (k * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Point de bascule ChromaDB / moteur NumPy / IVF")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000, 100000])
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--probes", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((256, args.dimension), dtype=np.float32)
+
+    # Collection temporaire : RAGSystem utilise ./data/chroma_langchain_db
+    workdir = tempfile.mkdtemp(prefix="bench_vector_engine_")
+    cwd = os.getcwd()
+    os.environ["VECTOR_ENGINE"] = "chroma"
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    try:
+        os.chdir(workdir)
+        rag = RAGSystem(collection_name="bench_vector_engine")
+        ids, vectors, records = [], np.zeros((0, args.dimension), dtype=np.float32), []
+
+        print(f"\n{'documents':>10}{'chroma':>10}{'numpy':>10}{'ivf':>10}"
+              f"{f'lot chroma':>13}{'lot numpy':>11}{'lot ivf':>10}{f'recall@{args.k} ivf':>15}   (ms, p50)")
+        crossover = None
+        for size in sorted(args.sizes):
+            added = synthetic_vectors(rng, size - len(ids), args.dimension, centers)
+            new_ids = [f"doc_{i}" for i in range(len(ids), size)]
+            new_records = [
+                {"question": f"Question {i}?", "answer": f"Answer {i}.", "document": f"Question: Question {i}?\nReponse: Answer {i}."}
+                for i in range(len(ids), size)
+            ]
+            for start in range(0, len(new_ids), 5000):
+                rag.collection.add(
+                    ids=new_ids[start:start + 5000],
+                    embeddings=added[start:start + 5000].tolist(),
+                    metadatas=[{"question": r["question"], "answer": r["answer"]} for r in new_records[start:start + 5000]],
+                    documents=[r["document"] for r in new_records[start:start + 5000]]
+                )
+            ids += new_ids
+            records += new_records
+            vectors = np.concatenate([vectors, added])
+
+            queries = vectors[rng.choice(size, args.queries)] + 0.05 * rng.standard_normal(
+                (args.queries, args.dimension), dtype=np.float32
+            )
+            exact = VectorEngine(ids, vectors, records, kind="numpy")
+            ivf = VectorEngine(ids, vectors, records, kind="ivf", n_probe=args.probes)
+
+            timings = {}
+            for name, engine in (("chroma", None), ("numpy", exact), ("ivf", ivf)):
+                rag.vector_engine = engine
+                rag.search_by_embeddings([queries[0].tolist()], 5)
+                timings[name] = latency(rag, queries, args.batch, args.queries)
+
+            print(f"{size:>10}{timings['chroma'][0]:>10.2f}{timings['numpy'][0]:>10.2f}{timings['ivf'][0]:>10.2f}"
+                  f"{timings['chroma'][1]:>13.2f}{timings['numpy'][1]:>11.2f}{timings['ivf'][1]:>10.2f}"
+                  f"{recall(ivf, exact, queries[:50], args.k):>15.3f}")
+            if crossover is None and timings["chroma"][0] < timings["numpy"][0]:
+                crossover = size
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if crossover is None:
+        print(f"\nRecherche exacte NumPy plus rapide que ChromaDB jusqu'à {max(args.sizes)} documents")
+    else:
+        print(f"\nPoint de bascule : ChromaDB plus rapide que la recherche exacte à partir de ~{crossover} documents")
+
+
+if __name__ == "__main__":
+    main()
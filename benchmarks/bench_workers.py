@@ -0,0 +1,238 @@
+"""
+Service multi-workers sur un snapshot partagé : mémoire par worker et débit
+
+Publie un snapshot (dataset, plus --synthetic documents aléatoires pour rendre
+la mémoire mesurable) dans un dossier temporaire, puis lance pour chaque valeur
+de --workers un serveur `uvicorn --workers N` en mode SNAPSHOT_SERVING_ENABLED.
+Pour chaque configuration :
+  - mémoire de chaque worker lue dans /proc/<pid>/smaps_rollup (Linux) :
+    RSS, PSS et mémoire anonyme (ce que coûte réellement un worker de plus)
+  - débit /search en boucle fermée pendant --duration secondes, depuis
+    --client-processes processus clients
+
+Le débit ne peut croître avec le nombre de workers que si la machine a assez
+de cœurs pour les workers et les clients.
+
+Usage:
+    python -m benchmarks.bench_workers --workers 1 2 4 --synthetic 200000
+    python -m benchmarks.bench_workers --fake-embeddings --workers 1 2
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from chromadb.utils import embedding_functions
+
+from benchmarks.bench_ingestion import HashEmbeddingFunction
+from benchmarks.bench_retrieval import synthetic_queries
+from benchmarks.bench_streaming import free_port
+from helpers.chromadb import RAGSystem, content_hash, document_id
+from helpers.dataset_loader import iter_records
+from helpers.embeddings import embedding_factory_from_env
+from helpers.snapshot import SnapshotWriter, snapshot_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Application servie par les workers (embedding factice si demandé)
+if os.getenv("BENCH_FAKE_EMBEDDINGS", "false").lower() == "true":
+    embedding_functions.DefaultEmbeddingFunction = HashEmbeddingFunction
+
+from main import app
+
+
+def build_snapshot(directory: str, faq, synthetic: int, embedding_function) -> str:
+    """
+    Publie le dataset et --synthetic documents aléatoires dans un snapshot
+    """
+    ids, documents, metadatas = RAGSystem.build_records(pd.DataFrame(faq, columns=["Questions", "Answers"]))
+    embeddings = np.asarray(embedding_function(documents), dtype=np.float32)
+    rng = np.random.default_rng(0)
+
+    with SnapshotWriter(directory, len(ids) + synthetic) as writer:
+        writer.add(ids, embeddings, metadatas, documents)
+        for offset in range(0, synthetic, 10000):
+            size = min(10000, synthetic - offset)
+            vectors = rng.standard_normal((size, embeddings.shape[1]), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            batch = []
+            for i in range(offset, offset + size):
+                question = f"Synthetic question {i} about product {i % 997}?"
+                answer = f"Synthetic answer {i}: open your account and follow step {i % 7}."
+                batch.append((document_id(question), question, answer))
+            writer.add(
+                [doc_id for doc_id, _, _ in batch],
+                vectors,
+                [
+                    {"question": q, "answer": a, "index": len(ids) + offset + j, "content_hash": content_hash(q, a)}
+                    for j, (_, q, a) in enumerate(batch)
+                ],
+                [f"Question: {q}\nReponse: {a}" for _, q, a in batch]
+            )
+        return writer.publish()
+
+
+def process_memory(pid: int) -> dict:
+    """
+    RSS, PSS et mémoire anonyme d'un processus, en octets
+    La mémoire anonyme (tas : modèle, index BM25, objets Python) est propre au
+    worker ; les pages du snapshot sont adossées au fichier et partagées
+    """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[1].isdigit():
+                values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "anonymous": values.get("Anonymous", 0)
+    }
+
+
+def worker_pids(server_pid: int):
+    """
+    Processus workers d'uvicorn (enfants lancés par multiprocessing), ou le serveur lui-même
+    """
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == server_pid and b"spawn_main" in cmdline:
+            children.append(int(entry))
+    return children or [server_pid]
+
+
+def client_process(base_url: str, queries, concurrency: int, duration: float) -> int:
+    async def run():
+        done = 0
+        deadline = time.perf_counter() + duration
+
+        async def loop(client, offset):
+            nonlocal done
+            i = offset
+            while time.perf_counter() < deadline:
+                response = await client.post("/search", json={"query": queries[i % len(queries)], "n_results": 5})
+                response.raise_for_status()
+                done += 1
+                i += concurrency
+
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+            await asyncio.gather(*[loop(client, offset) for offset in range(concurrency)])
+        return done
+
+    return asyncio.run(run())
+
+
+def wait_ready(base_url: str, process, timeout: float = 300.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Le serveur s'est arrêté au démarrage")
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("Serveur non prêt")
+
+
+def run_workers(workers: int, snapshot_dir: str, queries, args):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        "SNAPSHOT_SERVING_ENABLED": "true",
+        "SNAPSHOT_DIR": snapshot_dir,
+        "BENCH_FAKE_EMBEDDINGS": "true" if args.fake_embeddings else "false",
+        "EXACT_MATCH_ENABLED": "false",
+        "EMBEDDING_CACHE_PATH": "",
+        "METRICS_ENABLED": "false"
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_workers:app",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        wait_ready(base_url, process)
+        # Chauffe : chaque worker charge son modèle et le snapshot
+        client_process(base_url, queries, args.concurrency, 2.0)
+
+        with multiprocessing.Pool(args.client_processes) as pool:
+            start = time.perf_counter()
+            counts = pool.starmap(
+                client_process,
+                [(base_url, queries[i::args.client_processes], args.concurrency, args.duration)
+                 for i in range(args.client_processes)]
+            )
+            elapsed = time.perf_counter() - start
+
+        memory = [process_memory(pid) for pid in worker_pids(process.pid)]
+        return sum(counts) / elapsed, memory
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire par worker et débit en mode snapshot partagé")
+    parser.add_argument("--dataset", default="ecommerce_faq_dataset.csv")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--synthetic", type=int, default=100000, help="Documents aléatoires ajoutés au snapshot")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=16, help="Requêtes simultanées par processus client")
+    parser.add_argument("--client-processes", type=int, default=2)
+    parser.add_argument("--fake-embeddings", action="store_true", help="Embedding par hachage (sans modèle ONNX)")
+    args = parser.parse_args()
+
+    faq = list(iter_records(os.path.abspath(args.dataset)))
+    queries = [item["query"] for item in synthetic_queries(faq)]
+    embedding_function = HashEmbeddingFunction() if args.fake_embeddings else embedding_factory_from_env().create_backend()
+
+    snapshot_dir = tempfile.mkdtemp(prefix="bench_workers_")
+    try:
+        version = build_snapshot(snapshot_dir, faq, args.synthetic, embedding_function)
+        size = os.path.getsize(snapshot_file(snapshot_dir, version))
+        print(f"\nSnapshot {version} : {len(faq) + args.synthetic} documents, {size / 1e6:.1f} Mo | "
+              f"cœurs disponibles : {os.cpu_count()}")
+        print(f"{'workers':>8}{'req/s':>10}{'efficacité':>12}{'RSS/worker':>13}{'PSS/worker':>13}{'anonyme':>13}")
+
+        single = None
+        for workers in args.workers:
+            throughput, memory = run_workers(workers, snapshot_dir, queries, args)
+            single = single or throughput / workers
+            mean = {key: sum(m[key] for m in memory) / len(memory) / 1e6 for key in ("rss", "pss", "anonymous")}
+            print(f"{workers:>8}{throughput:>10.1f}{throughput / (single * workers):>12.0%}"
+                  f"{mean['rss']:>10.1f} Mo{mean['pss']:>10.1f} Mo{mean['anonymous']:>10.1f} Mo")
+        print("\nMémoire anonyme : propre à chaque worker (coût d'un worker supplémentaire) ; "
+              "les pages du snapshot sont partagées entre workers")
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""
+Banc de charge de l'API : débit et latences de /search, /search/batch, /chat et /chat/stream
+
+Lance l'API en processus (uvicorn dans un thread) avec un faux LLM déterministe
+et une collection ChromaDB temporaire peuplée depuis le dataset FAQ, puis rejoue
+un mélange de requêtes tirées du dataset (question exacte, question tronquée,
+mots-clés) à concurrence fixe. Pour chaque scénario : QPS, latence p50/p95/p99
+et répartition du temps entre embedding, requête vectorielle et génération ;
+pour chat_stream, délai avant le premier token.
+
+--llm choisit le LLM :
+  - fake      : délai fixe --llm-delay, 20 morceaux sans délai (défaut)
+  - simulated : SimulatedModel en processus (helpers.llm_backends)
+  - standin   : serveur helpers.llm_standin lancé dans un thread, joint en HTTP
+Avec simulated et standin : délai avant le premier token tiré de
+--llm-first-token, débit --llm-tokens-per-second, erreurs, blocages et
+coupures de flux injectés ; les réponses de secours sont comptées par raison.
+--llm-timeout et --llm-max-concurrency règlent le délai et la concurrence
+du générateur (capacité, réglage des délais).
+
+Les résultats sont écrits en JSON (commit, configuration, scénarios) ; --baseline
+compare avec un résultat précédent et échoue (code 1) si le p95 ou le QPS
+régresse de plus de --max-regression.
+
+--url cible un serveur déjà lancé (pas de répartition par étape dans ce cas).
+
+Usage:
+    python -m benchmarks.loadtest --concurrency 16 --requests 500
+    python -m benchmarks.loadtest --fake-embeddings --output results.json
+    python -m benchmarks.loadtest --baseline benchmarks/results/abc1234.json
+    python -m benchmarks.loadtest --url http://localhost:8000 --scenarios search chat
+    python -m benchmarks.loadtest --fake-embeddings --scenarios chat chat_stream --llm standin \
+        --llm-first-token lognormal:0.8,0.4 --llm-tokens-per-second 40 --llm-error-rate 0.02 --llm-timeout-rate 0.01 --llm-timeout 5
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("search", "search_batch", "chat", "chat_stream")
+STAGES = ("embedding", "vector_query", "lexical_query", "generation")
+
+
+class StageTimer:
+    """
+    Durées des étapes internes (embedding, requête vectorielle, génération)
+    mesurées en enveloppant les méthodes des singletons
+    """
+
+    def __init__(self):
+        self.durations = {stage: [] for stage in STAGES}
+        self.fallbacks = Counter()
+
+    def reset(self):
+        for values in self.durations.values():
+            values.clear()
+        self.fallbacks.clear()
+
+    def count_fallbacks(self, func):
+        fallbacks = self.fallbacks
+
+        def counted(query, top_documents, reason):
+            fallbacks[reason] += 1
+            return func(query, top_documents, reason)
+        return counted
+
+    def wrap(self, stage: str, func):
+        durations = self.durations[stage]
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                durations.append((time.perf_counter() - start) * 1000)
+        return timed
+
+    def wrap_async(self, stage: str, func):
+        durations = self.durations[stage]
+
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                durations.append((time.perf_counter() - start) * 1000)
+        return timed
+
+    def summary(self):
+        return {stage: summarize(values) for stage, values in self.durations.items() if values}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3)
+    }
+
+
+def query_mix(dataset_path: str, seed: int = 0):
+    """
+    Requêtes tirées du dataset : question exacte (chemin rapide), question
+    sans ses premiers mots et mots-clés (recherche vectorielle)
+    """
+    from helpers.dataset_loader import iter_records
+
+    rng = random.Random(seed)
+    queries = []
+    for question, _ in iter_records(dataset_path):
+        words = question.rstrip("?").split()
+        queries.append(question)
+        queries.append(" ".join(words[2:]) if len(words) > 4 else question.lower())
+        keywords = [word for word in words if len(word) > 4]
+        queries.append(" ".join(rng.sample(keywords, min(3, len(keywords)))) or question)
+    rng.shuffle(queries)
+    return queries
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def start_server(app, port: int):
+    import uvicorn
+
+    # Arrêt sans attendre les appels bloqués du LLM de substitution
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           timeout_graceful_shutdown=1))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+
+def build_llm_model(args):
+    """
+    Modèle du générateur selon --llm ; pour standin, le serveur local est
+    lancé dans un thread et retourné pour être arrêté à la fin
+    """
+    from benchmarks.bench_streaming import FakeStreamingModel, free_port
+    from helpers.llm_backends import HTTPModel, LatencyDistribution, SimulatedModel
+
+    if args.llm == "fake":
+        return FakeStreamingModel(args.llm_delay, tokens=20, token_delay=0.0), None
+
+    model = SimulatedModel(
+        first_token=LatencyDistribution.parse(args.llm_first_token or f"fixed:{args.llm_delay}"),
+        tokens_per_second=args.llm_tokens_per_second,
+        answer_tokens=args.llm_answer_tokens,
+        error_rate=args.llm_error_rate,
+        timeout_rate=args.llm_timeout_rate,
+        stream_break_rate=args.llm_stream_break_rate,
+        seed=args.seed
+    )
+    if args.llm == "simulated":
+        return model, None
+
+    from helpers.llm_standin import create_app
+
+    port = free_port()
+    standin = start_server(create_app(model, args.llm_server_concurrency), port)
+    return HTTPModel(f"http://127.0.0.1:{port}", max_connections=args.llm_max_concurrency or 100), standin
+
+
+def start_app(args, timer: StageTimer):
+    """
+    Construit les singletons (collection temporaire, LLM choisi par --llm), les
+    instrumente et lance l'API dans un thread ; le répertoire courant doit être temporaire
+    Retourne les serveurs lancés (API, puis LLM de substitution) et l'URL de l'API
+    """
+    import llm
+    from benchmarks.bench_ingestion import HashEmbeddingFunction
+    from benchmarks.bench_streaming import free_port
+    from helpers import answer_cache as cache_module
+    from helpers import chromadb as rag_module
+    from helpers.answer_cache import SemanticAnswerCache
+    from helpers.chromadb import RAGSystem
+    from helpers.dataset_loader import iter_dataframes
+    from helpers.startup import startup_state
+    from llm import LLMGenerator
+    from main import app
+
+    factory = HashEmbeddingFunction if args.fake_embeddings else None
+
+    class LoadTestRAGSystem(RAGSystem):
+        def initialize_chromadb(self):
+            if factory is not None:
+                self.embedding_function_factory = factory
+                self.embedding_function = factory()
+            super().initialize_chromadb()
+
+    rag = LoadTestRAGSystem(collection_name="loadtest")
+    rag.sync_vectorstore(iter_dataframes(args.dataset), workers=1)
+    rag.embed_queries = timer.wrap("embedding", rag.embed_queries)
+    rag.search_by_embeddings = timer.wrap("vector_query", rag.search_by_embeddings)
+    rag.search_lexical = timer.wrap("lexical_query", rag.search_lexical)
+    rag_module.rag_system = rag
+
+    generator = LLMGenerator(backend="none")
+    generator.use_model = True
+    generator.model, standin = build_llm_model(args)
+    if args.llm_timeout is not None:
+        generator.guard.timeout_seconds = args.llm_timeout or None
+    if args.llm_max_concurrency:
+        generator.guard.max_concurrency = args.llm_max_concurrency
+    generator.generate_response_async = timer.wrap_async("generation", generator.generate_response_async)
+    generator._fallback = timer.count_fallbacks(generator._fallback)
+    llm.llm_generator = generator
+
+    if not args.answer_cache:
+        cache_module.answer_cache = SemanticAnswerCache(max_entries=0)
+    startup_state["ready"] = True
+
+    port = free_port()
+    servers = [start_server(app, port)] + ([standin] if standin is not None else [])
+    return servers, f"http://127.0.0.1:{port}"
+
+
+def build_request(scenario: str, queries, i: int, args):
+    query = queries[i % len(queries)]
+    if scenario == "search":
+        return "/search", {"query": query, "n_results": 5, "mode": args.mode}
+    if scenario == "search_batch":
+        batch = [queries[(i * args.batch_size + j) % len(queries)] for j in range(args.batch_size)]
+        return "/search/batch", {"queries": batch, "n_results": 5, "mode": args.mode}
+    if scenario == "chat_stream":
+        return "/chat/stream", {"query": query, "mode": args.mode}
+    return "/chat", {"query": query, "mode": args.mode}
+
+
+async def send(client, scenario: str, path: str, payload):
+    """
+    Envoie une requête ; pour chat_stream, lit le flux jusqu'au bout
+    Retourne le statut et le délai avant le premier token (None hors flux)
+    """
+    if scenario != "chat_stream":
+        response = await client.post(path, json=payload)
+        return response.status_code, None
+    start = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", path, json=payload) as response:
+        async for line in response.aiter_lines():
+            if first_token is None and line.startswith("event: token"):
+                first_token = (time.perf_counter() - start) * 1000
+    return response.status_code, first_token
+
+
+async def run_scenario(base_url: str, scenario: str, queries, args, on_start=None):
+    """
+    Boucle fermée : --concurrency clients envoient --requests requêtes au total
+    on_start est appelé après la chauffe, juste avant les requêtes mesurées
+    """
+    latencies = []
+    first_tokens = []
+    errors = 0
+    next_request = 0
+
+    async def client_loop(client):
+        nonlocal next_request, errors
+        while next_request < args.requests:
+            i = next_request
+            next_request += 1
+            path, payload = build_request(scenario, queries, i, args)
+            start = time.perf_counter()
+            try:
+                status, first_token = await send(client, scenario, path, payload)
+                if status != 200:
+                    errors += 1
+                if first_token is not None:
+                    first_tokens.append(first_token)
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        # Quelques requêtes de chauffe, non comptées
+        for i in range(min(args.warmup, len(queries))):
+            path, payload = build_request(scenario, queries, i, args)
+            await send(client, scenario, path, payload)
+        if on_start is not None:
+            on_start()
+        start = time.perf_counter()
+        await asyncio.gather(*[client_loop(client) for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "qps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": summarize(latencies)
+    }
+    if scenario == "search_batch":
+        result["queries_per_second"] = round(result["qps"] * args.batch_size, 2)
+    if first_tokens:
+        result["first_token_ms"] = summarize(first_tokens)
+    return result
+
+
+def compare(results, baseline, max_regression: float) -> bool:
+    """
+    Affiche l'écart avec un résultat de référence ; False en cas de régression
+    """
+    ok = True
+    print(f"\nComparaison avec {baseline.get('commit', '?')} (seuil {max_regression:.0%})")
+    for scenario, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        p95_change = current["latency_ms"]["p95"] / max(previous["latency_ms"]["p95"], 1e-9) - 1
+        qps_change = current["qps"] / max(previous["qps"], 1e-9) - 1
+        regressed = p95_change > max_regression or qps_change < -max_regression
+        ok = ok and not regressed
+        print(f"   {'❌' if regressed else '✅'} {scenario:<14} p95 {p95_change:+.1%} | QPS {qps_change:+.1%}")
+    return ok
+
+
+def print_results(results):
+    print(f"\n{'scénario':<14}{'QPS':>10}{'p50 (ms)':>12}{'p95 (ms)':>12}{'p99 (ms)':>12}{'erreurs':>10}")
+    for scenario, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        print(f"{scenario:<14}{result['qps']:>10.1f}{latency['p50']:>12.2f}"
+              f"{latency['p95']:>12.2f}{latency['p99']:>12.2f}{result['errors']:>10}")
+        for stage, values in result.get("stages_ms", {}).items():
+            print(f"   └ {stage:<14} n={values['count']:<6} moyenne {values['mean']:.2f} ms "
+                  f"| p50 {values['p50']:.2f} | p95 {values['p95']:.2f} | p99 {values['p99']:.2f}")
+        if "first_token_ms" in result:
+            values = result["first_token_ms"]
+            print(f"   └ {'premier token':<14} n={values['count']:<6} moyenne {values['mean']:.2f} ms "
+                  f"| p50 {values['p50']:.2f} | p95 {values['p95']:.2f} | p99 {values['p99']:.2f}")
+        if result.get("llm_fallbacks"):
+            reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(result["llm_fallbacks"].items()))
+            print(f"   └ réponses de secours : {reasons}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de charge de l'API")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="Requêtes par scénario")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=16, help="Requêtes par appel /search/batch")
+    parser.add_argument("--mode", choices=("dense", "lexical", "hybrid"), default=None)
+    parser.add_argument("--llm", choices=("fake", "simulated", "standin"), default="fake",
+                        help="Faux LLM fixe, simulation en processus ou serveur local en HTTP")
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="Latence du faux LLM (s)")
+    parser.add_argument("--llm-first-token", help="Délai avant le premier token (ex: lognormal:0.8,0.4, défaut: fixed:--llm-delay)")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0, help="Débit du LLM simulé (0 = sans délai)")
+    parser.add_argument("--llm-answer-tokens", type=int, default=60)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-timeout-rate", type=float, default=0.0, help="Part des appels bloqués")
+    parser.add_argument("--llm-stream-break-rate", type=float, default=0.0)
+    parser.add_argument("--llm-timeout", type=float, help="Délai maximal d'un appel LLM (défaut: LLM_TIMEOUT_SECONDS)")
+    parser.add_argument("--llm-max-concurrency", type=int, default=0, help="Appels LLM simultanés (défaut: LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--llm-server-concurrency", type=int, default=0, help="Générations simultanées du serveur standin (0 = sans limite)")
+    parser.add_argument("--answer-cache", action="store_true", help="Garder le cache de réponses actif")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Embedding par hachage (sans modèle ONNX)")
+    parser.add_argument("--dataset", default=os.path.join(ROOT, "ecommerce_faq_dataset.csv"))
+    parser.add_argument("--url", help="Serveur déjà lancé (sinon l'API est démarrée en processus)")
+    parser.add_argument("--output", help="Fichier JSON (défaut: benchmarks/results/<commit>.json)")
+    parser.add_argument("--baseline", help="Résultat JSON de référence à comparer")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    args.dataset = os.path.abspath(args.dataset)
+    commit = git_commit()
+    output = os.path.abspath(args.output or os.path.join(ROOT, "benchmarks", "results", f"{commit}.json"))
+    queries = query_mix(args.dataset, args.seed)
+
+    timer = StageTimer()
+    servers = []
+    workdir = None
+    cwd = os.getcwd()
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            # Collection temporaire : RAGSystem utilise ./data/chroma_langchain_db
+            workdir = tempfile.mkdtemp(prefix="loadtest_")
+            os.chdir(workdir)
+            servers, base_url = start_app(args, timer)
+
+        results = {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "batch_size": args.batch_size,
+                "mode": args.mode,
+                "llm": args.llm,
+                "llm_delay": args.llm_delay,
+                "llm_first_token": args.llm_first_token,
+                "llm_tokens_per_second": args.llm_tokens_per_second,
+                "llm_error_rate": args.llm_error_rate,
+                "llm_timeout_rate": args.llm_timeout_rate,
+                "llm_stream_break_rate": args.llm_stream_break_rate,
+                "llm_timeout": args.llm_timeout,
+                "llm_max_concurrency": args.llm_max_concurrency,
+                "answer_cache": args.answer_cache,
+                "fake_embeddings": args.fake_embeddings,
+                "url": args.url,
+                "queries": len(queries)
+            },
+            "scenarios": {}
+        }
+        for scenario in args.scenarios:
+            print(f"▶️  {scenario} ({args.requests} requêtes, concurrence {args.concurrency})")
+            result = asyncio.run(run_scenario(base_url, scenario, queries, args, on_start=timer.reset))
+            if not args.url:
+                result["stages_ms"] = timer.summary()
+                result["llm_fallbacks"] = dict(timer.fallbacks)
+            results["scenarios"][scenario] = result
+    finally:
+        for server, thread in servers:
+            server.should_exit = True
+            thread.join()
+        os.chdir(cwd)
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Résultats écrits dans {output}")
+
+    failed = any(result["errors"] for result in results["scenarios"].values())
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failed = not compare(results, json.load(f), args.max_regression) or failed
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
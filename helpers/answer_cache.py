@@ -0,0 +1,195 @@
+"""
+Cache sémantique des réponses générées par le LLM
+
+Une réponse en cache est réutilisée lorsqu'une nouvelle question est proche
+(similarité cosinus >= seuil) d'une question déjà traitée ET que la recherche
+a retourné le même ensemble de documents.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from helpers.metrics import get_metrics
+
+
+class SemanticAnswerCache:
+    """
+    Cache LRU/TTL borné en nombre d'entrées et en mémoire
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Initialise le cache
+
+        Args:
+            threshold: Similarité cosinus minimale pour considérer deux questions équivalentes
+            ttl_seconds: Durée de vie d'une entrée (0 = pas d'expiration)
+            max_entries: Nombre maximal d'entrées
+            max_bytes: Taille mémoire maximale estimée (embeddings + réponses)
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()
+        self._by_documents = {}
+        self._next_key = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, query_embedding: Sequence[float], document_ids: List[str]) -> Optional[str]:
+        """
+        Retourne la réponse en cache si une question proche a retrouvé les mêmes documents
+        """
+        vector = self._normalize(query_embedding)
+        documents_key = frozenset(document_ids)
+
+        with self._lock:
+            now = time.monotonic()
+            best_key = None
+            best_score = self.threshold
+
+            for key in list(self._by_documents.get(documents_key, ())):
+                entry = self._entries[key]
+                if self._is_expired(entry, now):
+                    self._remove(key)
+                    continue
+                score = float(np.dot(entry["embedding"], vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key]["answer"]
+
+    def put(self, query_embedding: Sequence[float], document_ids: List[str], answer: str):
+        """
+        Ajoute une réponse au cache puis applique l'éviction LRU
+        """
+        if not document_ids:
+            return
+
+        vector = self._normalize(query_embedding)
+        documents_key = frozenset(document_ids)
+        size = vector.nbytes + len(answer.encode("utf-8"))
+
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = {
+                "embedding": vector,
+                "documents": documents_key,
+                "answer": answer,
+                "created_at": time.monotonic(),
+                "size": size
+            }
+            self._by_documents.setdefault(documents_key, []).append(key)
+            self._bytes += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self):
+        """
+        Vide le cache (appelé quand le contenu de la collection change)
+        """
+        with self._lock:
+            self._entries.clear()
+            self._by_documents.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """
+        Statistiques du cache pour /stats
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+    def _is_expired(self, entry: dict, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry["created_at"] > self.ttl_seconds
+
+    def _remove(self, key: int):
+        entry = self._entries.pop(key)
+        keys = self._by_documents[entry["documents"]]
+        keys.remove(key)
+        if not keys:
+            del self._by_documents[entry["documents"]]
+        self._bytes -= entry["size"]
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+# Instance globale du cache
+answer_cache = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """
+    Retourne l'instance globale du cache, configurée par variables d'environnement
+    """
+    global answer_cache
+    if answer_cache is None:
+        answer_cache = SemanticAnswerCache(
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95)),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", 3600)),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 10000)),
+            max_bytes=int(os.getenv("ANSWER_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        )
+        register_metrics()
+    return answer_cache
+
+
+def register_metrics():
+    """
+    Jauges et compteurs du cache de réponses, lus à chaque export /metrics
+    """
+    metrics = get_metrics()
+    for name, kind, key, help_text in (
+        ("answer_cache_entries", "gauge", "entries", "Entrées du cache de réponses"),
+        ("answer_cache_bytes", "gauge", "bytes", "Mémoire du cache de réponses (octets)"),
+        ("answer_cache_hits_total", "counter", "hits", "Réponses servies depuis le cache"),
+        ("answer_cache_misses_total", "counter", "misses", "Recherches absentes du cache"),
+    ):
+        metrics.register_callback(
+            name, kind, help_text,
+            lambda key=key: answer_cache.stats()[key] if answer_cache is not None else None
+        )
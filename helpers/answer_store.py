@@ -0,0 +1,139 @@
+"""
+Réponses canoniques précalculées hors ligne pour les documents de la FAQ
+
+Le job helpers.precompute_answers génère avec le LLM une réponse canonique
+pour chaque document de la collection (à partir de ses voisins) et la range
+dans un fichier SQLite, par identifiant de document avec l'empreinte du
+contenu Q/R. Au service, un /chat dont le premier document est décisif est
+servi depuis ce fichier sans appel au LLM. Une entrée dont l'empreinte ne
+correspond plus au document est périmée : elle est ignorée au service et
+recalculée au passage suivant du job.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from helpers.chromadb import content_hash
+
+
+class PrecomputedAnswerStore:
+    """
+    Fichier clé-valeur (SQLite) identifiant du document -> (empreinte du contenu, réponse)
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        """
+        Args:
+            path: Fichier SQLite
+            read_only: Ouverture en lecture seule (service) ; le job écrit en parallèle (WAL)
+        """
+        self.path = path
+        if read_only:
+            self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30, check_same_thread=False)
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "doc_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, answer TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, doc_id: str, expected_hash: str) -> Optional[str]:
+        """
+        Réponse du document si elle a été calculée pour ce contenu, sinon None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content_hash, answer FROM answers WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[0] != expected_hash:
+                # La Q/R source a changé depuis le précalcul
+                self.stale += 1
+                return None
+            self.hits += 1
+            return row[1]
+
+    def lookup(self, document: Dict) -> Optional[str]:
+        """
+        Réponse précalculée d'un document retourné par la recherche (id, question, réponse)
+        """
+        return self.get(document["id"], content_hash(document["question"], document["answer"]))
+
+    def hashes(self) -> Dict[str, str]:
+        """
+        Identifiant -> empreinte du contenu de toutes les entrées (reprise du job)
+        """
+        with self._lock:
+            return dict(self._connection.execute("SELECT doc_id, content_hash FROM answers"))
+
+    def put_many(self, items: List[Tuple[str, str, str]]):
+        """
+        Écrit des entrées (identifiant, empreinte, réponse) ; un appel = un point de reprise
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO answers (doc_id, content_hash, answer, created_at) VALUES (?, ?, ?, ?)",
+                [(doc_id, digest, answer, now) for doc_id, digest, answer in items]
+            )
+            self._connection.commit()
+
+    def delete(self, doc_ids: Iterable[str]) -> int:
+        doc_ids = list(doc_ids)
+        with self._lock:
+            for i in range(0, len(doc_ids), 500):
+                chunk = doc_ids[i:i + 500]
+                self._connection.execute(
+                    f"DELETE FROM answers WHERE doc_id IN ({','.join('?' * len(chunk))})", chunk
+                )
+            self._connection.commit()
+        return len(doc_ids)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "path": self.path,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def answer_store_path() -> str:
+    """
+    Fichier des réponses précalculées (ANSWER_STORE_PATH, vide = désactivé)
+    """
+    return os.getenv("ANSWER_STORE_PATH", "./data/precomputed_answers.sqlite")
+
+
+def answer_store_from_env() -> Optional[PrecomputedAnswerStore]:
+    """
+    Store en lecture seule pour le service, ou None s'il est désactivé ou pas encore créé
+    """
+    path = answer_store_path()
+    if not path or not os.path.exists(path):
+        return None
+    return PrecomputedAnswerStore(path, read_only=True)
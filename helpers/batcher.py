@@ -0,0 +1,114 @@
+"""
+Micro-batching des recherches concurrentes
+
+Les recherches /search et /chat arrivant dans une même fenêtre de quelques
+millisecondes sont regroupées en un seul passage d'embedding et une seule
+requête ChromaDB vectorisée.
+"""
+
+import asyncio
+import os
+from typing import Dict, List, Tuple
+
+from helpers.chromadb import get_rag_system
+from helpers.concurrency import run_blocking
+from helpers.metrics import request_timings
+
+
+class QueryBatcher:
+    """
+    Regroupe les recherches individuelles en lots
+    """
+
+    def __init__(self, rag, window_ms: float = 5, max_batch_size: int = 32):
+        """
+        Args:
+            rag: Système RAG exécutant les lots (embed_and_search_batch)
+            window_ms: Durée maximale d'attente avant d'envoyer un lot incomplet
+            max_batch_size: Taille à partir de laquelle le lot est envoyé immédiatement
+        """
+        self.rag = rag
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._timer = None
+        # Lots en cours : la boucle ne garde qu'une référence faible aux tâches
+        self._tasks = set()
+
+        self.batches = 0
+        self.queries = 0
+
+    async def search(self, query: str, n_results: int = 5) -> Tuple[List[float], List[Dict]]:
+        """
+        Ajoute une recherche au lot courant et attend son résultat (embedding, documents)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, n_results, future, request_timings.get()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        queries = [query for query, _, _, _ in batch]
+        n_results = max(n for _, n, _, _ in batch)
+        self.batches += 1
+        self.queries += len(batch)
+
+        # Durées des étapes du lot, reportées ensuite sur chaque requête du lot
+        batch_timings = {}
+        request_timings.set(batch_timings)
+
+        try:
+            embeddings, results = await run_blocking(self.rag.embed_and_search_batch, queries, n_results)
+        except Exception as e:
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, n, future, timings), embedding, documents in zip(batch, embeddings, results):
+            if timings is not None:
+                for name, value in batch_timings.items():
+                    timings[name] = timings.get(name, 0.0) + value
+            if not future.done():
+                future.set_result((embedding, documents[:n]))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "average_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0
+        }
+
+
+# Instance globale du micro-batcher
+query_batcher = None
+
+
+def get_query_batcher() -> QueryBatcher:
+    """
+    Retourne l'instance globale du micro-batcher, configurée par variables d'environnement
+    """
+    global query_batcher
+    if query_batcher is None:
+        query_batcher = QueryBatcher(
+            get_rag_system(),
+            window_ms=float(os.getenv("MICRO_BATCH_WINDOW_MS", 5)),
+            max_batch_size=int(os.getenv("MICRO_BATCH_MAX_SIZE", 32))
+        )
+    return query_batcher
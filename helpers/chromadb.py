@@ -1 +1,1057 @@
-
+import numpy as np
+from typing import TYPE_CHECKING, List, Dict, Callable, Optional, Tuple, Iterable, Union
+import os
+import threading
+import time
+import hashlib
+from helpers.concurrency import run_blocking
+from helpers.metrics import get_metrics
+from helpers.answer_cache import get_answer_cache
+from helpers.question_index import QuestionIndex
+from helpers.lexical_index import LexicalIndex
+from helpers.ingestion import BulkIngestor
+from helpers.dataset_loader import detect_format, iter_dataframes
+from helpers.snapshot import IndexSnapshot, SnapshotReader, snapshot_source
+from helpers.embeddings import embedding_factory_from_env
+from helpers.vector_engine import VectorEngine, engine_settings_from_env, select_engine
+from helpers.reranker import reranker_from_env
+from helpers.dedup import collapse_records, dedup_settings_from_env, unchanged_groups
+
+# pandas ne sert qu'à l'ingestion : l'API ne l'importe jamais
+if TYPE_CHECKING:
+    import chromadb
+    import pandas as pd
+
+
+def document_id(question: str) -> str:
+    """
+    Identifiant stable d'un document, dérivé du texte de la question
+    (indépendant de la position de la ligne dans le dataset)
+    """
+    return "faq_" + hashlib.sha1(str(question).strip().encode("utf-8")).hexdigest()[:16]
+
+
+def content_hash(question: str, answer: str) -> str:
+    """
+    Empreinte du contenu Q/R, pour détecter les réponses modifiées
+    """
+    return hashlib.sha1(f"{question}\n{answer}".encode("utf-8")).hexdigest()
+
+
+def with_exact_match(match: Dict, documents: List[Dict], n_results: int) -> List[Dict]:
+    """
+    Document de la question exacte en tête, puis les autres documents de la
+    recherche (sans le doublon), n_results au total
+    """
+    return [match] + [doc for doc in documents if doc["id"] != match["id"]][:n_results - 1]
+
+
+# Clients ChromaDB par dossier : un seul client (et un seul verrou) pour toutes les collections
+chroma_clients = {}
+chroma_clients_lock = threading.Lock()
+
+
+def chroma_path() -> str:
+    """
+    Dossier de la base ChromaDB (CHROMA_PATH)
+    """
+    return os.getenv("CHROMA_PATH", "./data/chroma_langchain_db")
+
+
+def get_chroma_client(path: Optional[str] = None) -> Tuple["chromadb.api.ClientAPI", threading.Lock]:
+    """
+    Client persistant du dossier, créé au premier appel, et verrou qui sérialise ses requêtes
+    """
+    path = path or chroma_path()
+    with chroma_clients_lock:
+        if path not in chroma_clients:
+            # Créer le dossier si nécessaire
+            os.makedirs(path, exist_ok=True)
+            # Import différé : en mode snapshot, l'API n'importe pas le client ChromaDB
+            import chromadb
+            chroma_clients[path] = (chromadb.PersistentClient(path=path), threading.Lock())
+        return chroma_clients[path]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict]], k: int = 60) -> List[Dict]:
+    """
+    Fusionne plusieurs classements (Reciprocal Rank Fusion) :
+    score = somme de 1 / (k + rang) sur les classements où le document apparaît
+    Le premier classement fournit les champs du document (ex: distance dense)
+    """
+    fused = {}
+    scores = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            fused.setdefault(doc["id"], doc)
+            scores[doc["id"]] = scores.get(doc["id"], 0.0) + 1.0 / (k + rank)
+    
+    ordered = sorted(fused, key=lambda doc_id: scores[doc_id], reverse=True)
+    return [{**fused[doc_id], "score": round(scores[doc_id], 6)} for doc_id in ordered]
+
+
+class RAGSystem:
+    """
+    Système RAG complet pour le chatbot e-commerce
+    """
+    
+    def __init__(self, collection_name: str = "ecommerce_faq", shared: Optional["RAGSystem"] = None):
+        """
+        Initialise le système RAG avec ChromaDB
+        
+        Args:
+            collection_name: Collection servie
+            shared: Système dont le modèle d'embedding et le re-ranking sont
+                réutilisés (collections chargées à la demande par le registre)
+        """
+        self.collection_name = collection_name
+        self.client = None
+        self.collection = None
+        # Fabrique picklable : les processus d'ingestion recréent leur propre modèle
+        # Backend, threads, taille de lot et cache : variables EMBEDDING_*
+        if shared is not None:
+            self.embedding_function_factory = shared.embedding_function_factory
+            self.embedding_function = shared.embedding_function
+        else:
+            self.embedding_function_factory = embedding_factory_from_env()
+            # Fonction des requêtes : sans cache persistant sauf EMBEDDING_QUERY_CACHE=true
+            # (l'ingestion recrée la sienne depuis la fabrique, avec le cache)
+            self.embedding_function = self.embedding_function_factory(queries=True)
+        self.change_listeners = []
+        # Le client ChromaDB 0.4.x n'est pas sûr pour des requêtes concurrentes
+        # (télémétrie interne) : les requêtes issues de l'exécuteur sont sérialisées ;
+        # le verrou du client partagé le remplace (initialize_chromadb)
+        self.query_lock = threading.Lock()
+        self.question_index = QuestionIndex()
+        self.exact_match_enabled = os.getenv("EXACT_MATCH_ENABLED", "true").lower() == "true"
+        # Recherche lexicale BM25 et mode hybride (dense + BM25 fusionnés par RRF)
+        self.lexical_index = LexicalIndex()
+        self.lexical_enabled = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+        self.default_search_mode = os.getenv("RETRIEVAL_MODE", "dense").lower()
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", 20))
+        self.rrf_k = int(os.getenv("RRF_K", 60))
+        # Re-ranking des candidats par un cross-encoder (RERANK_ENABLED) ; None : ordre de la recherche
+        self.reranker = shared.reranker if shared is not None else reranker_from_env()
+        # Moteur vectoriel en mémoire (NumPy exact ou IVF) choisi selon la taille ;
+        # None : requêtes ChromaDB (HNSW)
+        self.engine_settings = engine_settings_from_env()
+        # Regroupement des quasi-doublons à l'ingestion (DEDUP_ENABLED)
+        self.dedup_settings = dedup_settings_from_env()
+        self.vector_engine = None
+        # Service en lecture seule depuis le snapshot publié par l'écrivain (plusieurs workers)
+        self.snapshot_reader = None
+        if os.getenv("SNAPSHOT_SERVING_ENABLED", "false").lower() == "true":
+            self.initialize_snapshot()
+        else:
+            self.initialize_chromadb()
+    
+    def initialize_chromadb(self):
+        """
+        Initialise la connexion à ChromaDB
+        """
+        # Client partagé par toutes les collections du dossier, avec son verrou de requêtes
+        self.client, self.query_lock = get_chroma_client()
+        
+        try:
+            self.collection = self.client.get_collection(
+                name=self.collection_name,
+                embedding_function=self.embedding_function
+            )
+            print(f"✅ Collection '{self.collection_name}' chargée")
+        except:
+            self.collection = self.client.create_collection(
+                name=self.collection_name,
+                metadata={"description": "FAQ E-commerce chatbot"},
+                embedding_function=self.embedding_function
+            )
+            print(f"✅ Collection '{self.collection_name}' créée")
+        
+        self.rebuild_indexes()
+    
+    def initialize_snapshot(self):
+        """
+        Mode lecture seule : pas de client ChromaDB, la recherche se fait sur le
+        snapshot projeté en mémoire et partagé entre les workers
+        Les nouvelles versions publiées sont chargées au fil des requêtes
+        """
+        self.snapshot_reader = SnapshotReader(
+            snapshot_source(),
+            refresh_seconds=float(os.getenv("SNAPSHOT_REFRESH_SECONDS", 5)),
+            on_load=self.load_snapshot,
+            verify=os.getenv("SNAPSHOT_VERIFY", "false").lower() == "true"
+        )
+        if not self.snapshot_reader.refresh():
+            print(f"⚠️  Aucun snapshot publié dans {self.snapshot_reader.path}")
+    
+    def load_snapshot(self, snapshot: IndexSnapshot):
+        """
+        Nouvelle version du snapshot : l'index BM25 figé qu'elle contient
+        remplace l'index lexical (rien n'est reconstruit dans le worker)
+        """
+        if self.lexical_enabled:
+            self.lexical_index = snapshot.lexical_index
+        
+        print(f"✅ Snapshot {snapshot.version} chargé: {len(snapshot)} documents")
+        if self.snapshot_reader.snapshot is not None:
+            self.notify_change()
+    
+    def current_snapshot(self) -> Optional[IndexSnapshot]:
+        """
+        Version du snapshot à utiliser (mode lecture seule)
+        """
+        return self.snapshot_reader.current()
+    
+    def require_writable(self):
+        if self.snapshot_reader is not None:
+            raise RuntimeError("Mode snapshot en lecture seule : l'ingestion se fait dans le processus écrivain")
+    
+    def rebuild_indexes(self, page_size: int = 100000):
+        """
+        Reconstruit les index en mémoire (questions normalisées, BM25)
+        depuis les métadonnées de la collection
+        """
+        self.question_index.clear()
+        self.lexical_index.clear()
+        total = self.get_collection_count()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(
+                include=["metadatas", "documents"],
+                limit=page_size,
+                offset=offset
+            )
+            self.index_batch(page['ids'], page['metadatas'], page['documents'])
+        
+        if len(self.question_index):
+            print(f"✅ Index des questions: {len(self.question_index)} entrées")
+        if len(self.lexical_index):
+            print(f"✅ Index BM25: {len(self.lexical_index)} documents "
+                  f"({self.lexical_index.memory_bytes() / 1e6:.1f} Mo de postings)")
+        
+        self.load_vector_engine(page_size)
+    
+    def load_vector_engine(self, page_size: int = 100000):
+        """
+        Charge les vecteurs de la collection dans le moteur en mémoire choisi
+        d'après la taille de la collection (ou VECTOR_ENGINE) ; le moteur
+        précédent sert les requêtes jusqu'au remplacement
+        """
+        settings = self.engine_settings
+        total = self.get_collection_count()
+        engine = select_engine(settings["mode"], total, settings["numpy_max"], settings["ivf_max"])
+        if engine == "chroma" or total == 0:
+            self.vector_engine = None
+            return
+        
+        start = time.perf_counter()
+        ids, records = [], []
+        # Matrice float32 allouée à la première page puis remplie page par page
+        # (pas de liste de listes Python de toute la collection)
+        vectors = None
+        for offset in range(0, total, page_size):
+            page = self.collection.get(
+                include=["embeddings", "metadatas", "documents"],
+                limit=min(page_size, total - offset),
+                offset=offset
+            )
+            if not page['ids']:
+                break
+            if vectors is None:
+                vectors = np.empty((total, len(page['embeddings'][0])), dtype=np.float32)
+            vectors[len(ids):len(ids) + len(page['ids'])] = page['embeddings']
+            ids.extend(page['ids'])
+            records.extend(
+                {"document": document, "question": metadata['question'], "answer": metadata['answer']}
+                for document, metadata in zip(page['documents'], page['metadatas'])
+            )
+        if vectors is None:
+            self.vector_engine = None
+            return
+        
+        self.vector_engine = VectorEngine(
+            ids, vectors[:len(ids)], records,
+            kind=engine, n_lists=settings["n_lists"], n_probe=settings["n_probe"]
+        )
+        print(f"✅ Moteur vectoriel {engine}: {len(ids)} documents "
+              f"({self.vector_engine.memory_bytes() / 1e6:.1f} Mo, {time.perf_counter() - start:.2f}s)")
+    
+    def index_batch(self, ids: List[str], metadatas: List[Dict], documents: Optional[List[str]] = None):
+        """
+        Ajoute un lot de documents écrits aux index en mémoire
+        """
+        self.question_index.add_many(ids, metadatas, documents)
+        if self.lexical_enabled:
+            self.lexical_index.add_many(ids, metadatas, documents)
+    
+    def load_dataset(self, file_path: str) -> "pd.DataFrame":
+        """
+        Charge le dataset FAQ (JSON, JSONL ou CSV, détecté d'après le contenu)
+        Le fichier n'est lu qu'une fois ; pour les gros fichiers, préférer
+        iter_dataframes qui garde une mémoire bornée
+        """
+        print(f"📂 Chargement du dataset: {file_path}")
+        
+        # Vérifier si le fichier existe
+        if not os.path.exists(file_path):
+            print(f"❌ Fichier non trouvé: {file_path}")
+            return None
+        
+        try:
+            file_format = detect_format(file_path)
+            print(f"   Format détecté: {file_format}")
+            chunks = list(iter_dataframes(file_path))
+        except Exception as e:
+            print(f"   ❌ Erreur de lecture: {e}")
+            return None
+        
+        if not chunks:
+            print(f"❌ Impossible de charger")
+            return None
+        
+        import pandas as pd
+        
+        df = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+        print(f"✅ Dataset chargé: {len(df)} entrées")
+        return df
+    
+    def populate_vectorstore(self, df: "pd.DataFrame"):
+        """
+        Remplit la base vectorielle
+        """
+        if df is None or df.empty:
+            print("❌ DataFrame vide")
+            return
+        
+        print(f"📝 Préparation de {len(df)} documents...")
+        
+        ids, documents, metadatas = self.build_records(df)
+        
+        # Insérer par lots (embedding parallèle, écriture pipelinée)
+        if self.dedup_settings["enabled"]:
+            with self.make_ingestor() as ingestor:
+                ids, documents, metadatas, embeddings, _ = self.collapse_near_duplicates(
+                    ids, documents, metadatas, ingestor
+                )
+                summary = ingestor.ingest(ids, documents, metadatas, on_batch=self.index_batch, embeddings=embeddings)
+        else:
+            summary = self.write_records(ids, documents, metadatas)
+        
+        print(f"✅ {summary['rows']} documents insérés ({summary['rows_per_second']} lignes/s)")
+        self.load_vector_engine()
+        self.notify_change()
+    
+    def write_records(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict],
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ) -> Dict:
+        """
+        Embedde et écrit des documents avec le pipeline d'ingestion en masse
+        """
+        with self.make_ingestor(workers, batch_size) as ingestor:
+            return ingestor.ingest(ids, documents, metadatas, on_batch=self.index_batch)
+    
+    def collapse_near_duplicates(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict],
+        ingestor: BulkIngestor
+    ) -> Tuple[List[str], List[str], List[Dict], List[List[float]], Dict]:
+        """
+        Embedde les documents puis garde un document par groupe de quasi-doublons
+        (les embeddings gardés sont écrits sans être recalculés)
+        """
+        embeddings = ingestor.embed(documents)
+        settings = self.dedup_settings
+        ids, documents, metadatas, embeddings, summary = collapse_records(
+            ids, documents, metadatas, embeddings,
+            answer_threshold=settings["answer_threshold"],
+            embedding_threshold=settings["embedding_threshold"],
+            num_perm=settings["num_perm"],
+            bands=settings["bands"]
+        )
+        if summary["collapsed"]:
+            print(f"🧹 Quasi-doublons: {summary['rows']} lignes -> {summary['documents']} documents "
+                  f"({summary['groups']} groupes, -{summary['collapsed'] / summary['rows']:.0%})")
+        return ids, documents, metadatas, embeddings, summary
+    
+    def make_ingestor(self, workers: Optional[int] = None, batch_size: Optional[int] = None) -> BulkIngestor:
+        """
+        Crée le pipeline d'ingestion pour la collection
+        Nombre de processus et taille des lots : INGEST_WORKERS / INGEST_BATCH_SIZE par défaut
+        """
+        self.require_writable()
+        if workers is None and os.getenv("INGEST_WORKERS"):
+            workers = int(os.getenv("INGEST_WORKERS"))
+        return BulkIngestor(
+            self.collection,
+            self.embedding_function_factory,
+            workers=workers,
+            batch_size=batch_size or int(os.getenv("INGEST_BATCH_SIZE", 1000))
+        )
+    
+    @staticmethod
+    def build_records(df: "pd.DataFrame", seen: Optional[set] = None) -> Tuple[List[str], List[str], List[Dict]]:
+        """
+        Construit les identifiants, documents et métadonnées à partir du DataFrame
+        Les questions en double ne sont gardées qu'une fois (même identifiant) ;
+        seen permet de partager cette déduplication entre plusieurs morceaux
+        """
+        ids = []
+        documents = []
+        metadatas = []
+        if seen is None:
+            seen = set()
+        
+        for idx, question, answer in zip(df.index, df['Questions'], df['Answers']):
+            question = str(question)
+            answer = str(answer)
+            doc_id = document_id(question)
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            
+            ids.append(doc_id)
+            documents.append(f"Question: {question}\nReponse: {answer}")
+            metadatas.append({
+                "question": question,
+                "answer": answer,
+                "index": int(idx),
+                "content_hash": content_hash(question, answer)
+            })
+        
+        return ids, documents, metadatas
+    
+    def get_content_hashes(
+        self,
+        page_size: int = 100000,
+        groups: Optional[Dict[str, Tuple[List[str], Optional[str]]]] = None
+    ) -> Dict[str, Optional[str]]:
+        """
+        Identifiant -> empreinte du contenu pour tous les documents de la collection
+        groups, s'il est donné, reçoit les documents qui regroupent plusieurs lignes :
+        identifiant -> (identifiants des lignes, members_hash)
+        """
+        self.require_writable()
+        hashes = {}
+        total = self.get_collection_count()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            for doc_id, metadata in zip(page['ids'], page['metadatas']):
+                metadata = metadata or {}
+                hashes[doc_id] = metadata.get("content_hash")
+                if groups is not None and metadata.get("alternate_questions"):
+                    members = [doc_id] + [document_id(question) for question in metadata["alternate_questions"].splitlines()]
+                    groups[doc_id] = (members, metadata.get("members_hash"))
+        return hashes
+    
+    def sync_vectorstore(
+        self,
+        data: Union["pd.DataFrame", Iterable["pd.DataFrame"]],
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Synchronisation incrémentale et idempotente de la collection avec le dataset :
+        seuls les documents nouveaux ou modifiés sont (ré)embeddés,
+        les documents absents du dataset sont supprimés
+        Avec DEDUP_ENABLED, les groupes inchangés ne sont pas réembeddés : seules les
+        lignes nouvelles ou modifiées et les groupes voisins sont regroupés à nouveau
+        Relancée après un crash, elle reprend après les lots déjà écrits
+        
+        Args:
+            data: DataFrame complet, ou morceaux successifs (iter_dataframes) pour
+                  synchroniser un gros fichier avec une mémoire bornée
+        
+        Returns:
+            Résumé : nombre de documents ajoutés, modifiés, supprimés et inchangés
+        """
+        import pandas as pd
+        
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        
+        start = time.perf_counter()
+        dedup = self.dedup_settings
+        groups = {} if dedup["enabled"] else None
+        existing = self.get_content_hashes(groups=groups)
+        seen = set()
+        # Documents gardés (sans les formulations regroupées) : les autres sont supprimés
+        stored = set()
+        rows = added = updated = written = collapsed = 0
+        write_seconds = 0.0
+        
+        with self.make_ingestor(workers, batch_size) as ingestor:
+            for df in chunks:
+                if df is None or df.empty:
+                    continue
+                rows += len(df)
+                ids, documents, metadatas = self.build_records(df, seen)
+                embeddings = None
+                if dedup["enabled"] and ids:
+                    # Groupes formés à l'intérieur de chaque morceau lu (chunk_size) ;
+                    # les documents inchangés sont gardés sans embedding
+                    unchanged, pending = unchanged_groups(
+                        ids, metadatas, existing, groups,
+                        answer_threshold=dedup["answer_threshold"],
+                        num_perm=dedup["num_perm"],
+                        bands=dedup["bands"]
+                    )
+                    stored.update(unchanged)
+                    collapsed += sum(size - 1 for size in unchanged.values())
+                    ids = [ids[i] for i in pending]
+                    documents = [documents[i] for i in pending]
+                    metadatas = [metadatas[i] for i in pending]
+                    if ids:
+                        ids, documents, metadatas, embeddings, summary = self.collapse_near_duplicates(
+                            ids, documents, metadatas, ingestor
+                        )
+                        collapsed += summary["collapsed"]
+                stored.update(ids)
+                
+                to_upsert = []
+                for i, doc_id in enumerate(ids):
+                    if doc_id not in existing:
+                        added += 1
+                        to_upsert.append(i)
+                    elif existing[doc_id] != metadatas[i]["content_hash"]:
+                        updated += 1
+                        to_upsert.append(i)
+                
+                if to_upsert:
+                    ingestion = ingestor.ingest(
+                        [ids[j] for j in to_upsert],
+                        [documents[j] for j in to_upsert],
+                        [metadatas[j] for j in to_upsert],
+                        embeddings=[embeddings[j] for j in to_upsert] if embeddings is not None else None
+                    )
+                    written += ingestion["rows"]
+                    write_seconds += ingestion["seconds"]
+        
+        # Ne jamais vider la collection à cause d'un dataset vide ou illisible
+        if rows == 0:
+            print("❌ Dataset vide")
+            return None
+        
+        to_delete = [doc_id for doc_id in existing if doc_id not in stored]
+        for i in range(0, len(to_delete), 5000):
+            self.collection.delete(ids=to_delete[i:i+5000])
+        
+        if written or to_delete:
+            self.rebuild_indexes()
+            self.notify_change()
+        
+        return {
+            "added": added,
+            "updated": updated,
+            "deleted": len(to_delete),
+            "unchanged": len(stored) - written,
+            "duplicates_skipped": rows - len(seen),
+            "near_duplicates_collapsed": collapsed,
+            "rows_per_second": round(written / write_seconds, 1) if write_seconds > 0 else None,
+            "seconds": round(time.perf_counter() - start, 3)
+        }
+    
+    def iter_documents(self, page_size: int = 10000) -> Iterable[Dict]:
+        """
+        Parcourt tous les documents (id, question, réponse, document, empreinte du contenu)
+        """
+        if self.snapshot_reader is not None:
+            snapshot = self.current_snapshot()
+            for record in snapshot.iter_records() if snapshot is not None else []:
+                yield {**record, "content_hash": content_hash(record["question"], record["answer"])}
+            return
+        
+        total = self.get_collection_count()
+        for offset in range(0, total, page_size):
+            page = self.collection.get(include=["metadatas", "documents"], limit=page_size, offset=offset)
+            for doc_id, metadata, document in zip(page['ids'], page['metadatas'], page['documents']):
+                yield {
+                    "id": doc_id,
+                    "question": metadata['question'],
+                    "answer": metadata['answer'],
+                    "document": document,
+                    "content_hash": content_hash(metadata['question'], metadata['answer'])
+                }
+    
+    def add_change_listener(self, callback: Callable[[], None]):
+        """
+        Enregistre une fonction appelée quand le contenu de la collection change
+        (ex: invalidation du cache de réponses)
+        """
+        self.change_listeners.append(callback)
+    
+    def notify_change(self):
+        """
+        Prévient les abonnés que la collection a été modifiée
+        """
+        for callback in self.change_listeners:
+            callback()
+    
+    def embedding_stats(self) -> Dict:
+        """
+        Configuration du backend d'embedding et efficacité du cache persistant
+        """
+        factory = self.embedding_function_factory
+        stats_method = getattr(self.embedding_function, "stats", None)
+        return {
+            "backend": getattr(factory, "backend", None),
+            "threads": getattr(factory, "threads", None),
+            "batch_size": getattr(factory, "batch_size", None),
+            "query_cache": getattr(factory, "query_cache", None),
+            "cache": stats_method() if stats_method is not None else None
+        }
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Calcule l'embedding d'une requête avec la fonction d'embedding de la collection
+        """
+        return self.embed_queries([query])[0]
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Calcule les embeddings de plusieurs requêtes en un seul passage du modèle
+        """
+        with get_metrics().stage("embedding"):
+            return [list(embedding) for embedding in self.embedding_function(queries)]
+    
+    def lookup_question(self, query: str) -> Optional[Dict]:
+        """
+        Chemin rapide : document dont la question normalisée est identique à la requête
+        """
+        if not self.exact_match_enabled:
+            return None
+        if self.snapshot_reader is not None:
+            snapshot = self.current_snapshot()
+            return snapshot.lookup_question(query) if snapshot is not None else None
+        return self.question_index.lookup(query)
+    
+    def resolve_search_mode(self, mode: Optional[str] = None) -> str:
+        """
+        Mode de recherche effectif : "dense", "lexical" ou "hybrid"
+        (RETRIEVAL_MODE par défaut ; dense si l'index BM25 est désactivé)
+        """
+        mode = (mode or self.default_search_mode).lower()
+        if mode not in ("dense", "lexical", "hybrid"):
+            raise ValueError(f"Mode de recherche inconnu: {mode}")
+        if mode != "dense" and not self.lexical_enabled:
+            return "dense"
+        return mode
+    
+    def search_documents(
+        self,
+        query: str,
+        n_results: int = 5,
+        mode: Optional[str] = None,
+        exact_match: bool = True
+    ) -> List[Dict]:
+        """
+        Recherche les documents pertinents
+        Une question identique à une question de la FAQ place son document en
+        tête, complété par les n_results - 1 meilleurs autres résultats
+        exact_match=False : toujours interroger l'index (voisins d'une question de la FAQ)
+        """
+        mode = self.resolve_search_mode(mode)
+        match = self.lookup_question(query) if exact_match else None
+        if match is not None and n_results <= 1:
+            return [match]
+        
+        results = self.search_ranked(query, n_results, mode)
+        return with_exact_match(match, results, n_results) if match is not None else results
+    
+    def search_ranked(self, query: str, n_results: int, mode: str) -> List[Dict]:
+        """
+        Recherche dans l'index (dense, lexicale ou hybride) puis re-ranking, sans chemin rapide
+        """
+        candidates = self.rerank_candidates(n_results)
+        if mode == "lexical":
+            return self.rerank(query, self.search_lexical(query, candidates), n_results)
+        
+        try:
+            query_embedding = self.embed_query(query)
+        except Exception as e:
+            print(f"❌ Erreur embedding: {e}")
+            get_metrics().inc("rag_errors_total", stage="embedding")
+            return []
+        
+        if mode == "hybrid":
+            results = self.search_hybrid(query, query_embedding, candidates)
+        else:
+            results = self.search_by_embedding(query_embedding, candidates)
+        return self.rerank(query, results, n_results)
+    
+    def rerank_candidates(self, n_results: int) -> int:
+        """
+        Documents demandés à la première étape : RERANK_CANDIDATES si le re-ranking est actif
+        """
+        if self.reranker is None:
+            return n_results
+        return max(n_results, self.reranker.candidates)
+    
+    def rerank(self, query: str, documents: List[Dict], n_results: int = 5) -> List[Dict]:
+        """
+        Deuxième étape : reclassement des candidats par le cross-encoder, puis n_results premiers
+        """
+        if self.reranker is None:
+            return documents[:n_results]
+        return self.reranker.rerank(query, documents, n_results)
+    
+    def search_lexical(self, query: str, n_results: int = 5) -> List[Dict]:
+        """
+        Recherche BM25 sur l'index lexical ; les documents sont relus dans la collection
+        """
+        with get_metrics().stage("lexical_query"):
+            ranking = self.lexical_index.search(query, n_results)
+            if not ranking:
+                return []
+            
+            ids = [doc_id for doc_id, _ in ranking]
+            try:
+                if self.snapshot_reader is not None:
+                    snapshot = self.current_snapshot()
+                    found = snapshot.get(ids) if snapshot is not None else {}
+                else:
+                    with self.query_lock:
+                        page = self.collection.get(ids=ids, include=["metadatas", "documents"])
+                    found = {
+                        doc_id: {**metadata, "document": document}
+                        for doc_id, document, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+                    }
+            except Exception as e:
+                print(f"❌ Erreur recherche lexicale: {e}")
+                get_metrics().inc("rag_errors_total", stage="lexical_query")
+                return []
+        
+        results = []
+        for doc_id, score in ranking:
+            if doc_id not in found:
+                continue
+            metadata = found[doc_id]
+            document = metadata['document']
+            results.append({
+                "id": doc_id,
+                "document": document,
+                "question": metadata['question'],
+                "answer": metadata['answer'],
+                "distance": None,
+                "score": round(score, 4)
+            })
+        return results
+    
+    def search_hybrid(
+        self,
+        query: str,
+        query_embedding: List[float],
+        n_results: int = 5,
+        dense_results: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """
+        Recherche hybride : classements dense et BM25 fusionnés par Reciprocal Rank Fusion
+        dense_results permet de réutiliser une recherche dense déjà faite (micro-batching)
+        """
+        candidates = max(n_results, self.hybrid_candidates)
+        if dense_results is None:
+            dense_results = self.search_by_embedding(query_embedding, candidates)
+        lexical_results = self.search_lexical(query, candidates)
+        return reciprocal_rank_fusion([dense_results, lexical_results], k=self.rrf_k)[:n_results]
+    
+    def search_by_embedding(self, query_embedding: List[float], n_results: int = 5) -> List[Dict]:
+        """
+        Recherche les documents pertinents à partir d'un embedding déjà calculé
+        """
+        return self.search_by_embeddings([query_embedding], n_results)[0]
+    
+    def search_by_embeddings(self, query_embeddings: List[List[float]], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Recherche vectorisée : une seule requête ChromaDB pour plusieurs embeddings
+        """
+        if self.snapshot_reader is not None:
+            return self.search_snapshot(query_embeddings, n_results)
+        engine = self.vector_engine
+        if engine is not None:
+            return self.search_engine(engine, query_embeddings, n_results)
+        
+        try:
+            with get_metrics().stage("vector_query"), self.query_lock:
+                results = self.collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=n_results
+                )
+            
+            batch_results = []
+            for q in range(len(query_embeddings)):
+                formatted_results = []
+                if results['documents'] and results['documents'][q]:
+                    for i in range(len(results['documents'][q])):
+                        formatted_results.append({
+                            "id": results['ids'][q][i],
+                            "document": results['documents'][q][i],
+                            "question": results['metadatas'][q][i]['question'],
+                            "answer": results['metadatas'][q][i]['answer'],
+                            "distance": results['distances'][q][i] if 'distances' in results else None
+                        })
+                batch_results.append(formatted_results)
+            
+            return batch_results
+            
+        except Exception as e:
+            print(f"❌ Erreur recherche: {e}")
+            get_metrics().inc("rag_errors_total", stage="vector_query")
+            return [[] for _ in query_embeddings]
+    
+    def release(self):
+        """
+        Libère les segments de la collection gardés par le client partagé (index
+        HNSW, métadonnées) : ChromaDB 0.4 les conserve sinon jusqu'à la fin du
+        processus. Ils sont rouverts à la prochaine requête sur la collection.
+        """
+        manager = getattr(getattr(self.client, "_server", None), "_manager", None)
+        if manager is None or self.collection is None:
+            return
+        # API interne du gestionnaire de segments local : sans effet si elle change
+        try:
+            with manager._lock:
+                manager._vector_instances_file_handle_cache.cache.pop(self.collection.id, None)
+                for segment in manager._segment_cache.pop(self.collection.id, {}).values():
+                    instance = manager._instances.pop(segment["id"], None)
+                    if instance is not None:
+                        instance.stop()
+        except Exception as e:
+            print(f"⚠️  Segments de '{self.collection_name}' non libérés: {e}")
+    
+    def memory_bytes(self) -> int:
+        """
+        Estimation de la mémoire des index en mémoire de la collection
+        (moteur vectoriel avec sa copie des textes, BM25, index des questions)
+        """
+        total = self.question_index.memory_bytes()
+        if self.snapshot_reader is None:
+            total += self.lexical_index.memory_bytes()
+        if self.vector_engine is not None:
+            total += self.vector_engine.memory_bytes()
+        return total
+    
+    def vector_engine_stats(self) -> Dict:
+        """
+        Moteur de recherche dense utilisé (snapshot, chroma, numpy ou ivf) et sa taille
+        """
+        if self.snapshot_reader is not None:
+            return {"engine": "snapshot"}
+        if self.vector_engine is None:
+            return {"engine": "chroma"}
+        return self.vector_engine.stats()
+    
+    def search_engine(self, engine: VectorEngine, query_embeddings: List[List[float]], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Recherche par produits matriciels dans le moteur en mémoire (sans verrou ni client ChromaDB)
+        """
+        try:
+            with get_metrics().stage("vector_query"):
+                return engine.search(query_embeddings, n_results)
+        except Exception as e:
+            print(f"❌ Erreur recherche: {e}")
+            get_metrics().inc("rag_errors_total", stage="vector_query")
+            return [[] for _ in query_embeddings]
+    
+    def search_snapshot(self, query_embeddings: List[List[float]], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Recherche exhaustive sur le snapshot projeté en mémoire (sans verrou : lecture seule)
+        """
+        snapshot = self.current_snapshot()
+        if snapshot is None:
+            return [[] for _ in query_embeddings]
+        try:
+            with get_metrics().stage("vector_query"):
+                return snapshot.search(query_embeddings, n_results)
+        except Exception as e:
+            print(f"❌ Erreur recherche: {e}")
+            get_metrics().inc("rag_errors_total", stage="vector_query")
+            return [[] for _ in query_embeddings]
+    
+    def embed_and_search_batch(self, queries: List[str], n_results: int = 5) -> Tuple[List[List[float]], List[List[Dict]]]:
+        """
+        Un passage d'embedding et une requête vectorisée pour toutes les requêtes
+        Retourne les embeddings et les résultats dans l'ordre des requêtes
+        """
+        query_embeddings = self.embed_queries(queries)
+        return query_embeddings, self.search_by_embeddings(query_embeddings, n_results)
+    
+    def search_documents_batch(self, queries: List[str], n_results: int = 5, mode: Optional[str] = None) -> List[List[Dict]]:
+        """
+        Recherche les documents pertinents pour plusieurs requêtes, traitées en lot
+        Le document d'une question exacte est placé en tête de ses résultats
+        """
+        mode = self.resolve_search_mode(mode)
+        batch_results = [None] * len(queries)
+        matches = [self.lookup_question(query) for query in queries]
+        pending = []
+        for i, query in enumerate(queries):
+            if matches[i] is not None and n_results <= 1:
+                batch_results[i] = [matches[i]]
+            elif mode == "lexical":
+                results = self.search_lexical(query, self.rerank_candidates(n_results))
+                batch_results[i] = self.rerank(query, results, n_results)
+            else:
+                pending.append(i)
+        
+        if pending:
+            first_stage = self.rerank_candidates(n_results)
+            candidates = max(first_stage, self.hybrid_candidates) if mode == "hybrid" else first_stage
+            try:
+                pending_embeddings, pending_results = self.embed_and_search_batch(
+                    [queries[i] for i in pending], candidates
+                )
+            except Exception as e:
+                print(f"❌ Erreur embedding: {e}")
+                get_metrics().inc("rag_errors_total", stage="embedding")
+                pending_embeddings, pending_results = [None] * len(pending), [[] for _ in pending]
+            for i, query_embedding, results in zip(pending, pending_embeddings, pending_results):
+                if mode == "hybrid":
+                    results = self.search_hybrid(queries[i], query_embedding, first_stage, dense_results=results)
+                batch_results[i] = self.rerank(queries[i], results, n_results)
+        
+        # Questions exactes : leur document en tête des résultats
+        for i, match in enumerate(matches):
+            if match is not None and n_results > 1:
+                batch_results[i] = with_exact_match(match, batch_results[i], n_results)
+        return batch_results
+    
+    async def search_documents_async(self, query: str, n_results: int = 5, mode: Optional[str] = None) -> List[Dict]:
+        """
+        Version asynchrone de search_documents
+        L'embedding et la requête ChromaDB sont exécutés dans l'exécuteur partagé
+        """
+        return await run_blocking(self.search_documents, query, n_results, mode)
+    
+    async def rerank_async(self, query: str, documents: List[Dict], n_results: int = 5) -> List[Dict]:
+        """
+        Version asynchrone de rerank (notation dans l'exécuteur partagé)
+        """
+        if self.reranker is None:
+            return documents[:n_results]
+        return await run_blocking(self.rerank, query, documents, n_results)
+    
+    async def embed_query_async(self, query: str) -> List[float]:
+        """
+        Version asynchrone de embed_query
+        """
+        return await run_blocking(self.embed_query, query)
+    
+    async def search_by_embedding_async(self, query_embedding: List[float], n_results: int = 5) -> List[Dict]:
+        """
+        Version asynchrone de search_by_embedding
+        """
+        return await run_blocking(self.search_by_embedding, query_embedding, n_results)
+    
+    async def search_lexical_async(self, query: str, n_results: int = 5) -> List[Dict]:
+        """
+        Version asynchrone de search_lexical
+        """
+        return await run_blocking(self.search_lexical, query, n_results)
+    
+    async def search_hybrid_async(
+        self,
+        query: str,
+        query_embedding: List[float],
+        n_results: int = 5,
+        dense_results: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """
+        Version asynchrone de search_hybrid
+        """
+        return await run_blocking(self.search_hybrid, query, query_embedding, n_results, dense_results)
+    
+    async def search_documents_batch_async(self, queries: List[str], n_results: int = 5, mode: Optional[str] = None) -> List[List[Dict]]:
+        """
+        Version asynchrone de search_documents_batch
+        """
+        return await run_blocking(self.search_documents_batch, queries, n_results, mode)
+    
+    def get_collection_count(self) -> int:
+        """
+        Nombre de documents
+        """
+        if self.snapshot_reader is not None:
+            snapshot = self.current_snapshot()
+            return len(snapshot) if snapshot is not None else 0
+        try:
+            return self.collection.count()
+        except:
+            return 0
+
+
+def register_metrics(system: RAGSystem):
+    """
+    Jauges du système RAG, lues à chaque export /metrics
+    """
+    metrics = get_metrics()
+    metrics.register_callback(
+        "rag_vector_engine_bytes", "gauge", "Mémoire du moteur vectoriel en mémoire (octets)",
+        lambda: system.vector_engine.memory_bytes() if system.vector_engine is not None else None
+    )
+    metrics.register_callback(
+        "embedding_cache_hits_total", "counter", "Textes trouvés dans le cache d'embeddings",
+        lambda: getattr(system.embedding_function, "hits", None)
+    )
+    metrics.register_callback(
+        "embedding_cache_misses_total", "counter", "Textes embeddés faute d'entrée dans le cache",
+        lambda: getattr(system.embedding_function, "misses", None)
+    )
+    metrics.register_callback(
+        "rag_collection_documents", "gauge", "Documents dans la collection", system.get_collection_count
+    )
+    metrics.register_callback(
+        "rag_question_index_entries", "gauge", "Entrées de l'index des questions exactes",
+        lambda: len(system.question_index)
+    )
+    metrics.register_callback(
+        "rag_lexical_index_documents", "gauge", "Documents dans l'index BM25",
+        lambda: len(system.lexical_index)
+    )
+    metrics.register_callback(
+        "rag_lexical_index_bytes", "gauge", "Mémoire des postings BM25 (octets)",
+        lambda: system.lexical_index.memory_bytes()
+    )
+    metrics.register_callback(
+        "rerank_cache_hits_total", "counter", "Scores de re-ranking trouvés dans le cache",
+        lambda: system.reranker.cache.hits if system.reranker is not None else None
+    )
+    metrics.register_callback(
+        "rerank_cache_misses_total", "counter", "Paires notées par le cross-encoder faute d'entrée dans le cache",
+        lambda: system.reranker.cache.misses if system.reranker is not None else None
+    )
+
+
+# Instance globale (collection par défaut, DEFAULT_COLLECTION)
+rag_system = None
+rag_system_lock = threading.Lock()
+
+
+def get_rag_system() -> RAGSystem:
+    """
+    Retourne l'instance globale
+    """
+    global rag_system
+    if rag_system is None:
+        # Le préchauffage au démarrage construit l'instance depuis un thread
+        with rag_system_lock:
+            if rag_system is None:
+                system = RAGSystem(os.getenv("DEFAULT_COLLECTION", "ecommerce_faq"))
+                # Invalider le cache de réponses quand la collection change
+                system.add_change_listener(lambda: get_answer_cache().invalidate())
+                register_metrics(system)
+                rag_system = system
+    return rag_system
+
+
+async def get_rag_system_async() -> RAGSystem:
+    """
+    Instance globale depuis la boucle d'événements : si elle n'existe pas encore
+    (préchauffage en cours), elle est attendue dans l'exécuteur, sans bloquer
+    la boucle sur le verrou
+    """
+    if rag_system is not None:
+        return rag_system
+    return await run_blocking(get_rag_system)
\ No newline at end of file
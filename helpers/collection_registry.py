@@ -0,0 +1,264 @@
+"""
+Registre des collections servies par un même processus (multi-boutiques, multi-langues)
+
+Chaque requête peut choisir sa collection. La collection par défaut
+(DEFAULT_COLLECTION) est toujours chargée ; les autres sont chargées à la
+demande depuis le client ChromaDB partagé, avec le modèle d'embedding et le
+re-ranking de la collection par défaut, puis gardées dans un cache LRU :
+au-delà de COLLECTIONS_MAX_LOADED collections ou de COLLECTIONS_MAX_BYTES
+d'index en mémoire, les moins récemment utilisées sont déchargées (index en
+mémoire et segments du client ChromaDB) et rechargées à leur prochaine requête.
+
+Les requêtes prennent leur collection par acquire() et la rendent par
+release() : une collection évincée pendant qu'une requête l'utilise encore
+n'est libérée qu'à la fin de la dernière, sous le verrou des requêtes ChromaDB.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from helpers.chromadb import RAGSystem, get_rag_system
+from helpers.metrics import get_metrics
+
+
+class CollectionRegistry:
+    """
+    Cache LRU des systèmes RAG par collection, borné en nombre et en mémoire
+    """
+
+    def __init__(self, default: RAGSystem, max_loaded: int = 64, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Args:
+            default: Système de la collection par défaut (jamais déchargé)
+            max_loaded: Collections chargées en plus de la collection par défaut
+            max_bytes: Mémoire maximale estimée des index des collections chargées
+        """
+        self.default = default
+        self.max_loaded = max_loaded
+        self.max_bytes = max_bytes
+        self._systems = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        # Requêtes en cours par système, et systèmes évincés en attente de leur fin
+        self._users = {}
+        self._retired = set()
+
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def get(self, name: Optional[str] = None) -> RAGSystem:
+        """
+        Système RAG de la collection, chargé si besoin (bloquant : à appeler
+        dans l'exécuteur) ; KeyError si la collection n'existe pas
+        Sans suivi d'utilisation : une éviction concurrente peut le libérer,
+        les requêtes servies en parallèle passent par acquire()
+        """
+        return self._get(name, use=False)
+
+    def acquire(self, name: Optional[str] = None) -> RAGSystem:
+        """
+        Comme get(), la requête étant comptée jusqu'à release(system)
+        """
+        return self._get(name, use=True)
+
+    def release(self, system: RAGSystem):
+        """
+        Fin d'une requête prise par acquire() ; libère le système s'il a été
+        évincé entre-temps et que c'était la dernière requête
+        """
+        if system is self.default:
+            return
+        with self._lock:
+            users = self._users.get(system, 0) - 1
+            if users > 0:
+                self._users[system] = users
+                return
+            self._users.pop(system, None)
+            if system not in self._retired:
+                return
+            self._retired.discard(system)
+        self._close(system)
+
+    def _get(self, name: Optional[str], use: bool) -> RAGSystem:
+        if not name or name == self.default.collection_name:
+            return self.default
+
+        with self._lock:
+            system = self._touch(name, use)
+            if system is not None:
+                return system
+            # Un seul chargement par collection, les requêtes concurrentes l'attendent
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        with loading:
+            with self._lock:
+                system = self._touch(name, use)
+                if system is not None:
+                    return system
+            try:
+                system = self.load(name)
+                size = system.memory_bytes()
+            except Exception:
+                with self._lock:
+                    self._loading.pop(name, None)
+                raise
+            with self._lock:
+                self._loading.pop(name, None)
+                self._systems[name] = system
+                self._sizes[name] = size
+                self._bytes += size
+                if use:
+                    self._users[system] = self._users.get(system, 0) + 1
+                released = self._evict(keep=name)
+        for evicted in released:
+            self._close(evicted)
+        return system
+
+    def load(self, name: str) -> RAGSystem:
+        """
+        Ouvre une collection existante du client partagé et reconstruit ses index
+        """
+        if self.default.snapshot_reader is not None:
+            raise KeyError(f"Mode snapshot : seule la collection '{self.default.collection_name}' est servie")
+        try:
+            self.default.client.get_collection(name=name, embedding_function=self.default.embedding_function)
+        except ValueError:
+            raise KeyError(f"Collection inconnue: {name}")
+
+        start = time.perf_counter()
+        with get_metrics().stage("collection_load"):
+            system = RAGSystem(name, shared=self.default)
+        if system.vector_engine is not None:
+            # Le moteur en mémoire sert la recherche : l'index HNSW chargé par le client est inutile
+            self._close(system)
+        self.loads += 1
+        self.load_seconds += time.perf_counter() - start
+        return system
+
+    def evict(self, name: str) -> bool:
+        """
+        Décharge une collection (elle sera rechargée à sa prochaine requête)
+        """
+        with self._lock:
+            if name not in self._systems:
+                return False
+            system = self._remove(name)
+        if system is not None:
+            self._close(system)
+        return True
+
+    def loaded(self) -> Dict[str, int]:
+        """
+        Collections chargées (de la plus anciennement utilisée à la plus récente) et leur mémoire estimée
+        """
+        with self._lock:
+            return {name: self._sizes[name] for name in self._systems}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.loads
+            return {
+                "default": self.default.collection_name,
+                "loaded": len(self._systems),
+                "bytes": self._bytes,
+                "max_loaded": self.max_loaded,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "in_use": sum(self._users.values()),
+                "retired": len(self._retired),
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "load_seconds": round(self.load_seconds, 3)
+            }
+
+    def _touch(self, name: str, use: bool = False) -> Optional[RAGSystem]:
+        system = self._systems.get(name)
+        if system is not None:
+            self._systems.move_to_end(name)
+            self.hits += 1
+            if use:
+                self._users[system] = self._users.get(system, 0) + 1
+        return system
+
+    def _evict(self, keep: str) -> List[RAGSystem]:
+        """
+        Retire les collections en trop (sous self._lock) ; retourne celles à libérer
+        """
+        released = []
+        # Les collections froides partent d'abord ; celle qui vient d'être chargée reste
+        while len(self._systems) > 1 and (
+            len(self._systems) > self.max_loaded or self._bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._systems))
+            if oldest == keep:
+                break
+            system = self._remove(oldest)
+            if system is not None:
+                released.append(system)
+            self.evictions += 1
+        return released
+
+    def _remove(self, name: str) -> Optional[RAGSystem]:
+        """
+        Retire une collection du registre (sous self._lock) ; retourne le système
+        à libérer, ou None s'il sert encore des requêtes (libéré par release())
+        """
+        system = self._systems.pop(name)
+        self._bytes -= self._sizes.pop(name)
+        if self._users.get(system):
+            self._retired.add(system)
+            return None
+        return system
+
+    @staticmethod
+    def _close(system: RAGSystem):
+        # Segments arrêtés sans requête ChromaDB en cours (verrou du client partagé)
+        with system.query_lock:
+            system.release()
+
+
+# Instance globale du registre
+collection_registry = None
+collection_registry_lock = threading.Lock()
+
+
+def get_collection_registry() -> CollectionRegistry:
+    """
+    Retourne le registre global, configuré par variables d'environnement
+    """
+    global collection_registry
+    if collection_registry is None:
+        with collection_registry_lock:
+            if collection_registry is None:
+                collection_registry = CollectionRegistry(
+                    get_rag_system(),
+                    max_loaded=int(os.getenv("COLLECTIONS_MAX_LOADED", 64)),
+                    max_bytes=int(os.getenv("COLLECTIONS_MAX_BYTES", 1024 * 1024 * 1024))
+                )
+                register_metrics()
+    return collection_registry
+
+
+def register_metrics():
+    """
+    Jauges et compteurs du registre des collections, lus à chaque export /metrics
+    """
+    metrics = get_metrics()
+    for name, kind, key, help_text in (
+        ("collections_loaded", "gauge", "loaded", "Collections chargées en plus de la collection par défaut"),
+        ("collections_bytes", "gauge", "bytes", "Mémoire estimée des index des collections chargées (octets)"),
+        ("collections_loads_total", "counter", "loads", "Chargements de collections"),
+        ("collections_evictions_total", "counter", "evictions", "Collections déchargées (LRU, nombre ou mémoire)"),
+    ):
+        metrics.register_callback(
+            name, kind, help_text,
+            lambda key=key: collection_registry.stats()[key] if collection_registry is not None else None
+        )
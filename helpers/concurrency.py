@@ -0,0 +1,42 @@
+"""
+Exécution du travail bloquant (ChromaDB, embeddings, appels LLM synchrones)
+hors de la boucle d'événements de FastAPI
+"""
+
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Nombre de threads par défaut pour le travail bloquant
+DEFAULT_MAX_WORKERS = 8
+
+
+# Instance globale de l'exécuteur
+blocking_executor = None
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    """
+    Retourne l'exécuteur borné partagé (singleton)
+    La taille est configurable via la variable d'environnement RAG_EXECUTOR_WORKERS
+    """
+    global blocking_executor
+    if blocking_executor is None:
+        max_workers = int(os.getenv("RAG_EXECUTOR_WORKERS", DEFAULT_MAX_WORKERS))
+        blocking_executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="rag-blocking"
+        )
+    return blocking_executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Exécute une fonction bloquante dans l'exécuteur partagé et attend son résultat
+    Le contexte (contextvars) est propagé au thread, comme asyncio.to_thread
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_blocking_executor(), context.run, partial(func, *args, **kwargs))
@@ -0,0 +1,151 @@
+"""
+Assemblage du contexte du prompt LLM
+
+Avant de construire le prompt, les documents retrouvés sont filtrés :
+  - suppression des documents au-delà d'une distance maximale
+  - suppression des réponses quasi identiques (similarité de Jaccard des termes)
+  - coupe du contexte à un budget de tokens (estimé à ~4 caractères par token)
+Quand le premier document est décisif (très proche et nettement devant le
+second), la réponse FAQ peut être renvoyée sans appeler le LLM.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+from helpers.question_index import normalize_question
+
+# Caractères par token (estimation pour Gemini, sans tokenizer local)
+CHARS_PER_TOKEN = 4
+
+# Taille minimale (tokens) d'une réponse tronquée pour qu'elle soit gardée
+MIN_TRUNCATED_TOKENS = 32
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimation du nombre de tokens d'un texte
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_document(position: int, doc: Dict) -> str:
+    """
+    Bloc d'un document dans le contexte (même format que LLMGenerator._build_context)
+    """
+    return f"Document {position}:\nQuestion: {doc['question']}\nRéponse: {doc['answer']}\n"
+
+
+class ContextBuilder:
+    """
+    Sélection des documents du contexte ; chaque filtre est désactivé par None
+    """
+
+    def __init__(
+        self,
+        max_distance: Optional[float] = None,
+        dedup_threshold: Optional[float] = None,
+        token_budget: Optional[int] = None,
+        decisive_distance: Optional[float] = None,
+        decisive_margin: float = 0.1
+    ):
+        """
+        Args:
+            max_distance: Distance au-delà de laquelle un document est écarté
+            dedup_threshold: Similarité de Jaccard à partir de laquelle deux réponses sont des doublons
+            token_budget: Nombre maximal de tokens (estimés) du contexte
+            decisive_distance: Distance maximale du premier document pour répondre sans LLM
+            decisive_margin: Écart minimal de distance avec le second document
+        """
+        self.max_distance = max_distance
+        self.dedup_threshold = dedup_threshold
+        self.token_budget = token_budget
+        self.decisive_distance = decisive_distance
+        self.decisive_margin = decisive_margin
+
+    def select(self, top_documents: List[Dict]) -> Tuple[List[Dict], Dict[str, int]]:
+        """
+        Documents à placer dans le contexte, dans l'ordre de pertinence,
+        et nombre de documents écartés par raison (distance, duplicate, budget)
+        """
+        dropped = {"distance": 0, "duplicate": 0, "budget": 0}
+        documents = []
+        seen_answers = []
+
+        for doc in top_documents:
+            distance = doc.get("distance")
+            if self.max_distance is not None and distance is not None and distance > self.max_distance:
+                dropped["distance"] += 1
+                continue
+
+            if self.dedup_threshold is not None:
+                terms = set(normalize_question(doc["answer"]).split())
+                if any(_jaccard(terms, other) >= self.dedup_threshold for other in seen_answers):
+                    dropped["duplicate"] += 1
+                    continue
+                seen_answers.append(terms)
+
+            documents.append(doc)
+
+        if self.token_budget is not None:
+            documents, dropped["budget"] = self._fit_budget(documents)
+
+        return documents, dropped
+
+    def _fit_budget(self, documents: List[Dict]):
+        kept = []
+        used = 0
+        for position, doc in enumerate(documents, 1):
+            tokens = estimate_tokens(format_document(position, doc))
+            if used + tokens <= self.token_budget:
+                kept.append(doc)
+                used += tokens
+                continue
+
+            # Tronquer la réponse du document qui dépasse, s'il reste assez de place
+            header_tokens = estimate_tokens(format_document(position, {**doc, "answer": ""}))
+            remaining = self.token_budget - used - header_tokens
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                answer = doc["answer"][:remaining * CHARS_PER_TOKEN - 1].rsplit(" ", 1)[0] + "…"
+                kept.append({**doc, "answer": answer})
+            break
+        return kept, len(documents) - len(kept)
+
+    def decisive_document(self, top_documents: List[Dict]) -> Optional[Dict]:
+        """
+        Premier document s'il suffit à répondre (distance faible, nettement devant le second)
+        """
+        if self.decisive_distance is None or not top_documents:
+            return None
+        best = top_documents[0].get("distance")
+        if best is None or best > self.decisive_distance:
+            return None
+        if len(top_documents) > 1:
+            second = top_documents[1].get("distance")
+            if second is not None and second - best < self.decisive_margin:
+                return None
+        return top_documents[0]
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _optional_float(name: str, default: Optional[str] = None) -> Optional[float]:
+    value = os.getenv(name, default)
+    return float(value) if value not in (None, "") else None
+
+
+def context_builder_from_env() -> ContextBuilder:
+    """
+    ContextBuilder configuré par les variables CONTEXT_* (chaîne vide = filtre désactivé)
+    """
+    token_budget = _optional_float("CONTEXT_TOKEN_BUDGET", "800")
+    return ContextBuilder(
+        max_distance=_optional_float("CONTEXT_MAX_DISTANCE", "1.5"),
+        dedup_threshold=_optional_float("CONTEXT_DEDUP_THRESHOLD", "0.8"),
+        token_budget=int(token_budget) if token_budget is not None else None,
+        decisive_distance=_optional_float("CONTEXT_DECISIVE_DISTANCE"),
+        decisive_margin=float(os.getenv("CONTEXT_DECISIVE_MARGIN", 0.1))
+    )
@@ -0,0 +1,209 @@
+"""
+Chargement en flux du dataset FAQ (JSON, JSONL, CSV)
+
+Le format est détecté à partir du contenu (pas de l'extension : le dataset
+fourni est un JSON nommé .csv) et le fichier est lu une seule fois, par
+morceaux, pour que l'ingestion garde une mémoire bornée quelle que soit
+la taille du fichier.
+"""
+
+import json
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple
+
+# pandas est importé à l'usage : l'API (qui n'ingère pas) ne le charge jamais
+if TYPE_CHECKING:
+    import pandas as pd
+
+READ_SIZE = 1024 * 1024
+# Taille maximale d'un élément d'un tableau JSON (caractères) : au-delà, le
+# fichier est considéré comme invalide plutôt que lu entier en mémoire
+MAX_ELEMENT_SIZE = 16 * READ_SIZE
+
+
+def detect_format(file_path: str) -> str:
+    """
+    Détecte le format du fichier : "json_array", "json_object", "jsonl" ou "csv"
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        head = f.read(64 * 1024)
+    stripped = head.lstrip('\ufeff \t\r\n')
+
+    if stripped.startswith('['):
+        return "json_array"
+    if stripped.startswith('{'):
+        # JSONL : la première ligne est un objet JSON complet (un enregistrement)
+        first_line = stripped.split('\n', 1)[0].strip()
+        try:
+            first_object = json.loads(first_line)
+            if isinstance(first_object, dict) and 'questions' not in first_object:
+                return "jsonl"
+        except json.JSONDecodeError:
+            pass
+        return "json_object"
+    return "csv"
+
+
+def _iter_json_array(f, start_marker: Optional[str] = None) -> Iterator[dict]:
+    """
+    Parcourt les éléments d'un tableau JSON sans charger tout le fichier
+    Si start_marker est donné (ex: '"questions"'), le tableau qui suit cette clé est lu
+    Le tampon reste borné : un élément invalide ou plus grand que MAX_ELEMENT_SIZE
+    lève ValueError
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(READ_SIZE)
+    eof = not buffer
+    # Caractères déjà retirés du tampon (position dans le fichier des messages d'erreur)
+    consumed = 0
+
+    # Trouver le début du tableau
+    search_from = 0
+    while True:
+        if start_marker is not None:
+            marker = buffer.find(start_marker, search_from)
+            if marker >= 0:
+                search_from = marker
+                position = buffer.find('[', marker + len(start_marker))
+            else:
+                search_from = max(0, len(buffer) - len(start_marker))
+                position = -1
+        else:
+            position = buffer.find('[')
+        if position >= 0:
+            break
+        if eof:
+            return
+        # Ne garder que la partie où le début du tableau peut encore se trouver
+        if start_marker is None:
+            search_from = len(buffer)
+        consumed += search_from
+        buffer = buffer[search_from:]
+        search_from = 0
+        chunk = f.read(READ_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+    index = position + 1
+    while True:
+        # Ignorer espaces et virgules entre les éléments
+        while index < len(buffer) and buffer[index] in ' \t\r\n,':
+            index += 1
+        if index >= len(buffer):
+            if eof:
+                return
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            consumed += index
+            buffer = buffer[index:] + chunk
+            index = 0
+            continue
+        if buffer[index] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, index)
+        except json.JSONDecodeError as e:
+            # Élément incomplet : lire la suite du fichier, dans la limite de MAX_ELEMENT_SIZE
+            if eof:
+                raise
+            if len(buffer) - index > MAX_ELEMENT_SIZE:
+                raise ValueError(
+                    f"Élément JSON invalide ou de plus de {MAX_ELEMENT_SIZE} caractères "
+                    f"(caractère {consumed + index} du fichier): {e.msg}"
+                ) from e
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            consumed += index
+            buffer = buffer[index:] + chunk
+            index = 0
+            continue
+
+        yield item
+        index = end
+        # Libérer la partie déjà lue du tampon
+        if index > READ_SIZE:
+            consumed += index
+            buffer = buffer[index:]
+            index = 0
+
+
+def _find_column(columns, keyword: str) -> Optional[str]:
+    column = None
+    for col in columns:
+        if keyword in str(col).lower().strip():
+            column = col
+    return column
+
+
+def iter_records(file_path: str, csv_chunk_size: int = 10000) -> Iterator[Tuple[str, str]]:
+    """
+    Générateur de paires (question, réponse), quel que soit le format du fichier
+    """
+    file_format = detect_format(file_path)
+
+    if file_format in ("json_array", "json_object"):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            marker = '"questions"' if file_format == "json_object" else None
+            for item in _iter_json_array(f, marker):
+                if isinstance(item, dict) and 'question' in item and 'answer' in item:
+                    yield item['question'], item['answer']
+
+    elif file_format == "jsonl":
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(item, dict) and 'question' in item and 'answer' in item:
+                    yield item['question'], item['answer']
+
+    else:
+        import pandas as pd
+
+        chunks = pd.read_csv(
+            file_path, encoding='utf-8', on_bad_lines='skip',
+            chunksize=csv_chunk_size, dtype=str
+        )
+        question_col = answer_col = None
+        for chunk in chunks:
+            if question_col is None:
+                question_col = _find_column(chunk.columns, 'question')
+                answer_col = _find_column(chunk.columns, 'answer')
+                if question_col is None or answer_col is None:
+                    return
+            chunk = chunk.dropna(subset=[question_col, answer_col])
+            yield from zip(chunk[question_col], chunk[answer_col])
+
+
+def iter_dataframes(file_path: str, chunk_size: int = 10000) -> Iterator["pd.DataFrame"]:
+    """
+    Découpe le dataset en DataFrames d'au plus chunk_size lignes (colonnes Questions/Answers)
+    L'index continue d'un morceau à l'autre (position de la ligne dans le fichier)
+    """
+    import pandas as pd
+
+    questions, answers = [], []
+    offset = 0
+    for question, answer in iter_records(file_path, csv_chunk_size=chunk_size):
+        question, answer = str(question), str(answer)
+        if not question.strip() or not answer.strip():
+            continue
+        questions.append(question)
+        answers.append(answer)
+        if len(questions) >= chunk_size:
+            yield pd.DataFrame(
+                {'Questions': questions, 'Answers': answers},
+                index=range(offset, offset + len(questions))
+            )
+            offset += len(questions)
+            questions, answers = [], []
+
+    if questions:
+        yield pd.DataFrame(
+            {'Questions': questions, 'Answers': answers},
+            index=range(offset, offset + len(questions))
+        )
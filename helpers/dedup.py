@@ -0,0 +1,267 @@
+"""
+Regroupement des quasi-doublons à l'ingestion
+
+Le dataset FAQ contient beaucoup de questions reformulées avec des réponses
+presque identiques : stockées telles quelles, elles grossissent l'index et
+occupent plusieurs places du top 5. Avant l'écriture, les paires Q/R sont
+regroupées quand leurs réponses se recouvrent (MinHash des 3-grammes de mots,
+Jaccard estimé >= DEDUP_ANSWER_THRESHOLD) et que leurs embeddings sont
+proches (cosinus >= DEDUP_EMBEDDING_THRESHOLD). Les candidats viennent d'un
+index LSH par bandes des signatures : pas de comparaison de toutes les paires.
+
+Un seul document est écrit par groupe (le plus central) ; les autres
+formulations sont gardées dans ses métadonnées (alternate_questions) et
+servent de clés de l'index des questions et de termes BM25.
+
+À la synchronisation, les groupes déjà écrits dont les lignes n'ont pas changé
+(members_hash) ne sont pas réembeddés : seules les lignes nouvelles ou
+modifiées, et les groupes qui en sont voisins (MinHash), sont regroupés à nouveau.
+"""
+
+import hashlib
+import os
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from helpers.lexical_index import tokenize
+
+# Nombre premier de Mersenne 2^31 - 1 : a * x + b tient sur 64 bits
+_PRIME = (1 << 31) - 1
+
+
+class MinHasher:
+    """
+    Signatures MinHash des n-grammes de mots d'un texte
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 0):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        terms = tokenize(text)
+        size = min(self.shingle_size, len(terms)) or 1
+        grams = {" ".join(terms[i:i + size]) for i in range(max(1, len(terms) - size + 1))}
+        return np.array([zlib.crc32(gram.encode("utf-8")) % _PRIME for gram in grams], dtype=np.uint64)
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        Matrice (textes, permutations) des minimums de a * x + b mod p
+        """
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for i, text in enumerate(texts):
+            hashed = (self.a[:, None] * self.shingles(text)[None, :] + self.b[:, None]) % _PRIME
+            signatures[i] = hashed.min(axis=1)
+        return signatures
+
+
+def candidate_pairs(signatures: np.ndarray, bands: int) -> set:
+    """
+    Paires (i, j) dont au moins une bande de la signature est identique (LSH)
+    """
+    rows = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        chunk = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i, key in enumerate(chunk):
+            buckets[key.tobytes()].append(i)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+
+def near_duplicate_groups(
+    answers: List[str],
+    embeddings: np.ndarray,
+    answer_threshold: float = 0.7,
+    embedding_threshold: float = 0.9,
+    num_perm: int = 128,
+    bands: int = 32
+) -> List[List[int]]:
+    """
+    Groupes de lignes quasi identiques (union des paires validées), dans l'ordre
+    de leur première ligne ; une ligne sans doublon forme un groupe à elle seule
+    """
+    signatures = MinHasher(num_perm).signatures(answers)
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    parents = list(range(len(answers)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for i, j in candidate_pairs(signatures, bands):
+        if np.mean(signatures[i] == signatures[j]) < answer_threshold:
+            continue
+        if float(vectors[i] @ vectors[j]) < embedding_threshold:
+            continue
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parents[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = defaultdict(list)
+    for i in range(len(answers)):
+        groups[find(i)].append(i)
+    return [groups[root] for root in sorted(groups)]
+
+
+def members_hash(ids: List[str], hashes: List[str]) -> str:
+    """
+    Empreinte des lignes d'un groupe (identifiants et empreintes Q/R), indépendante de leur ordre
+    """
+    lines = sorted(f"{doc_id}:{row_hash}" for doc_id, row_hash in zip(ids, hashes))
+    return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def unchanged_groups(
+    ids: List[str],
+    metadatas: List[Dict],
+    existing: Dict[str, Optional[str]],
+    groups: Dict[str, Tuple[List[str], Optional[str]]],
+    answer_threshold: float = 0.7,
+    num_perm: int = 128,
+    bands: int = 32
+) -> Tuple[Dict[str, int], List[int]]:
+    """
+    Sépare les lignes d'un morceau en groupes déjà écrits à l'identique et lignes à regrouper
+
+    Un document écrit est inchangé si toutes ses lignes sont présentes avec la même
+    empreinte (content_hash de la ligne, members_hash du groupe). Il est tout de
+    même regroupé à nouveau si une ligne nouvelle ou modifiée est candidate à
+    le rejoindre (réponses proches d'après MinHash, sans embedding)
+
+    Args:
+        existing: Identifiant -> empreinte du contenu des documents écrits
+        groups: Identifiant du document -> (identifiants de ses lignes, members_hash),
+                pour les documents qui regroupent plusieurs lignes
+
+    Returns:
+        Documents inchangés (identifiant -> nombre de lignes), et positions des
+        lignes à embedder et regrouper
+    """
+    position = {doc_id: i for i, doc_id in enumerate(ids)}
+    owner = {member: doc_id for doc_id, (members, _) in groups.items() for member in members}
+
+    settled = {}
+    for doc_id in {owner.get(row_id, row_id) for row_id in ids}:
+        if doc_id in groups:
+            members, stored_hash = groups[doc_id]
+            if all(member in position for member in members):
+                hashes = [metadatas[position[member]]["content_hash"] for member in members]
+                if stored_hash == members_hash(members, hashes):
+                    settled[doc_id] = members
+        elif doc_id in existing and existing[doc_id] == metadatas[position[doc_id]]["content_hash"]:
+            settled[doc_id] = [doc_id]
+
+    settled_rows = {position[member]: doc_id for doc_id, members in settled.items() for member in members}
+    pending = [i for i in range(len(ids)) if i not in settled_rows]
+    if pending and settled:
+        # Groupes inchangés qu'une ligne à regrouper pourrait rejoindre : regroupés à nouveau
+        signatures = MinHasher(num_perm).signatures([metadata["answer"] for metadata in metadatas])
+        pending_rows = set(pending)
+        reopened = set()
+        for i, j in candidate_pairs(signatures, bands):
+            if (i in pending_rows) == (j in pending_rows):
+                continue
+            if np.mean(signatures[i] == signatures[j]) < answer_threshold:
+                continue
+            reopened.add(settled_rows[j if i in pending_rows else i])
+        for doc_id in reopened:
+            del settled[doc_id]
+        pending = sorted(pending_rows | {row for row, doc_id in settled_rows.items() if doc_id in reopened})
+
+    return {doc_id: len(members) for doc_id, members in settled.items()}, pending
+
+
+def canonical_member(group: List[int], embeddings: np.ndarray) -> int:
+    """
+    Ligne la plus proche des autres du groupe (somme des cosinus) ; la première à égalité
+    """
+    if len(group) == 1:
+        return group[0]
+    vectors = np.asarray([embeddings[i] for i in group], dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return group[int(np.argmax((vectors @ vectors.T).sum(axis=1)))]
+
+
+def collapse_records(
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Dict],
+    embeddings: List[List[float]],
+    answer_threshold: float = 0.7,
+    embedding_threshold: float = 0.9,
+    num_perm: int = 128,
+    bands: int = 32
+) -> Tuple[List[str], List[str], List[Dict], List[List[float]], Dict]:
+    """
+    Un document par groupe de quasi-doublons, avec les autres formulations en métadonnées
+
+    Returns:
+        Identifiants, documents, métadonnées et embeddings gardés, et résumé
+        (lignes, documents, lignes regroupées, groupes, plus grand groupe, durée)
+    """
+    from helpers.chromadb import content_hash
+
+    start = time.perf_counter()
+    groups = near_duplicate_groups(
+        [metadata["answer"] for metadata in metadatas], np.asarray(embeddings, dtype=np.float32),
+        answer_threshold, embedding_threshold, num_perm, bands
+    )
+
+    kept_ids, kept_documents, kept_metadatas, kept_embeddings = [], [], [], []
+    for group in groups:
+        canonical = canonical_member(group, embeddings)
+        metadata = dict(metadatas[canonical])
+        alternates = [metadatas[i]["question"] for i in group if i != canonical]
+        if alternates:
+            metadata["alternate_questions"] = "\n".join(alternates)
+            metadata["group_size"] = len(group)
+            # Lignes du groupe : un groupe inchangé n'est pas réembeddé à la synchronisation
+            metadata["members_hash"] = members_hash(
+                [ids[i] for i in group], [metadatas[i]["content_hash"] for i in group]
+            )
+            # Une formulation ajoutée ou retirée du groupe modifie le document
+            metadata["content_hash"] = content_hash(
+                metadata["question"], metadata["answer"] + "\n" + metadata["alternate_questions"]
+            )
+        kept_ids.append(ids[canonical])
+        kept_documents.append(documents[canonical])
+        kept_metadatas.append(metadata)
+        kept_embeddings.append(embeddings[canonical])
+
+    return kept_ids, kept_documents, kept_metadatas, kept_embeddings, {
+        "rows": len(ids),
+        "documents": len(kept_ids),
+        "collapsed": len(ids) - len(kept_ids),
+        "groups": sum(1 for group in groups if len(group) > 1),
+        "largest_group": max((len(group) for group in groups), default=0),
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+
+
+def dedup_settings_from_env() -> Dict:
+    """
+    Seuils du regroupement (DEDUP_*) ; enabled False : documents écrits tels quels
+    """
+    return {
+        "enabled": os.getenv("DEDUP_ENABLED", "false").lower() == "true",
+        "answer_threshold": float(os.getenv("DEDUP_ANSWER_THRESHOLD", 0.7)),
+        "embedding_threshold": float(os.getenv("DEDUP_EMBEDDING_THRESHOLD", 0.9)),
+        "num_perm": int(os.getenv("DEDUP_NUM_PERM", 128)),
+        "bands": int(os.getenv("DEDUP_BANDS", 32))
+    }
@@ -0,0 +1,215 @@
+"""
+Fonctions d'embedding configurables et cache persistant texte -> vecteur
+
+Backends (EMBEDDING_BACKEND) :
+  - default   : fonction par défaut de ChromaDB (all-MiniLM-L6-v2 ONNX), inchangée
+  - onnx      : même modèle, avec nombre de threads ONNX, taille de lot et
+                remplissage limité à la plus longue séquence du lot (au lieu de 256)
+  - onnx-int8 : même modèle quantifié en int8 (poids), plus rapide sur CPU ;
+                le fichier quantifié est créé au premier usage (paquet onnx requis)
+
+Le cache (SQLite) évite de recalculer l'embedding d'un texte déjà vu à la
+réingestion ; la clé inclut le backend. Il est borné (EMBEDDING_CACHE_MAX_ENTRIES,
+les entrées les plus anciennes sont supprimées) et ne sert aux requêtes des
+utilisateurs que si EMBEDDING_QUERY_CACHE=true : sinon leur texte n'est pas
+écrit sur disque et une requête inédite ne paie pas d'écriture SQLite.
+"""
+
+import os
+import sqlite3
+import threading
+import hashlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BACKENDS = ("default", "onnx", "onnx-int8")
+
+
+class EmbeddingCache:
+    """
+    Cache persistant (SQLite) texte -> vecteur float32, partagé entre processus
+    Au-delà de max_entries, les entrées écrites le plus anciennement sont supprimées
+    """
+
+    def __init__(self, path: str, max_entries: int = 200000):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # WAL : lectures concurrentes pendant qu'un processus d'ingestion écrit
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        with self._lock:
+            # Limite du nombre de paramètres d'une requête SQLite
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Dict[bytes, np.ndarray]):
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+            )
+            if self.max_entries:
+                # Les rowid croissent à chaque écriture (un remplacement renouvelle la ligne) :
+                # ne garder que les max_entries plus récents, sans COUNT(*) sur toute la table
+                self._connection.execute(
+                    "DELETE FROM embeddings WHERE rowid <= (SELECT MAX(rowid) FROM embeddings) - ?",
+                    (self.max_entries,)
+                )
+            self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddingFunction:
+    """
+    Fonction d'embedding précédée du cache : seuls les textes absents sont calculés
+    """
+
+    def __init__(self, embedding_function, cache: EmbeddingCache, namespace: str):
+        """
+        Args:
+            embedding_function: Fonction d'embedding calculant les textes absents
+            cache: Cache persistant
+            namespace: Identifiant du modèle, inclus dans les clés
+        """
+        self.embedding_function = embedding_function
+        self.cache = cache
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha1(f"{self.namespace}\0{text}".encode("utf-8")).digest()
+
+    def __call__(self, input):
+        keys = [self._key(text) for text in input]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, input):
+            if key not in found:
+                missing.setdefault(key, text)
+        self.hits += len(keys) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = self.embedding_function(list(missing.values()))
+            computed = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            self.cache.put_many(computed)
+            found.update(computed)
+
+        return [found[key].tolist() for key in keys]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.cache.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class EmbeddingFunctionFactory:
+    """
+    Fabrique picklable de la fonction d'embedding : les processus d'ingestion
+    recréent leur propre modèle (et leur propre connexion au cache)
+    """
+
+    def __init__(
+        self,
+        backend: str = "default",
+        threads: int = 0,
+        batch_size: int = 32,
+        cache_path: Optional[str] = None,
+        cache_max_entries: int = 200000,
+        query_cache: bool = False
+    ):
+        """
+        Args:
+            backend: "default", "onnx" ou "onnx-int8"
+            threads: Threads intra-op ONNX Runtime (0 = choix d'ONNX Runtime)
+            batch_size: Textes par passage du modèle
+            cache_path: Fichier du cache persistant (None = pas de cache)
+            cache_max_entries: Entrées gardées dans le cache (0 = sans limite)
+            query_cache: Utiliser aussi le cache pour les requêtes (sinon ingestion seulement)
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend d'embedding inconnu: {backend} (attendu: {', '.join(BACKENDS)})")
+        self.backend = backend
+        self.threads = threads
+        self.batch_size = batch_size
+        self.cache_path = cache_path
+        self.cache_max_entries = cache_max_entries
+        self.query_cache = query_cache
+
+    def create_backend(self):
+        # Imports différés : ChromaDB et onnxruntime ne sont chargés qu'à la
+        # création du modèle (préchauffage en tâche de fond pour l'API)
+        if self.backend == "default":
+            from chromadb.utils import embedding_functions
+
+            # Lu à l'appel : les bancs d'essai peuvent remplacer la fonction par défaut
+            return embedding_functions.DefaultEmbeddingFunction()
+        from helpers.onnx_embedding import OnnxEmbeddingFunction
+
+        return OnnxEmbeddingFunction(
+            threads=self.threads,
+            batch_size=self.batch_size,
+            quantized=self.backend == "onnx-int8"
+        )
+
+    def __call__(self, queries: bool = False):
+        """
+        Fonction d'embedding, précédée du cache s'il est configuré ; queries=True :
+        fonction des requêtes, sans cache sauf si query_cache
+        """
+        embedding_function = self.create_backend()
+        if not self.cache_path or (queries and not self.query_cache):
+            return embedding_function
+        # Espace de clés propre au modèle : changer de backend ne réutilise pas ses vecteurs
+        namespace = getattr(
+            embedding_function, "cache_namespace",
+            f"{type(embedding_function).__module__}.{type(embedding_function).__qualname__}"
+        )
+        return CachedEmbeddingFunction(
+            embedding_function, EmbeddingCache(self.cache_path, self.cache_max_entries), namespace
+        )
+
+
+def embedding_factory_from_env() -> EmbeddingFunctionFactory:
+    """
+    Fabrique configurée par EMBEDDING_BACKEND, EMBEDDING_THREADS, EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CACHE_PATH (vide = pas de cache), EMBEDDING_CACHE_MAX_ENTRIES et
+    EMBEDDING_QUERY_CACHE
+    """
+    return EmbeddingFunctionFactory(
+        backend=os.getenv("EMBEDDING_BACKEND", "default").lower(),
+        threads=int(os.getenv("EMBEDDING_THREADS", 0)),
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", 32)),
+        cache_path=os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite") or None,
+        cache_max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200000)),
+        query_cache=os.getenv("EMBEDDING_QUERY_CACHE", "false").lower() == "true"
+    )
@@ -0,0 +1,169 @@
+"""
+Pipeline d'ingestion en masse
+
+Les embeddings sont calculés par lots dans un pool de processus (un modèle
+par processus) pendant que le processus principal écrit les lots déjà
+embeddés dans ChromaDB : calcul et écriture se recouvrent.
+
+Les lots sont écrits dans l'ordre avec upsert et des identifiants stables :
+après un crash, relancer la synchronisation reprend là où elle s'était arrêtée.
+"""
+
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Fonction d'embedding propre à chaque processus du pool
+_worker_embedding_function = None
+
+
+def _init_worker(embedding_function_factory):
+    global _worker_embedding_function
+    _worker_embedding_function = embedding_function_factory()
+
+
+def _embed_batch(documents: List[str]) -> List[List[float]]:
+    return [list(embedding) for embedding in _worker_embedding_function(documents)]
+
+
+class BulkIngestor:
+    """
+    Embedding parallèle et écriture pipelinée dans une collection ChromaDB
+    Utilisé comme gestionnaire de contexte, le pool de processus est conservé
+    d'un appel à ingest() à l'autre (ingestion d'un fichier par morceaux)
+    """
+
+    def __init__(
+        self,
+        collection,
+        embedding_function_factory: Callable,
+        workers: Optional[int] = None,
+        batch_size: int = 1000,
+        prefetch: Optional[int] = None
+    ):
+        """
+        Args:
+            collection: Collection ChromaDB cible
+            embedding_function_factory: Fonction (picklable) créant la fonction d'embedding
+            workers: Nombre de processus d'embedding (défaut: nombre de cœurs)
+            batch_size: Nombre de documents par lot
+            prefetch: Nombre de lots embeddés en avance (défaut: 2 par processus)
+        """
+        self.collection = collection
+        self.embedding_function_factory = embedding_function_factory
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.prefetch = prefetch or self.workers * 2
+        self._pool = None
+        self._embedding_function = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.embedding_function_factory,)
+            )
+        return self._pool
+
+    def embed(self, documents: List[str]) -> List[List[float]]:
+        """
+        Embeddings des documents, sans écriture (même parallélisme que ingest)
+        """
+        embeddings = []
+        for lo, hi, batch in self._embed_batches(documents):
+            embeddings.extend(batch)
+        return embeddings
+
+    def ingest(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict],
+        on_batch: Optional[Callable] = None,
+        embeddings: Optional[List[List[float]]] = None
+    ) -> Dict:
+        """
+        Embedde et écrit tous les documents
+
+        Args:
+            on_batch: Fonction appelée après l'écriture de chaque lot (ids, metadatas, documents)
+            embeddings: Embeddings déjà calculés (ex: regroupement des quasi-doublons), écrits tels quels
+
+        Returns:
+            Nombre de lignes écrites, durée et débit (lignes/s)
+        """
+        start = time.perf_counter()
+        total = len(ids)
+        written = 0
+
+        if embeddings is not None:
+            batches = (
+                (lo, min(lo + self.batch_size, total), embeddings[lo:lo + self.batch_size])
+                for lo in range(0, total, self.batch_size)
+            )
+        else:
+            batches = self._embed_batches(documents)
+
+        for lo, hi, batch in batches:
+            self.collection.upsert(
+                ids=ids[lo:hi],
+                documents=documents[lo:hi],
+                metadatas=metadatas[lo:hi],
+                embeddings=batch
+            )
+            if on_batch is not None:
+                on_batch(ids[lo:hi], metadatas[lo:hi], documents[lo:hi])
+            written = hi
+            elapsed = time.perf_counter() - start
+            print(f"   📝 Inséré: {written}/{total} ({written / elapsed:.0f} lignes/s)")
+
+        seconds = time.perf_counter() - start
+        return {
+            "rows": written,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(written / seconds, 1) if seconds > 0 else 0.0
+        }
+
+    def _embed_batches(self, documents: List[str]) -> Iterator[Tuple[int, int, List[List[float]]]]:
+        """
+        Lots (début, fin, embeddings) dans l'ordre ; avec le pool, les lots
+        suivants sont embeddés pendant que l'appelant traite le plus ancien
+        """
+        total = len(documents)
+        bounds = [(i, min(i + self.batch_size, total)) for i in range(0, total, self.batch_size)]
+
+        # Un seul processus, ou un seul lot sans pool déjà démarré : embedding sur place
+        if self.workers <= 1 or (len(bounds) <= 1 and self._pool is None):
+            if self._embedding_function is None:
+                self._embedding_function = self.embedding_function_factory()
+            for lo, hi in bounds:
+                yield lo, hi, [list(e) for e in self._embedding_function(documents[lo:hi])]
+            return
+
+        pool = self._get_pool()
+        pending = deque()
+        next_batch = 0
+        while next_batch < len(bounds) or pending:
+            while next_batch < len(bounds) and len(pending) < self.prefetch:
+                lo, hi = bounds[next_batch]
+                pending.append((lo, hi, pool.submit(_embed_batch, documents[lo:hi])))
+                next_batch += 1
+            # Rendre le plus ancien lot pendant que les suivants sont embeddés
+            lo, hi, future = pending.popleft()
+            yield lo, hi, future.result()
@@ -1 +1,185 @@
-
+"""
+Script d'initialisation pour charger les données dans ChromaDB
+
+Usage:
+    python -m helpers.init_data                 # chargement interactif complet
+    python -m helpers.init_data --sync          # synchronisation incrémentale non interactive
+    python -m helpers.init_data --sync --dataset chemin/vers/dataset.json --workers 8 --batch-size 2000
+    python -m helpers.init_data --sync --publish-snapshot   # puis publie le snapshot lu par les workers
+    python -m helpers.init_data --sync --collection faq_fr --dataset data/faq_fr.csv   # autre boutique / langue
+"""
+
+import sys
+import os
+import argparse
+
+# FIX: Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Maintenant l'import fonctionnera
+from helpers.chromadb import RAGSystem, get_rag_system
+from helpers.dataset_loader import iter_dataframes
+from helpers.snapshot import publish_snapshot
+
+
+def find_dataset(dataset_path: str = "data/ecommerce_faq_dataset.csv"):
+    """
+    Retourne le chemin du dataset, en cherchant aussi dans les emplacements habituels
+    """
+    # Vérifier si le fichier existe
+    if not os.path.exists(dataset_path):
+        print(f"❌ Erreur: Le fichier {dataset_path} n'existe pas!")
+        print(f"📥 Téléchargez le dataset et placez-le dans data/")
+        
+        # Vérifier d'autres emplacements
+        if os.path.exists("../data/ecommerce_faq_dataset.csv"):
+            dataset_path = "../data/ecommerce_faq_dataset.csv"
+            print(f"✅ Trouvé à: {dataset_path}")
+        elif os.path.exists("ecommerce_faq_dataset.csv"):
+            dataset_path = "ecommerce_faq_dataset.csv"
+            print(f"✅ Trouvé à: {dataset_path}")
+        else:
+            return None
+    
+    return dataset_path
+
+
+def sync(
+    dataset_path: str,
+    workers: int = None,
+    batch_size: int = None,
+    chunk_size: int = 10000,
+    publish: bool = False,
+    collection: str = None
+):
+    """
+    Synchronise la collection avec le dataset sans interaction :
+    seuls les documents nouveaux ou modifiés sont embeddés
+    publish : publier ensuite un snapshot pour les workers en lecture seule
+    collection : collection à synchroniser (défaut: DEFAULT_COLLECTION)
+    """
+    print("=== Synchronisation du système RAG ===\n")
+    
+    dataset_path = find_dataset(dataset_path)
+    if dataset_path is None:
+        sys.exit(1)
+    
+    rag = RAGSystem(collection) if collection else get_rag_system()
+    
+    # Lecture en flux : mémoire bornée quelle que soit la taille du fichier
+    print(f"📂 Lecture du dataset: {dataset_path}")
+    chunks = iter_dataframes(dataset_path, chunk_size=chunk_size)
+    summary = rag.sync_vectorstore(chunks, workers=workers, batch_size=batch_size)
+    if summary is None:
+        sys.exit(1)
+    
+    print(f"\n✅ Synchronisation terminée en {summary['seconds']}s")
+    print(f"   ➕ Ajoutés: {summary['added']}")
+    print(f"   ✏️  Modifiés: {summary['updated']}")
+    print(f"   🗑️  Supprimés: {summary['deleted']}")
+    print(f"   ⏸️  Inchangés: {summary['unchanged']}")
+    if summary['rows_per_second']:
+        print(f"   ⚡ Débit d'ingestion: {summary['rows_per_second']} lignes/s")
+    if summary['duplicates_skipped']:
+        print(f"   ⚠️  Questions en double ignorées: {summary['duplicates_skipped']}")
+    if summary['near_duplicates_collapsed']:
+        print(f"   🧹 Quasi-doublons regroupés: {summary['near_duplicates_collapsed']}")
+    print(f"📊 Documents dans la base: {rag.get_collection_count()}")
+    
+    if publish:
+        version = publish_snapshot(rag)
+        print(f"📦 Snapshot publié: {version}")
+
+
+def main():
+    """
+    Charge le dataset et initialise la base vectorielle
+    """
+    parser = argparse.ArgumentParser(description="Initialisation de la base vectorielle")
+    parser.add_argument("--sync", action="store_true",
+                        help="Synchronisation incrémentale non interactive")
+    parser.add_argument("--dataset", default="data/ecommerce_faq_dataset.csv",
+                        help="Chemin du dataset FAQ")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processus d'embedding (défaut: INGEST_WORKERS ou nombre de cœurs)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Documents par lot (défaut: INGEST_BATCH_SIZE ou 1000)")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="Lignes lues du fichier par morceau")
+    parser.add_argument("--publish-snapshot", action="store_true",
+                        help="Publier le snapshot lu par les workers (SNAPSHOT_DIR) après la synchronisation")
+    parser.add_argument("--collection", default=None,
+                        help="Collection à alimenter (défaut: DEFAULT_COLLECTION ou ecommerce_faq)")
+    args = parser.parse_args()
+    
+    if args.sync:
+        sync(args.dataset, workers=args.workers, batch_size=args.batch_size,
+             chunk_size=args.chunk_size, publish=args.publish_snapshot, collection=args.collection)
+        return
+    
+    print("=== Initialisation du système RAG ===\n")
+    
+    dataset_path = find_dataset(args.dataset)
+    if dataset_path is None:
+        return
+    
+    # Récupérer le système RAG
+    rag = RAGSystem(args.collection) if args.collection else get_rag_system()
+    
+    # Vérifier si la collection est déjà peuplée
+    try:
+        current_count = rag.get_collection_count()
+        if current_count > 0:
+            print(f"⚠️  La collection contient déjà {current_count} documents.")
+            response = input("Voulez-vous la réinitialiser? (o/n): ")
+            if response.lower() == 'o':
+                # Supprimer l'ancienne collection et en créer une nouvelle
+                rag.client.delete_collection(name=rag.collection_name)
+                rag.initialize_chromadb()
+                print("✅ Collection réinitialisée")
+            else:
+                print("❌ Initialisation annulée")
+                return
+    except Exception as e:
+        print(f"⚠️  Erreur vérification: {e}")
+        print("⚠️  Probablement collection vide, continuation...")
+    
+    # Charger le dataset
+    print(f"📂 Chargement du dataset: {dataset_path}")
+    df = rag.load_dataset(dataset_path)
+    
+    if df is None:
+        print("❌ Erreur chargement dataset")
+        return
+    
+    print(f"✅ Dataset chargé: {len(df)} lignes")
+    print(f"📊 Colonnes: {list(df.columns)}")
+    print(f"\n🔍 Aperçu:")
+    print(df.head())
+    
+    # Peupler la base vectorielle
+    print(f"\n💾 Insertion dans ChromaDB...")
+    rag.populate_vectorstore(df)
+    
+    # Vérification
+    final_count = rag.get_collection_count()
+    print(f"\n✅ Initialisation terminée!")
+    print(f"📊 Documents dans la base: {final_count}")
+    
+    # Test de recherche
+    print(f"\n🧪 Test recherche...")
+    test_query = "What payment methods do you accept?"
+    results = rag.search_documents(test_query, n_results=3)
+    
+    print(f"\nQuery: {test_query}")
+    print(f"Résultats: {len(results)}")
+    if results:
+        print(f"\nPremier résultat:")
+        print(f"  Question: {results[0]['question']}")
+        print(f"  Réponse: {results[0]['answer'][:100]}...")
+    
+    print(f"\n🎉 Système RAG prêt!")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
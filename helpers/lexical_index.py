@@ -0,0 +1,302 @@
+"""
+Index lexical BM25 en mémoire sur les questions et réponses de la FAQ
+
+Complète la recherche vectorielle sur les termes exacts (références produit,
+numéros de commande, mots-clés de politique) que l'embedding capture mal.
+Les listes de postings sont stockées dans des tableaux compacts (array) :
+environ 5 octets par couple (terme, document), ce qui permet de garder
+l'index d'un million de documents en RAM (les identifiants et le dictionnaire
+des termes s'y ajoutent, voir memory_bytes). Le score est calculé avec NumPy.
+L'index peut être figé en tableaux (format CSR) et relu en lecture seule par
+MappedLexicalIndex, par exemple depuis un snapshot projeté en mémoire.
+"""
+
+import hashlib
+import math
+import sys
+import threading
+from array import array
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from helpers.question_index import normalize_question
+
+
+# Surcoût fixe d'une entrée de postings : tuple et deux tableaux vides
+_POSTINGS_OVERHEAD = sys.getsizeof((None, None)) + sys.getsizeof(array('I')) + sys.getsizeof(array('B'))
+# Octets par couple (terme, document) : position (uint32) et fréquence (uint8)
+_POSTING_BYTES = array('I').itemsize + array('B').itemsize
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Découpe un texte en termes normalisés (minuscules, sans accents ni ponctuation)
+    Les nombres sont conservés tels quels (numéros de commande, références)
+    """
+    return normalize_question(text).split()
+
+
+def term_key(term: str) -> int:
+    """
+    Empreinte 64 bits d'un terme (clé des tableaux figés)
+    """
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _add_bm25(scores, slots, frequencies, lengths, live: int, average_length: float, k1: float, b: float):
+    """
+    Ajoute aux scores la contribution BM25 d'un terme
+    """
+    frequencies = frequencies.astype(np.float32)
+    idf = math.log(1 + (live - len(slots) + 0.5) / (len(slots) + 0.5))
+    norm = k1 * (1 - b + b * lengths[slots] / average_length)
+    scores[slots] += idf * frequencies * (k1 + 1) / (frequencies + norm)
+
+
+def _top(scores, n_results: int, id_of: Callable[[int], Optional[str]]) -> List[Tuple[str, float]]:
+    k = min(n_results, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    results = []
+    for slot in top:
+        if scores[slot] <= 0:
+            continue
+        doc_id = id_of(int(slot))
+        if doc_id is not None:
+            results.append((doc_id, float(scores[slot])))
+    return results
+
+
+class LexicalIndex:
+    """
+    Index inversé BM25 : terme -> (positions des documents, fréquences)
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._ids: List[Optional[str]] = []
+        self._slots: Dict[str, int] = {}
+        self._lengths = array('H')
+        self._alive = array('B')
+        self._total_length = 0
+        self._deleted = 0
+        # Compteurs tenus à jour par add_many : memory_bytes en temps constant
+        self._postings_bytes = 0
+        self._ids_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._ids = []
+            self._slots = {}
+            self._lengths = array('H')
+            self._alive = array('B')
+            self._total_length = 0
+            self._deleted = 0
+            self._postings_bytes = 0
+            self._ids_bytes = 0
+
+    def add(self, doc_id: str, metadata: Dict, document: Optional[str] = None):
+        """
+        Indexe un document à partir de ses métadonnées (question, formulations regroupées, answer)
+        Un document déjà indexé sous le même identifiant est remplacé
+        """
+        self.add_many([doc_id], [metadata])
+
+    def add_many(self, ids: List[str], metadatas: List[Dict], documents: Optional[List[str]] = None):
+        # Tokenisation hors du verrou : seule la mise à jour des tableaux est sérialisée
+        tokenized = [
+            Counter(tokenize(f"{metadata['question']} {metadata.get('alternate_questions', '')} {metadata['answer']}"))
+            for metadata in metadatas
+        ]
+        with self._lock:
+            for doc_id, terms in zip(ids, tokenized):
+                previous = self._slots.get(doc_id)
+                if previous is not None:
+                    self._remove_slot(previous)
+                else:
+                    self._ids_bytes += sys.getsizeof(doc_id)
+
+                slot = len(self._ids)
+                self._ids.append(doc_id)
+                self._slots[doc_id] = slot
+                length = min(sum(terms.values()), 65535)
+                self._lengths.append(length)
+                self._alive.append(1)
+                self._total_length += length
+
+                for term, frequency in terms.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = (array('I'), array('B'))
+                        self._postings[term] = postings
+                        self._postings_bytes += sys.getsizeof(term) + _POSTINGS_OVERHEAD
+                    postings[0].append(slot)
+                    postings[1].append(min(frequency, 255))
+                self._postings_bytes += len(terms) * _POSTING_BYTES
+
+    def _remove_slot(self, slot: int):
+        """
+        Marque un document comme supprimé (ses postings sont ignorés au scoring)
+        """
+        self._ids[slot] = None
+        self._alive[slot] = 0
+        self._total_length -= self._lengths[slot]
+        self._deleted += 1
+
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """
+        Retourne les n meilleurs documents (identifiant, score BM25), par score décroissant
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or len(self._slots) == 0 or n_results <= 0:
+                return []
+            scores = self._score(terms)
+            if scores is None:
+                return []
+            return _top(scores, n_results, self._ids.__getitem__)
+
+    def _score(self, terms) -> Optional[np.ndarray]:
+        """
+        Scores BM25 de tous les documents (None si aucun terme n'est connu)
+        Les vues NumPy sur les tableaux ne survivent pas à l'appel : les tableaux
+        doivent pouvoir grandir dès que le verrou est relâché
+        """
+        live = len(self._slots)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint16)
+        average_length = max(self._total_length / live, 1.0)
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        matched = False
+
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            matched = True
+            _add_bm25(
+                scores,
+                np.frombuffer(postings[0], dtype=np.uint32),
+                np.frombuffer(postings[1], dtype=np.uint8),
+                lengths, live, average_length, self.k1, self.b
+            )
+
+        if not matched:
+            return None
+        if self._deleted:
+            scores *= np.frombuffer(self._alive, dtype=np.uint8)
+        return scores
+
+    def memory_bytes(self) -> int:
+        """
+        Estimation de la mémoire de l'index : postings (tableaux, tuples, termes
+        et dictionnaire), identifiants, table identifiant -> position et
+        tableaux par document
+        Temps constant (compteurs tenus à jour à l'indexation) ; l'allocation
+        en avance des tableaux de postings n'est pas comptée
+        """
+        with self._lock:
+            # Chaînes d'identifiants comptées une fois (partagées par _ids et _slots)
+            return (
+                self._postings_bytes + self._ids_bytes
+                + sys.getsizeof(self._postings) + sys.getsizeof(self._ids) + sys.getsizeof(self._slots)
+                + sys.getsizeof(self._lengths) + sys.getsizeof(self._alive)
+            )
+
+    def export_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Index figé en tableaux : empreintes des termes triées, bornes des postings
+        par terme, positions et fréquences concaténées, longueurs des documents
+        Les positions sont celles d'insertion ; l'index ne doit pas contenir de suppression
+        """
+        with self._lock:
+            if self._deleted:
+                raise ValueError("Index avec documents supprimés : positions non contiguës")
+            terms = list(self._postings)
+            keys = np.array([term_key(term) for term in terms], dtype=np.uint64)
+            order = np.argsort(keys, kind="stable")
+            counts = np.array([len(self._postings[terms[i]][0]) for i in order], dtype=np.int64)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            slots = np.empty(offsets[-1], dtype=np.uint32)
+            frequencies = np.empty(offsets[-1], dtype=np.uint8)
+            for position, i in enumerate(order):
+                term_slots, term_frequencies = self._postings[terms[i]]
+                slots[offsets[position]:offsets[position + 1]] = np.frombuffer(term_slots, dtype=np.uint32)
+                frequencies[offsets[position]:offsets[position + 1]] = np.frombuffer(term_frequencies, dtype=np.uint8)
+            return {
+                "term_keys": keys[order],
+                "term_offsets": offsets,
+                "slots": slots,
+                "frequencies": frequencies,
+                "lengths": np.frombuffer(self._lengths, dtype=np.uint16).copy()
+            }
+
+
+class MappedLexicalIndex:
+    """
+    Index BM25 en lecture seule sur les tableaux de LexicalIndex.export_arrays
+    (éventuellement projetés en mémoire et partagés entre processus)
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], id_of: Callable[[int], Optional[str]], k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            arrays: Tableaux produits par export_arrays
+            id_of: Identifiant du document à une position
+        """
+        self.k1 = k1
+        self.b = b
+        self.id_of = id_of
+        self.term_keys = arrays["term_keys"]
+        self.term_offsets = arrays["term_offsets"]
+        self.slots = arrays["slots"]
+        self.frequencies = arrays["frequencies"]
+        self.lengths = arrays["lengths"]
+        self.average_length = max(float(self.lengths.sum()) / len(self.lengths), 1.0) if len(self.lengths) else 1.0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """
+        Retourne les n meilleurs documents (identifiant, score BM25), par score décroissant
+        """
+        terms = set(tokenize(query))
+        if not terms or len(self) == 0 or n_results <= 0:
+            return []
+
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched = False
+        for term in terms:
+            key = np.uint64(term_key(term))
+            position = int(np.searchsorted(self.term_keys, key))
+            if position == len(self.term_keys) or self.term_keys[position] != key:
+                continue
+            matched = True
+            start, end = self.term_offsets[position], self.term_offsets[position + 1]
+            _add_bm25(
+                scores, self.slots[start:end], self.frequencies[start:end],
+                self.lengths, len(self), self.average_length, self.k1, self.b
+            )
+
+        if not matched:
+            return []
+        return _top(scores, n_results, self.id_of)
+
+    def memory_bytes(self) -> int:
+        """
+        Taille des tableaux (projetés en mémoire : partagés entre processus)
+        """
+        return sum(
+            array.nbytes
+            for array in (self.term_keys, self.term_offsets, self.slots, self.frequencies, self.lengths)
+        )
@@ -0,0 +1,280 @@
+"""
+Backends du LLM : Gemini, serveur HTTP local ou simulation en processus
+
+LLMGenerator n'utilise du modèle que generate_content_async(prompt, stream) :
+un résultat avec .text, ou un itérateur asynchrone de morceaux avec .text.
+Sans clé Gemini, /chat ne pouvait être testé qu'avec la réponse de secours,
+instantanée : la concurrence, la file d'attente et les délais n'étaient
+jamais exercés. LLM_BACKEND choisit le modèle :
+  - gemini    : Google Gemini (GOOGLE_API_KEY)
+  - http      : serveur compatible avec helpers.llm_standin (LLM_HTTP_URL)
+  - simulated : SimulatedModel dans le processus de l'API
+  - none      : réponse de secours seulement
+Une autre valeur est refusée au démarrage (ValueError).
+
+SimulatedModel répond de façon déterministe (même prompt, même texte) avec
+une latence réaliste : délai avant le premier token tiré d'une distribution,
+débit en tokens par seconde, erreurs, blocages et coupures de flux injectés.
+"""
+
+import os
+import re
+import json
+import math
+import asyncio
+import hashlib
+import random
+import time
+from typing import Dict, Optional
+
+LLM_BACKENDS = ("gemini", "http", "simulated", "none")
+
+# Formes des distributions de latence et nombre de paramètres attendus
+DISTRIBUTIONS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+
+
+class LatencyDistribution:
+    """
+    Distribution de latence en secondes, décrite par "forme:paramètres" :
+    fixed:0.5, uniform:0.2,1.0, normal:0.8,0.2, lognormal:0.8,0.5 (médiane,
+    sigma du log), exponential:0.5 (moyenne)
+    """
+
+    def __init__(self, kind: str = "fixed", params=(0.0,)):
+        if kind not in DISTRIBUTIONS:
+            raise ValueError(f"Distribution inconnue: {kind} (choix: {', '.join(DISTRIBUTIONS)})")
+        if len(params) != DISTRIBUTIONS[kind]:
+            raise ValueError(f"{kind} attend {DISTRIBUTIONS[kind]} paramètre(s), reçu {len(params)}")
+        self.kind = kind
+        self.params = tuple(float(param) for param in params)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        """
+        "lognormal:0.8,0.5" -> LatencyDistribution ; un nombre seul vaut fixed
+        """
+        kind, _, params = spec.strip().partition(":")
+        if not params:
+            return cls("fixed", (float(kind),))
+        return cls(kind.lower(), [float(param) for param in params.split(",")])
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(math.log(max(self.params[0], 1e-9)), self.params[1])
+        else:
+            value = rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        return max(value, 0.0)
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{','.join(f'{param:g}' for param in self.params)}"
+
+
+class SimulatedLLMError(RuntimeError):
+    """
+    Erreur injectée par SimulatedModel (équivalent d'une erreur 5xx de l'API)
+    """
+
+
+class Chunk:
+    """
+    Réponse ou morceau de réponse, même attribut que le client Gemini
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def deterministic_answer(prompt: str, tokens: int) -> str:
+    """
+    Réponse stable pour un prompt : mots des réponses du contexte dans un ordre
+    tiré du hash du prompt, tronquée à tokens mots
+    """
+    seed = int.from_bytes(hashlib.sha1(prompt.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    answers = re.findall(r"^Réponse: (.+)$", prompt, flags=re.MULTILINE)
+    words = " ".join(answers).split() or prompt.split() or ["..."]
+    start = rng.randrange(len(words))
+    return " ".join(words[(start + i) % len(words)] for i in range(max(tokens, 1)))
+
+
+class SimulatedModel:
+    """
+    LLM simulé : texte déterministe, latence et pannes tirées au hasard (seed)
+
+    Une requête sur error_rate échoue avant le premier token, une sur
+    timeout_rate reste bloquée hang_seconds puis échoue (le délai du client
+    l'interrompt avant), un flux sur stream_break_rate est coupé à mi-réponse
+    """
+
+    def __init__(
+        self,
+        first_token: LatencyDistribution = None,
+        tokens_per_second: float = 50.0,
+        answer_tokens: int = 60,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        stream_break_rate: float = 0.0,
+        hang_seconds: float = 120.0,
+        seed: Optional[int] = 0
+    ):
+        self.first_token = first_token or LatencyDistribution("fixed", (0.5,))
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.stream_break_rate = stream_break_rate
+        self.hang_seconds = hang_seconds
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.stream_breaks = 0
+
+    def plan(self, prompt: str) -> Dict:
+        """
+        Déroulé d'une requête : issue, délai avant le premier token, tokens
+        """
+        self.requests += 1
+        draw = self.rng.random()
+        if draw < self.error_rate:
+            outcome = "error"
+        elif draw < self.error_rate + self.timeout_rate:
+            outcome = "timeout"
+        elif self.rng.random() < self.stream_break_rate:
+            outcome = "break"
+        else:
+            outcome = "ok"
+        # Longueur déterministe : entre la moitié et 1,5 fois answer_tokens
+        digest = hashlib.sha1(prompt.encode("utf-8")).digest()
+        tokens = max(1, int(self.answer_tokens * (0.5 + digest[0] / 255)))
+        return {
+            "outcome": outcome,
+            "first_token": self.first_token.sample(self.rng),
+            "tokens": deterministic_answer(prompt, tokens).split(" ")
+        }
+
+    async def stream(self, prompt: str):
+        """
+        Morceaux de texte (un mot et son espace) au rythme du modèle
+        """
+        plan = self.plan(prompt)
+        await asyncio.sleep(plan["first_token"])
+        if plan["outcome"] == "error":
+            self.errors += 1
+            raise SimulatedLLMError("Erreur simulée du LLM")
+        if plan["outcome"] == "timeout":
+            self.timeouts += 1
+            await asyncio.sleep(self.hang_seconds)
+            raise SimulatedLLMError("Blocage simulé du LLM")
+
+        tokens = plan["tokens"]
+        interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        cut = len(tokens) // 2 if plan["outcome"] == "break" else None
+        start = time.perf_counter()
+        for i, token in enumerate(tokens):
+            if i == cut:
+                self.stream_breaks += 1
+                raise SimulatedLLMError("Flux simulé interrompu")
+            # Débit moyen tenu sans cumuler les retards de asyncio.sleep
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield token if i == len(tokens) - 1 else token + " "
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        chunks = self._chunks(prompt)
+        if stream:
+            return chunks
+        return Chunk("".join([chunk.text async for chunk in chunks]))
+
+    async def _chunks(self, prompt: str):
+        texts = self.stream(prompt)
+        try:
+            async for text in texts:
+                yield Chunk(text)
+        finally:
+            # Fermeture du flux (client parti, délai) : la génération s'arrête
+            await texts.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "stream_breaks": self.stream_breaks
+        }
+
+
+class HTTPModel:
+    """
+    Client d'un serveur LLM local (helpers.llm_standin) :
+    POST /generate {"prompt", "stream"} -> {"text"} ou lignes NDJSON {"text"}
+    Une réponse HTTP en erreur ou une ligne {"error"} lève une exception (réponse de secours)
+    """
+
+    def __init__(self, url: str, timeout: Optional[float] = None, max_connections: int = 100):
+        # Import différé : httpx n'est requis qu'avec LLM_BACKEND=http
+        import httpx
+
+        self.url = url.rstrip("/")
+        self.client = httpx.AsyncClient(
+            base_url=self.url, timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._chunks(prompt)
+        response = await self.client.post("/generate", json={"prompt": prompt, "stream": False})
+        response.raise_for_status()
+        return Chunk(response.json()["text"])
+
+    async def _chunks(self, prompt: str):
+        async with self.client.stream("POST", "/generate", json={"prompt": prompt, "stream": True}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    raise RuntimeError(f"Flux LLM interrompu: {data['error']}")
+                yield Chunk(data["text"])
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def simulated_model_from_env() -> SimulatedModel:
+    """
+    SimulatedModel configuré par les variables LLM_SIM_*
+    """
+    seed = os.getenv("LLM_SIM_SEED", "0")
+    return SimulatedModel(
+        first_token=LatencyDistribution.parse(os.getenv("LLM_SIM_FIRST_TOKEN", "lognormal:0.8,0.4")),
+        tokens_per_second=float(os.getenv("LLM_SIM_TOKENS_PER_SECOND", 40)),
+        answer_tokens=int(os.getenv("LLM_SIM_ANSWER_TOKENS", 60)),
+        error_rate=float(os.getenv("LLM_SIM_ERROR_RATE", 0)),
+        timeout_rate=float(os.getenv("LLM_SIM_TIMEOUT_RATE", 0)),
+        stream_break_rate=float(os.getenv("LLM_SIM_STREAM_BREAK_RATE", 0)),
+        seed=int(seed) if seed else None
+    )
+
+
+def model_from_env(backend: str):
+    """
+    Modèle du backend http ou simulated ; None pour les autres
+    """
+    if backend == "http":
+        return HTTPModel(
+            os.getenv("LLM_HTTP_URL", "http://127.0.0.1:8090"),
+            max_connections=int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+        )
+    if backend == "simulated":
+        return simulated_model_from_env()
+    return None
@@ -0,0 +1,137 @@
+"""
+Protection des appels LLM : regroupement, limite de concurrence et délai maximal
+
+- Single-flight : les prompts identiques en cours partagent un seul appel
+  (ex: la même question posée par des centaines de clients après une campagne)
+- Sémaphore borné : au plus max_concurrency appels simultanés, au plus
+  max_queue appels en attente ; au-delà, l'appel est refusé immédiatement
+- Délai maximal par appel (attente comprise) : au-delà, l'appel échoue et
+  l'appelant répond avec la réponse de secours au lieu de rester bloqué
+"""
+
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class LLMOverloadedError(Exception):
+    """
+    File d'attente des appels LLM pleine
+    """
+
+
+class LLMCallGuard:
+    """
+    Regroupement des appels identiques et limitation de la concurrence
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_queue: int = 100,
+        timeout_seconds: Optional[float] = 20.0,
+        coalescing: bool = True
+    ):
+        """
+        Args:
+            max_concurrency: Nombre maximal d'appels LLM simultanés
+            max_queue: Nombre maximal d'appels en attente d'une place
+            timeout_seconds: Délai maximal d'un appel, attente comprise (None/0 = aucun)
+            coalescing: Partager un seul appel entre prompts identiques en cours
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds or None
+        self.coalescing = coalescing
+        self._semaphore = None
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        self.waiting = 0
+        self.running = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def call(self, prompt: str, func: Callable[[], Awaitable]):
+        """
+        Exécute func() (l'appel LLM pour ce prompt), ou attend l'appel identique déjà en cours
+
+        Raises:
+            LLMOverloadedError: File d'attente pleine
+            asyncio.TimeoutError: Délai maximal dépassé
+        """
+        key = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        task = self._in_flight.get(key) if self.coalescing else None
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._execute(func))
+            if self.coalescing:
+                self._in_flight[key] = task
+                task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # shield : l'annulation d'un appelant (client déconnecté) n'annule pas
+        # l'appel partagé par les autres
+        return await asyncio.shield(task)
+
+    async def _execute(self, func: Callable[[], Awaitable]):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout_seconds if self.timeout_seconds else None
+
+        await self.acquire(self.timeout_seconds)
+        try:
+            remaining = max(deadline - loop.time(), 0.0) if deadline is not None else None
+            return await asyncio.wait_for(func(), remaining)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.release()
+
+    async def acquire(self, timeout: Optional[float] = None):
+        """
+        Attend une place parmi les max_concurrency appels simultanés
+
+        Raises:
+            LLMOverloadedError: File d'attente pleine
+            asyncio.TimeoutError: Pas de place avant le délai
+        """
+        # Compteurs tenus de façon synchrone : semaphore.locked() ne voit pas
+        # encore les acquisitions planifiées mais pas démarrées
+        if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise LLMOverloadedError(f"{self.waiting} appels LLM en attente")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._get_semaphore().acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        self.calls += 1
+
+    def release(self):
+        self.running -= 1
+        self._get_semaphore().release()
+
+    def stats(self) -> dict:
+        requests = self.calls + self.coalesced
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": round(self.coalesced / requests, 4) if requests else 0.0,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected
+        }
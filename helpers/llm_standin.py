@@ -0,0 +1,158 @@
+"""
+Serveur LLM local de substitution (réponses déterministes, latence simulée)
+
+Remplace Gemini pour les tests de charge, le réglage des délais et les
+bancs de régression de /chat, sans clé API ni réseau : l'API le joint avec
+LLM_BACKEND=http et LLM_HTTP_URL. Chaque requête est servie par un
+SimulatedModel (helpers.llm_backends) : délai avant le premier token tiré
+de --first-token, --tokens-per-second, erreurs (HTTP 503), blocages et
+coupures de flux injectés. --max-concurrency borne les générations en
+cours comme le quota d'un fournisseur : les suivantes attendent leur tour.
+
+    POST /generate {"prompt": "...", "stream": false} -> {"text": "..."}
+    POST /generate {"prompt": "...", "stream": true}  -> lignes NDJSON {"text": "..."},
+                                                         {"error": "..."} si le flux est coupé
+    GET  /stats                                       -> compteurs et configuration
+
+Usage:
+    python -m helpers.llm_standin --port 8090
+    python -m helpers.llm_standin --first-token lognormal:0.8,0.4 --tokens-per-second 40 --error-rate 0.02 --timeout-rate 0.01
+    python -m helpers.llm_standin --first-token fixed:0 --tokens-per-second 0   # réponse immédiate
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from helpers.llm_backends import LatencyDistribution, SimulatedLLMError, SimulatedModel, simulated_model_from_env
+from helpers.serialization import dumps
+
+
+class GenerateRequest(BaseModel):
+    prompt: str
+    stream: bool = False
+
+
+def create_app(model: SimulatedModel, max_concurrency: int = 0) -> FastAPI:
+    """
+    Application du serveur de substitution autour d'un SimulatedModel
+    max_concurrency : générations simultanées (0 = sans limite)
+    """
+    app = FastAPI(title="LLM stand-in")
+    slots = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+    state = {"running": 0, "waiting": 0}
+
+    async def acquire():
+        if slots is not None:
+            state["waiting"] += 1
+            try:
+                await slots.acquire()
+            finally:
+                state["waiting"] -= 1
+        state["running"] += 1
+
+    def release():
+        state["running"] -= 1
+        if slots is not None:
+            slots.release()
+
+    @app.post("/generate")
+    async def generate(request: GenerateRequest):
+        await acquire()
+        chunks = model.stream(request.prompt)
+        if not request.stream:
+            try:
+                text = "".join([chunk async for chunk in chunks])
+            except SimulatedLLMError as e:
+                return JSONResponse({"detail": str(e)}, status_code=503)
+            finally:
+                release()
+            return {"text": text}
+
+        try:
+            # Une erreur avant le premier token donne un statut 503, comme une API
+            first = await chunks.__anext__()
+        except SimulatedLLMError as e:
+            release()
+            return JSONResponse({"detail": str(e)}, status_code=503)
+        except StopAsyncIteration:
+            first = ""
+        except BaseException:
+            release()
+            raise
+
+        async def lines():
+            try:
+                yield dumps({"text": first}) + b"\n"
+                async for chunk in chunks:
+                    yield dumps({"text": chunk}) + b"\n"
+            except SimulatedLLMError as e:
+                # Statut déjà envoyé : la coupure est signalée par une dernière ligne
+                yield dumps({"error": str(e)}) + b"\n"
+            finally:
+                release()
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            **model.stats(),
+            **state,
+            "first_token": str(model.first_token),
+            "tokens_per_second": model.tokens_per_second,
+            "answer_tokens": model.answer_tokens,
+            "error_rate": model.error_rate,
+            "timeout_rate": model.timeout_rate,
+            "stream_break_rate": model.stream_break_rate,
+            "max_concurrency": max_concurrency
+        }
+
+    return app
+
+
+def main():
+    # Valeurs par défaut : variables LLM_SIM_* (voir .env.example)
+    defaults = simulated_model_from_env()
+    parser = argparse.ArgumentParser(description="Serveur LLM local de substitution")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--first-token", default=str(defaults.first_token),
+                        help="Délai avant le premier token (fixed:s, uniform:a,b, normal:m,s, lognormal:médiane,sigma, exponential:moyenne)")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second, help="Débit (0 = sans délai)")
+    parser.add_argument("--answer-tokens", type=int, default=defaults.answer_tokens, help="Longueur moyenne des réponses")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Part des requêtes en erreur (503)")
+    parser.add_argument("--timeout-rate", type=float, default=defaults.timeout_rate, help="Part des requêtes sans réponse")
+    parser.add_argument("--stream-break-rate", type=float, default=defaults.stream_break_rate, help="Part des flux coupés à mi-réponse")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Générations simultanées (0 = sans limite)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    model = SimulatedModel(
+        first_token=LatencyDistribution.parse(args.first_token),
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        stream_break_rate=args.stream_break_rate,
+        seed=args.seed
+    )
+    print(f"🤖 LLM de substitution sur http://{args.host}:{args.port} (premier token {model.first_token}, "
+          f"{model.tokens_per_second:g} tokens/s, erreurs {model.error_rate:.1%}, blocages {model.timeout_rate:.1%})")
+    # Arrêt sans attendre les requêtes bloquées (--timeout-rate)
+    uvicorn.run(create_app(model, args.max_concurrency), host=args.host, port=args.port,
+                log_level="warning", timeout_graceful_shutdown=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Instrumentation du chemin critique et export au format texte Prometheus
+
+Histogrammes de durée par étape (embedding, requête vectorielle, construction
+du prompt, appel LLM...), histogramme et compteur des requêtes HTTP, compteurs
+(fallbacks et erreurs LLM) et jauges lues au moment de l'export (taille de la
+collection, des caches). Les durées d'étapes de la requête en cours peuvent
+être renvoyées dans l'en-tête Server-Timing.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+# Bornes des histogrammes de latence (secondes)
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+# Durées d'étapes (ms) de la requête HTTP en cours, pour l'en-tête Server-Timing
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """
+    Histogramme cumulatif à bornes fixes
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """
+    Chronomètre d'une étape : histogramme global et durées de la requête en cours
+    """
+
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Registre des métriques de l'application
+    """
+
+    def __init__(self, enabled: bool = True, timing_header: bool = False):
+        """
+        Args:
+            enabled: False rend l'instrumentation inopérante (aucune mesure)
+            timing_header: Renvoyer les durées d'étapes dans l'en-tête Server-Timing
+        """
+        self.enabled = enabled
+        self.timing_header = timing_header
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._callbacks: Dict[str, Callable] = {}
+
+        self.describe("rag_stage_duration_seconds", "histogram", "Durée de chaque étape du traitement")
+        self.describe("http_request_duration_seconds", "histogram", "Durée des requêtes HTTP")
+        self.describe("http_requests_total", "counter", "Requêtes HTTP par route et code de statut")
+        self.describe("llm_fallbacks_total", "counter", "Réponses de secours du LLM par raison")
+        self.describe("llm_errors_total", "counter", "Erreurs d'appel au LLM")
+        self.describe("rag_errors_total", "counter", "Erreurs d'embedding ou de recherche par étape")
+        self.describe("llm_prompts_total", "counter", "Prompts construits pour le LLM")
+        self.describe("llm_prompt_tokens_total", "counter", "Tokens (estimés) des prompts construits")
+        self.describe("llm_context_documents_dropped_total", "counter", "Documents écartés du contexte par raison")
+        self.describe("llm_skipped_total", "counter", "Réponses données sans appel au LLM")
+        self.describe("rerank_requests_total", "counter", "Recherches passées par le re-ranking")
+        self.describe("rerank_fallbacks_total", "counter", "Re-rankings abandonnés (ordre de la première étape) par raison")
+        self.describe("chat_session_turns_total", "counter", "Tours de conversation avec session, par type (nouveau sujet, relance)")
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def stage(self, name: str):
+        """
+        Gestionnaire de contexte mesurant la durée d'une étape
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record_stage(self, name: str, seconds: float):
+        self.observe("rag_stage_duration_seconds", seconds, stage=name)
+        timings = request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds * 1000
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def register_callback(self, name: str, kind: str, help_text: str, callback: Callable):
+        """
+        Métrique lue au moment de l'export (jauge ou compteur tenu ailleurs)
+        callback retourne une valeur, ou None pour ne rien exporter
+        """
+        self.describe(name, kind, help_text)
+        self._callbacks[name] = callback
+
+    def render(self) -> str:
+        """
+        Export au format texte Prometheus (version 0.0.4)
+        """
+        lines = []
+        with self._lock:
+            histograms = {
+                name: {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            counters = {name: dict(series) for name, series in self._counters.items()}
+
+        for name, series in histograms.items():
+            self._header(lines, name)
+            for key, (counts, total, count, buckets) in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(key)} {total}")
+                lines.append(f"{name}_count{_labels(key)} {count}")
+
+        for name, series in counters.items():
+            self._header(lines, name)
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(key)} {value}")
+
+        for name, callback in self._callbacks.items():
+            try:
+                value = callback()
+            except Exception:
+                continue
+            if value is None:
+                continue
+            self._header(lines, name)
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, name: str):
+        kind, help_text = self._help.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(key: Tuple) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in key) + "}"
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : durée et nombre des requêtes HTTP par route,
+    et en-tête Server-Timing avec les durées d'étapes si activé
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._paths = None
+        self._routes = None
+
+    def _route(self, scope) -> str:
+        # Étiquette bornée : gabarit de la route (/sessions/{session_id}), sinon "other"
+        if self._routes is None:
+            routes = [route for route in scope["app"].routes if hasattr(route, "path_regex")]
+            self._paths = {route.path for route in routes if "{" not in route.path}
+            self._routes = [(route.path_regex, route.path) for route in routes if "{" in route.path]
+        path = scope.get("path", "")
+        if path in self._paths:
+            return path
+        for path_regex, template in self._routes:
+            if path_regex.match(path):
+                return template
+        return "other"
+
+    async def __call__(self, scope, receive, send):
+        metrics = get_metrics()
+        if scope["type"] != "http" or not metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = {} if metrics.timing_header else None
+        token = request_timings.set(timings)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if timings:
+                    header = ", ".join(f"{name};dur={value:.2f}" for name, value in timings.items())
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_timings.reset(token)
+            route = self._route(scope)
+            metrics.observe("http_request_duration_seconds", time.perf_counter() - start, route=route)
+            metrics.inc("http_requests_total", route=route, status=str(status[0]))
+
+
+# Instance globale du registre
+metrics = None
+
+
+def get_metrics() -> Metrics:
+    """
+    Retourne le registre global, configuré par METRICS_ENABLED et STAGE_TIMING_HEADER
+    """
+    global metrics
+    if metrics is None:
+        metrics = Metrics(
+            enabled=os.getenv("METRICS_ENABLED", "true").lower() == "true",
+            timing_header=os.getenv("STAGE_TIMING_HEADER", "false").lower() == "true"
+        )
+    return metrics
@@ -0,0 +1,99 @@
+"""
+all-MiniLM-L6-v2 ONNX avec réglages d'exécution (backends onnx et onnx-int8)
+
+Module séparé de helpers.embeddings : la classe hérite de la fonction ONNX de
+ChromaDB, dont l'import (client, onnxruntime) n'est payé qu'à l'usage.
+"""
+
+import os
+from typing import List
+
+import numpy as np
+from chromadb.utils import embedding_functions
+
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+
+
+class OnnxEmbeddingFunction(embedding_functions.ONNXMiniLM_L6_V2):
+    """
+    all-MiniLM-L6-v2 ONNX (téléchargé comme par ChromaDB) avec réglages d'exécution
+    """
+
+    def __init__(self, threads: int = 0, batch_size: int = 32, quantized: bool = False):
+        """
+        Args:
+            threads: Threads intra-op ONNX Runtime (0 = choix d'ONNX Runtime)
+            batch_size: Textes par passage du modèle
+            quantized: Utiliser le modèle quantifié en int8
+        """
+        super().__init__()
+        self.threads = threads
+        self.batch_size = batch_size
+        self.quantized = quantized
+        self.cache_namespace = self.MODEL_NAME + ("-int8" if quantized else "")
+
+    def model_file(self) -> str:
+        folder = os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME)
+        if not self.quantized:
+            return os.path.join(folder, "model.onnx")
+        quantized_path = os.path.join(folder, QUANTIZED_MODEL_FILE)
+        if not os.path.exists(quantized_path):
+            quantize_model(os.path.join(folder, "model.onnx"), quantized_path)
+        return quantized_path
+
+    def _init_model_and_tokenizer(self) -> None:
+        if self.model is not None and self.tokenizer is not None:
+            return
+        self.tokenizer = self.Tokenizer.from_file(
+            os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "tokenizer.json")
+        )
+        self.tokenizer.enable_truncation(max_length=256)
+        # Remplissage à la plus longue séquence du lot : les questions FAQ font
+        # quelques dizaines de tokens, remplir à 256 multiplie le calcul
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = self.ort.SessionOptions()
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+        self.model = self.ort.InferenceSession(
+            self.model_file(),
+            sess_options=options,
+            providers=self._preferred_providers or self.ort.get_available_providers()
+        )
+
+    def _forward(self, documents: List[str], batch_size: int = 32):
+        # Lots formés par longueur croissante : peu de remplissage dans chaque lot
+        order = np.argsort([len(document) for document in documents], kind="stable")
+        embeddings = np.zeros((len(documents), 384), dtype=np.float32)
+        for i in range(0, len(documents), self.batch_size):
+            rows = order[i:i + self.batch_size]
+            encoded = self.tokenizer.encode_batch([documents[row] for row in rows])
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            last_hidden_state = self.model.run(None, {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids)
+            })[0]
+            # Moyenne des états cachés pondérée par le masque d'attention
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (last_hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            embeddings[rows] = self._normalize(pooled)
+        return embeddings
+
+
+def quantize_model(source: str, target: str):
+    """
+    Quantification dynamique des poids en int8 (onnxruntime.quantization, paquet onnx requis)
+    """
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ValueError(
+            "La quantification int8 nécessite le paquet onnx : pip install onnx"
+        ) from e
+    print(f"⚙️  Quantification int8 du modèle: {target}")
+    temporary = f"{target}.tmp"
+    quantize_dynamic(source, temporary, weight_type=QuantType.QInt8)
+    os.replace(temporary, target)
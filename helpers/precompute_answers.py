@@ -0,0 +1,182 @@
+"""
+Job hors ligne : réponses canoniques du LLM pour tous les documents de la collection
+
+Pour chaque document, ses voisins sont retrouvés avec RAGSystem.search_documents
+(la question du document comme requête) et le LLM génère la réponse canonique,
+rangée dans le store (ANSWER_STORE_PATH) avec l'empreinte du contenu Q/R.
+  - appels concurrents (--concurrency, plafonnés par LLM_MAX_CONCURRENCY)
+    et débit limité (--rate requêtes/s), avec nouvelles tentatives espacées
+  - écriture par lots (--checkpoint-every) : relancé, le job reprend où il
+    s'est arrêté, seuls les documents absents ou modifiés sont recalculés
+  - les entrées des documents supprimés de la collection sont effacées
+
+Le service ne lit le store que pour les documents décisifs : sans
+CONTEXT_DECISIVE_DISTANCE, les réponses précalculées ne sont jamais servies.
+
+Usage:
+    python -m helpers.precompute_answers
+    python -m helpers.precompute_answers --concurrency 8 --rate 5 --limit 1000
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.answer_store import PrecomputedAnswerStore, answer_store_path
+from helpers.concurrency import run_blocking
+
+
+class RateLimiter:
+    """
+    Départs espacés régulièrement : au plus rate par seconde (0 = illimité)
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_start = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def precompute(
+    rag,
+    llm,
+    store: PrecomputedAnswerStore,
+    concurrency: int = 4,
+    rate: float = 0.0,
+    neighbours: int = 5,
+    checkpoint_every: int = 50,
+    retries: int = 3,
+    limit: int = None
+) -> dict:
+    """
+    Calcule les réponses manquantes ou périmées ; retourne le résumé du passage
+    """
+    existing = store.hashes()
+    limiter = RateLimiter(rate)
+    summary = {"documents": 0, "fresh": 0, "stale": 0, "computed": 0, "failed": 0, "deleted": 0}
+    seen = set()
+    pending = []
+
+    def todo():
+        # Documents sans réponse à jour, dans l'ordre de la collection
+        scheduled = 0
+        for document in rag.iter_documents():
+            summary["documents"] += 1
+            seen.add(document["id"])
+            known = existing.get(document["id"])
+            if known == document["content_hash"]:
+                summary["fresh"] += 1
+                continue
+            if known is not None:
+                summary["stale"] += 1
+            if limit is not None and scheduled >= limit:
+                continue
+            scheduled += 1
+            yield document
+
+    async def answer(document):
+        results = await run_blocking(
+            rag.search_documents, document["question"], neighbours, None, False
+        )
+        # Le document lui-même en tête du contexte
+        results = [document] + [doc for doc in results if doc["id"] != document["id"]][:neighbours - 1]
+        for attempt in range(retries + 1):
+            await limiter.wait()
+            try:
+                return await llm.generate_canonical_answer(document["question"], results)
+            except Exception as e:
+                if attempt == retries:
+                    print(f"❌ {document['id']}: {e}")
+                    return None
+                await asyncio.sleep(2 ** attempt)
+
+    async def worker(documents):
+        # Itérateur partagé : chaque worker prend le document suivant
+        for document in documents:
+            text = await answer(document)
+            if text is None:
+                summary["failed"] += 1
+                continue
+            pending.append((document["id"], document["content_hash"], text))
+            summary["computed"] += 1
+            if len(pending) >= checkpoint_every:
+                store.put_many(pending)
+                pending.clear()
+                print(f"💾 {summary['computed']} réponses calculées")
+
+    documents = todo()
+    try:
+        await asyncio.gather(*[worker(documents) for _ in range(concurrency)])
+    finally:
+        store.put_many(pending)
+        pending.clear()
+
+    # Entrées des documents qui ne sont plus dans la collection
+    summary["deleted"] = store.delete(doc_id for doc_id in existing if doc_id not in seen)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Précalcul des réponses canoniques du LLM")
+    parser.add_argument("--store", default=None, help="Fichier du store (défaut: ANSWER_STORE_PATH)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Appels LLM simultanés")
+    parser.add_argument("--rate", type=float, default=0.0, help="Appels LLM par seconde (0 = illimité)")
+    parser.add_argument("--neighbours", type=int, default=5, help="Documents du contexte de chaque réponse")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="Réponses écrites par point de reprise")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=None, help="Nombre maximal de réponses calculées")
+    args = parser.parse_args()
+
+    from helpers.chromadb import get_rag_system
+    from llm import get_llm_generator
+
+    path = args.store or answer_store_path()
+    if not path:
+        print("❌ ANSWER_STORE_PATH vide : store désactivé")
+        sys.exit(1)
+    llm = get_llm_generator()
+    if not llm.use_model:
+        print("❌ LLM non configuré (LLM_BACKEND, GOOGLE_API_KEY) : rien à précalculer")
+        sys.exit(1)
+    if llm.context_builder.decisive_distance is None:
+        print("⚠️  CONTEXT_DECISIVE_DISTANCE non défini : le service ne servira pas ces réponses "
+              "tant qu'il n'est pas défini")
+
+    rag = get_rag_system()
+    store = PrecomputedAnswerStore(path)
+    start = time.perf_counter()
+    summary = asyncio.run(precompute(
+        rag, llm, store,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        neighbours=args.neighbours,
+        checkpoint_every=args.checkpoint_every,
+        retries=args.retries,
+        limit=args.limit
+    ))
+
+    print(f"\n✅ Précalcul terminé en {time.perf_counter() - start:.1f}s ({path})")
+    print(f"   📄 Documents: {summary['documents']}")
+    print(f"   ✏️  Calculées: {summary['computed']} (dont {summary['stale']} périmées)")
+    print(f"   ⏸️  À jour: {summary['fresh']}")
+    print(f"   🗑️  Supprimées: {summary['deleted']}")
+    if summary['failed']:
+        print(f"   ❌ Échecs: {summary['failed']} (recalculées au prochain passage)")
+    print(f"📊 Entrées dans le store: {len(store)}")
+
+
+if __name__ == "__main__":
+    main()
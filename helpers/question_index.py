@@ -0,0 +1,79 @@
+"""
+Index en mémoire des questions FAQ normalisées
+
+Permet de répondre aux questions identiques (à la casse et à la ponctuation près)
+sans calculer d'embedding ni interroger l'index HNSW.
+"""
+
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalise une question : minuscules, sans accents, sans ponctuation,
+    espaces multiples réduits
+    """
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class QuestionIndex:
+    """
+    Table de hachage question normalisée -> document
+    """
+
+    def __init__(self):
+        self._documents = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def clear(self):
+        self._documents.clear()
+
+    def memory_bytes(self) -> int:
+        """
+        Estimation de la mémoire des textes indexés (clés, documents, questions,
+        réponses), plus un surcoût fixe par entrée pour les objets Python
+        """
+        return sum(
+            len(key) + len(entry["document"]) + len(entry["question"]) + len(entry["answer"]) + 200
+            for key, entry in self._documents.items()
+        )
+
+    def add(self, doc_id: str, metadata: Dict, document: Optional[str] = None):
+        """
+        Indexe un document à partir de ses métadonnées (question/answer), sous
+        sa question et ses formulations regroupées (alternate_questions)
+        La première occurrence d'une question normalisée est conservée
+        """
+        entry = {
+            "id": doc_id,
+            "document": document or f"Question: {metadata['question']}\nReponse: {metadata['answer']}",
+            "question": metadata["question"],
+            "answer": metadata["answer"]
+        }
+        for question in [metadata["question"]] + metadata.get("alternate_questions", "").splitlines():
+            key = normalize_question(question)
+            if key and key not in self._documents:
+                self._documents[key] = entry
+
+    def add_many(self, ids: List[str], metadatas: List[Dict], documents: Optional[List[str]] = None):
+        for i, doc_id in enumerate(ids):
+            self.add(doc_id, metadatas[i], documents[i] if documents else None)
+
+    def lookup(self, query: str) -> Optional[Dict]:
+        """
+        Retourne le document dont la question correspond à la requête, avec une distance de 0
+        """
+        document = self._documents.get(normalize_question(query))
+        if document is None:
+            return None
+        return {**document, "distance": 0.0}
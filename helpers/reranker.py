@@ -0,0 +1,291 @@
+"""
+Re-ranking des candidats par un cross-encoder sur CPU
+
+Deuxième étape optionnelle de la recherche : les RERANK_CANDIDATES premiers
+documents de la recherche (dense, lexicale ou hybride) sont notés par un petit
+cross-encoder ONNX (ex: ms-marco-MiniLM-L-6-v2) qui lit la requête et le
+document ensemble, puis reclassés par score.
+  - lots triés par longueur, threads ONNX limités (RERANK_THREADS)
+  - scores (requête, document) gardés dans un cache LRU en mémoire
+  - budget de latence : si la notation des paires absentes du cache doit le
+    dépasser (estimation d'après les lots précédents) ou le dépasse en cours
+    de route, l'ordre de la première étape est retourné ; l'estimation décroît
+    à chaque abandon, pour qu'un pic passager ne coupe pas le re-ranking
+    définitivement (le premier lot suivant la remesure)
+"""
+
+import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from helpers.metrics import get_metrics
+
+
+class CrossEncoderScorer:
+    """
+    Cross-encoder ONNX : score de pertinence de paires (requête, document)
+
+    Le dossier contient model.onnx et tokenizer.json, par exemple l'export de
+    cross-encoder/ms-marco-MiniLM-L-6-v2 par optimum-cli export onnx
+    """
+
+    def __init__(self, model_dir: str, threads: int = 1, batch_size: int = 16, max_length: int = 256):
+        """
+        Args:
+            model_dir: Dossier du modèle (model.onnx, tokenizer.json)
+            threads: Threads intra-op ONNX Runtime (0 = choix d'ONNX Runtime)
+            batch_size: Paires par passage du modèle
+            max_length: Tokens maximum d'une paire (le document est tronqué)
+        """
+        self.model_dir = model_dir
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.session = None
+        self.tokenizer = None
+        self.input_names = ()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Charge le modèle et le tokenizer (au premier usage ou au préchauffage)
+        """
+        with self._lock:
+            if self.session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length, strategy="only_second")
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+            options = ort.SessionOptions()
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+                options.inter_op_num_threads = 1
+            session = ort.InferenceSession(
+                os.path.join(self.model_dir, "model.onnx"),
+                sess_options=options,
+                providers=["CPUExecutionProvider"]
+            )
+            self.input_names = tuple(model_input.name for model_input in session.get_inputs())
+            self.tokenizer = tokenizer
+            self.session = session
+
+    def batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Indices des textes par lot, formés par longueur croissante (peu de remplissage)
+        """
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        return [order[i:i + self.batch_size].tolist() for i in range(0, len(texts), self.batch_size)]
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        """
+        Scores d'un lot de paires (requête, texte), dans l'ordre des textes
+        """
+        self.load()
+        encoded = self.tokenizer.encode_batch([(query, text) for text in texts])
+        inputs = {
+            "input_ids": np.array([e.ids for e in encoded], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encoded], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encoded], dtype=np.int64)
+        }
+        logits = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+        # Une sortie (ms-marco) ou deux classes (pertinent = dernière colonne)
+        return logits[:, -1] if logits.ndim == 2 else logits
+
+
+class ScoreCache:
+    """
+    Cache LRU des scores (requête, contenu du document) -> score
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, text: str) -> bytes:
+        # Le contenu fait partie de la clé : un document modifié est renoté
+        return hashlib.sha1(f"{query}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, float]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                score = self._entries.get(key)
+                if score is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = score
+                self.hits += 1
+        return found
+
+    def put_many(self, items: Dict[bytes, float]):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries.update(items)
+            for key in items:
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Reranker:
+    """
+    Reclassement des candidats de la première étape, borné par un budget de latence
+    """
+
+    def __init__(
+        self,
+        scorer,
+        candidates: int = 50,
+        budget_ms: float = 0,
+        cache_size: int = 100000
+    ):
+        """
+        Args:
+            scorer: Objet exposant score(query, texts) et batches(texts)
+            candidates: Documents demandés à la première étape
+            budget_ms: Durée maximale de notation par requête (0 = illimitée)
+            cache_size: Entrées du cache LRU des scores (0 = pas de cache)
+        """
+        self.scorer = scorer
+        self.candidates = candidates
+        self.budget_ms = budget_ms
+        self.cache = ScoreCache(cache_size)
+        # Coût moyen d'une paire (moyenne glissante), pour estimer une notation
+        self.pair_seconds = None
+        # Décroissance de l'estimation à chaque abandon pour budget
+        self.budget_decay = 0.9
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.reranked = 0
+        self.fallbacks = {"budget": 0, "timeout": 0, "error": 0}
+
+    def rerank(self, query: str, documents: List[Dict], n_results: int = 5) -> List[Dict]:
+        """
+        n_results documents reclassés par score (champ rerank_score), ou les
+        premiers de la première étape si le budget ne permet pas de les noter
+        """
+        if len(documents) <= 1:
+            return documents[:n_results]
+        metrics = get_metrics()
+        with metrics.stage("rerank"):
+            scores = self.score(query, documents)
+        self.requests += 1
+        metrics.inc("rerank_requests_total")
+        if scores is None:
+            return documents[:n_results]
+        self.reranked += 1
+        order = np.argsort(-scores, kind="stable")[:n_results]
+        return [{**documents[i], "rerank_score": round(float(scores[i]), 4)} for i in order]
+
+    def score(self, query: str, documents: List[Dict]) -> Optional[np.ndarray]:
+        """
+        Scores des documents : cache, puis lots du modèle dans le budget ; None si abandon
+        """
+        start = time.perf_counter()
+        texts = [document["document"] for document in documents]
+        keys = [self.cache.key(query, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        scores = np.array([cached.get(key, np.nan) for key in keys], dtype=np.float32)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if not missing:
+            return scores
+
+        budget = self.budget_ms / 1000
+        if budget and self.pair_seconds is not None and self.pair_seconds * len(missing) > budget:
+            with self._lock:
+                self.pair_seconds *= self.budget_decay
+            return self._fallback("budget")
+
+        missing_texts = [texts[i] for i in missing]
+        computed = {}
+        try:
+            # Chargement du modèle (préchauffage désactivé) hors budget et hors estimation
+            load = getattr(self.scorer, "load", None)
+            if load is not None:
+                load_start = time.perf_counter()
+                load()
+                start += time.perf_counter() - load_start
+            for rows in self.scorer.batches(missing_texts):
+                elapsed = time.perf_counter() - start
+                if budget and computed and elapsed + self.pair_seconds * len(rows) > budget:
+                    # Les scores déjà calculés restent en cache pour les requêtes suivantes
+                    self.cache.put_many(computed)
+                    return self._fallback("timeout")
+                batch_start = time.perf_counter()
+                batch_scores = self.scorer.score(query, [missing_texts[row] for row in rows])
+                self._observe((time.perf_counter() - batch_start) / len(rows))
+                for row, score in zip(rows, batch_scores):
+                    scores[missing[row]] = score
+                    computed[keys[missing[row]]] = float(score)
+        except Exception as e:
+            print(f"❌ Erreur re-ranking: {e}")
+            return self._fallback("error")
+
+        self.cache.put_many(computed)
+        return scores
+
+    def _observe(self, seconds: float):
+        with self._lock:
+            if self.pair_seconds is None:
+                self.pair_seconds = seconds
+            else:
+                self.pair_seconds = 0.8 * self.pair_seconds + 0.2 * seconds
+
+    def _fallback(self, reason: str) -> None:
+        self.fallbacks[reason] += 1
+        get_metrics().inc("rerank_fallbacks_total", reason=reason)
+        return None
+
+    def stats(self) -> Dict:
+        lookups = self.cache.hits + self.cache.misses
+        return {
+            "candidates": self.candidates,
+            "budget_ms": self.budget_ms,
+            "requests": self.requests,
+            "reranked": self.reranked,
+            "fallbacks": dict(self.fallbacks),
+            "pair_ms": round(self.pair_seconds * 1000, 3) if self.pair_seconds is not None else None,
+            "cache_entries": len(self.cache),
+            "cache_hit_rate": round(self.cache.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def reranker_from_env() -> Optional[Reranker]:
+    """
+    Re-ranking configuré par variables d'environnement (RERANK_*), ou None s'il est désactivé
+    """
+    if os.getenv("RERANK_ENABLED", "false").lower() != "true":
+        return None
+    model_dir = os.getenv("RERANK_MODEL_DIR", "./data/models/ms-marco-MiniLM-L-6-v2")
+    if not os.path.exists(os.path.join(model_dir, "model.onnx")):
+        print(f"⚠️  Modèle de re-ranking introuvable ({model_dir}/model.onnx) : re-ranking désactivé")
+        return None
+    scorer = CrossEncoderScorer(
+        model_dir,
+        threads=int(os.getenv("RERANK_THREADS", 1)),
+        batch_size=int(os.getenv("RERANK_BATCH_SIZE", 16)),
+        max_length=int(os.getenv("RERANK_MAX_LENGTH", 256))
+    )
+    return Reranker(
+        scorer,
+        candidates=int(os.getenv("RERANK_CANDIDATES", 50)),
+        budget_ms=float(os.getenv("RERANK_BUDGET_MS", 50)),
+        cache_size=int(os.getenv("RERANK_CACHE_SIZE", 100000))
+    )
@@ -0,0 +1,107 @@
+"""
+Sérialisation rapide des réponses JSON
+
+Les réponses de /search, /search/batch et /chat sont des listes de dicts :
+les valider par Pydantic (List[Dict]) puis les encoder avec jsonable_encoder
+et json.dumps coûte plus que la recherche elle-même. Les endpoints retournent
+directement une FastJSONResponse :
+  - encodage par orjson (types numpy compris), json standard s'il est absent
+  - champs des documents au choix du client (ex: id et distance seulement)
+  - compression gzip des corps d'au moins RESPONSE_GZIP_MIN_BYTES octets
+    si le client l'accepte (Accept-Encoding et ses q-values ; 0 = jamais)
+"""
+
+import os
+import gzip
+import json
+from typing import Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+from helpers.metrics import get_metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Taille minimale d'un corps compressé par gzip (0 = pas de compression)
+GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", 0))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 1))
+
+
+def _default(value):
+    # Scalaires et tableaux numpy (distances, embeddings) pour json standard
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Type non sérialisable en JSON: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    """
+    Encode en JSON UTF-8 compact
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def select_fields(documents: List[Dict], fields: Optional[List[str]]) -> List[Dict]:
+    """
+    Ne garde que les champs demandés de chaque document (tous si fields est vide)
+    """
+    if not fields:
+        return documents
+    return [{field: doc[field] for field in fields if field in doc} for doc in documents]
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """
+    Le client accepte-t-il gzip ? Lit les q-values d'Accept-Encoding :
+    "gzip;q=0" refuse gzip, "*" vaut pour gzip s'il n'est pas cité
+    """
+    if not accept_encoding:
+        return False
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value.strip())
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in weights:
+            return weights[coding] > 0
+    return False
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Réponse JSON encodée par orjson, sans passage par jsonable_encoder
+    """
+
+    def render(self, content) -> bytes:
+        with get_metrics().stage("serialize"):
+            return dumps(content)
+
+
+def json_response(content, accept_encoding: Optional[str] = None, status_code: int = 200) -> FastJSONResponse:
+    """
+    Réponse JSON, compressée par gzip si elle est assez grande et que le client l'accepte
+    """
+    response = FastJSONResponse(content, status_code=status_code)
+    if GZIP_MIN_BYTES and len(response.body) >= GZIP_MIN_BYTES and accepts_gzip(accept_encoding):
+        with get_metrics().stage("gzip"):
+            response.body = gzip.compress(response.body, compresslevel=GZIP_LEVEL)
+        response.headers["content-encoding"] = "gzip"
+        response.headers["content-length"] = str(len(response.body))
+        response.headers["vary"] = "Accept-Encoding"
+    return response
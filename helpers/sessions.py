@@ -0,0 +1,432 @@
+"""
+Sessions de conversation pour /chat (questions de relance)
+
+Une relance courte ("et pour les commandes internationales ?") est mal
+retrouvée seule. Avec un session_id, le serveur garde l'état compact de la
+conversation :
+  - les dernières questions du sujet en cours (SESSION_MAX_TURNS) : une relance
+    est réécrite en les concaténant avant la recherche
+  - les documents retrouvés au dernier tour (SESSION_MAX_DOCUMENTS) : si les
+    termes de la relance y figurent tous, ils sont réutilisés sans nouvelle
+    recherche (ni embedding)
+Les états sont gardés en mémoire (LRU, expiration après SESSION_TTL secondes
+d'inactivité, plafonds en nombre et en octets) ou dans des fichiers locaux
+(SESSION_BACKEND=file), partagés entre les workers d'une même machine.
+"""
+
+import os
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from helpers.lexical_index import tokenize
+from helpers.metrics import get_metrics
+from helpers.snapshot import default_document
+
+# Mots sans contenu (français, anglais), ignorés pour détecter et couvrir une relance
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from how i if in is it its me my of on or our
+please should so than that the their them then there these they this those to us was we what
+when where which who why will with would you your about also any
+au aux avec ce ces cette comment dans de des du elle en est et il ils je la le les leur ma mais
+me mes mon ne nos notre nous on ou par pas pour puis quand que quel quelle qui sa se ses si son
+sur ta te tes ton tu un une vos votre vous y ca cela ceci aussi
+""".split())
+
+# Débuts de phrase qui marquent une relance
+FOLLOW_UP_MARKERS = (
+    "and ", "what about", "how about", "what if", "also ", "same ",
+    "et ", "et pour", "et si", "aussi ", "pareil", "meme chose"
+)
+
+# Pronoms qui renvoient au sujet précédent
+REFERRING_TERMS = frozenset("it this them those ca cela celle celui ceux celles".split())
+
+
+def content_terms(text: str) -> List[str]:
+    """
+    Termes porteurs de sens d'un texte (normalisés, sans mots vides)
+    """
+    return [term for term in tokenize(text) if term not in STOPWORDS and len(term) > 1]
+
+
+class SessionState:
+    """
+    État compact d'une conversation : questions du sujet en cours et derniers documents
+    """
+
+    __slots__ = ("turns", "documents", "updated_at")
+
+    def __init__(self, turns: Optional[List[str]] = None, documents: Optional[List[Dict]] = None,
+                 updated_at: float = 0.0):
+        self.turns = turns or []
+        self.documents = documents or []
+        self.updated_at = updated_at
+
+    def is_follow_up(self, query: str, max_terms: int = 1) -> bool:
+        """
+        Relance : sujet en cours et question courte, introduite par "et ..." ou renvoyant au sujet
+        """
+        if not self.turns:
+            return False
+        terms = tokenize(query)
+        if (" ".join(terms) + " ").startswith(FOLLOW_UP_MARKERS):
+            return True
+        return any(term in REFERRING_TERMS for term in terms) or len(content_terms(query)) <= max_terms
+
+    def rewrite(self, query: str) -> str:
+        """
+        Requête de recherche d'une relance : questions du sujet en cours puis relance
+        """
+        return " ".join(self.turns + [query])
+
+    def reusable_documents(self, query: str) -> Optional[List[Dict]]:
+        """
+        Documents du tour précédent si tous les termes de la relance y figurent
+        (classés par nombre de termes couverts), sinon None : nouvelle recherche
+        """
+        if not self.documents:
+            return None
+        terms = set(content_terms(query))
+        covered = [set(tokenize(f"{doc['question']} {doc['answer']}")) & terms for doc in self.documents]
+        if terms - set().union(*covered):
+            return None
+        order = sorted(range(len(self.documents)), key=lambda i: -len(covered[i]))
+        return [self.documents[i] for i in order]
+
+    def record(self, query: str, follow_up: bool, documents: Optional[List[Dict]], max_turns: int,
+               max_documents: int):
+        """
+        Enregistre un tour : nouvelle question de sujet ou relance, documents d'une nouvelle recherche
+        """
+        if follow_up:
+            # Garder la question du sujet et les relances les plus récentes
+            self.turns = (self.turns[:1] + self.turns[1:][-(max_turns - 2):] if max_turns > 2 else self.turns[:1])
+            self.turns.append(query)
+        else:
+            self.turns = [query]
+        if documents is not None:
+            self.documents = [compact_document(doc) for doc in documents[:max_documents]]
+        self.updated_at = time.time()
+
+    def nbytes(self) -> int:
+        """
+        Taille estimée de l'état (textes et surcoût des objets)
+        """
+        return 200 + sum(len(turn) + 50 for turn in self.turns) + sum(
+            sum(len(str(value)) for value in doc.values()) + 250 for doc in self.documents
+        )
+
+    def to_dict(self) -> Dict:
+        return {"turns": self.turns, "documents": self.documents, "updated_at": self.updated_at}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SessionState":
+        return cls(data["turns"], data["documents"], data["updated_at"])
+
+
+def compact_document(doc: Dict) -> Dict:
+    """
+    Champs d'un document gardés dans la session (le texte par défaut n'est pas stocké)
+    """
+    compact = {"id": doc["id"], "question": doc["question"], "answer": doc["answer"]}
+    if doc.get("document") and doc["document"] != default_document(doc["question"], doc["answer"]):
+        compact["document"] = doc["document"]
+    if doc.get("distance") is not None:
+        compact["distance"] = doc["distance"]
+    return compact
+
+
+def expand_document(doc: Dict) -> Dict:
+    """
+    Document réutilisé, au format de la recherche
+    """
+    return {
+        "id": doc["id"],
+        "document": doc.get("document") or default_document(doc["question"], doc["answer"]),
+        "question": doc["question"],
+        "answer": doc["answer"],
+        "distance": doc.get("distance")
+    }
+
+
+class MemorySessionStore:
+    """
+    Sessions en mémoire : LRU par dernier accès, expiration, plafonds en nombre et en octets
+    """
+
+    # Opérations en mémoire : appelées directement depuis la boucle d'événements
+    blocking = False
+
+    def __init__(self, ttl_seconds: float = 1800, max_sessions: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[SessionState]:
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is None:
+                return None
+            if self._is_expired(state, time.time()):
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._sessions.move_to_end(key)
+            return state
+
+    def put(self, key: str, state: SessionState):
+        size = state.nbytes()
+        with self._lock:
+            if key in self._sessions:
+                self._remove(key)
+            self._sessions[key] = state
+            self._sizes[key] = size
+            self._bytes += size
+            self._sweep(time.time())
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._sessions:
+                return False
+            self._remove(key)
+            return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "expirations": self.expirations,
+                "evictions": self.evictions
+            }
+
+    def _sweep(self, now: float):
+        # Ordre LRU = ordre des derniers accès : les expirées sont en tête
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if self._is_expired(self._sessions[oldest], now):
+                self._remove(oldest)
+                self.expirations += 1
+            elif len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes:
+                self._remove(oldest)
+                self.evictions += 1
+            else:
+                break
+
+    def _is_expired(self, state: SessionState, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - state.updated_at > self.ttl_seconds
+
+    def _remove(self, key: str):
+        self._sessions.pop(key)
+        self._bytes -= self._sizes.pop(key)
+
+
+class FileSessionStore:
+    """
+    Sessions dans des fichiers JSON locaux (un par session), partagées entre les
+    workers d'une machine ; les fichiers expirés ou en surnombre sont supprimés
+    tous les sweep_every enregistrements
+    Le nombre de sessions est tenu à jour par ce processus et recompté à chaque
+    nettoyage (les autres workers écrivent dans le même dossier)
+    """
+
+    # Lectures et écritures de fichiers : à exécuter hors de la boucle d'événements
+    blocking = True
+
+    def __init__(self, directory: str, ttl_seconds: float = 1800, max_sessions: int = 10000, sweep_every: int = 100):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.sweep_every = sweep_every
+        os.makedirs(directory, exist_ok=True)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._count = sum(1 for name in os.listdir(directory) if name.endswith(".json"))
+        self.expirations = 0
+        self.evictions = 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[SessionState]:
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as f:
+                state = SessionState.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        if self.ttl_seconds > 0 and time.time() - state.updated_at > self.ttl_seconds:
+            self.delete(key)
+            self.expirations += 1
+            return None
+        return state
+
+    def put(self, key: str, state: SessionState):
+        path = self.path(key)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(state.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        created = not os.path.exists(path)
+        os.replace(temporary, path)
+        with self._lock:
+            self._count += created
+            self._writes += 1
+            sweep = self._writes % self.sweep_every == 0
+        if sweep:
+            self.sweep()
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self._count = max(self._count - 1, 0)
+        return True
+
+    def sweep(self):
+        """
+        Supprime les sessions expirées, puis les plus anciennes au-delà de max_sessions
+        """
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                modified = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if self.ttl_seconds > 0 and now - modified > self.ttl_seconds:
+                self._unlink(entry.path)
+                self.expirations += 1
+            else:
+                files.append((modified, entry.path))
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.max_sessions)]:
+            self._unlink(path)
+            self.evictions += 1
+        with self._lock:
+            self._count = min(len(files), self.max_sessions)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "file",
+            "directory": self.directory,
+            # Compteur tenu à jour : /metrics ne parcourt pas le dossier à chaque collecte
+            "sessions": self._count,
+            "max_sessions": self.max_sessions,
+            "expirations": self.expirations,
+            "evictions": self.evictions
+        }
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ConversationManager:
+    """
+    Planification d'un tour de conversation et mise à jour de la session
+    """
+
+    def __init__(self, store, max_turns: int = 4, max_documents: int = 5, follow_up_terms: int = 1):
+        """
+        Args:
+            store: MemorySessionStore ou FileSessionStore
+            max_turns: Questions du sujet en cours gardées pour réécrire les relances
+            max_documents: Documents du dernier tour gardés pour être réutilisés
+            follow_up_terms: Nombre de termes en dessous duquel une question est une relance
+        """
+        self.store = store
+        self.max_turns = max_turns
+        self.max_documents = max_documents
+        self.follow_up_terms = follow_up_terms
+
+    def plan(self, key: str, query: str) -> Tuple[SessionState, bool, str, Optional[List[Dict]]]:
+        """
+        État de la session, relance ou non, requête de recherche et documents réutilisables
+        """
+        state = self.store.get(key) or SessionState()
+        follow_up = state.is_follow_up(query, self.follow_up_terms)
+        if not follow_up:
+            return state, False, query, None
+        documents = state.reusable_documents(query)
+        return state, True, state.rewrite(query), [expand_document(doc) for doc in documents] if documents else None
+
+    def record(self, key: str, state: SessionState, query: str, follow_up: bool, documents: Optional[List[Dict]]):
+        """
+        Enregistre le tour ; documents None : documents réutilisés, inchangés
+        """
+        state.record(query, follow_up, documents, self.max_turns, self.max_documents)
+        self.store.put(key, state)
+        kind = "new_topic" if not follow_up else ("follow_up_search" if documents is not None else "follow_up_reused")
+        get_metrics().inc("chat_session_turns_total", kind=kind)
+
+
+# Instance globale des sessions
+conversation_manager = None
+conversation_manager_lock = threading.Lock()
+
+
+def get_conversation_manager() -> ConversationManager:
+    """
+    Retourne le gestionnaire global, configuré par variables d'environnement
+    """
+    global conversation_manager
+    if conversation_manager is None:
+        with conversation_manager_lock:
+            if conversation_manager is None:
+                ttl_seconds = float(os.getenv("SESSION_TTL", 1800))
+                max_sessions = int(os.getenv("SESSION_MAX_SESSIONS", 10000))
+                backend = os.getenv("SESSION_BACKEND", "memory").lower()
+                if backend == "file":
+                    store = FileSessionStore(
+                        os.getenv("SESSION_DIR", "./data/sessions"),
+                        ttl_seconds=ttl_seconds, max_sessions=max_sessions
+                    )
+                elif backend == "memory":
+                    store = MemorySessionStore(
+                        ttl_seconds=ttl_seconds, max_sessions=max_sessions,
+                        max_bytes=int(os.getenv("SESSION_MAX_BYTES", 64 * 1024 * 1024))
+                    )
+                else:
+                    raise ValueError(f"Backend de sessions inconnu: {backend} (memory ou file)")
+                conversation_manager = ConversationManager(
+                    store,
+                    max_turns=int(os.getenv("SESSION_MAX_TURNS", 4)),
+                    max_documents=int(os.getenv("SESSION_MAX_DOCUMENTS", 5)),
+                    follow_up_terms=int(os.getenv("SESSION_FOLLOW_UP_TERMS", 1))
+                )
+                register_metrics()
+    return conversation_manager
+
+
+def register_metrics():
+    """
+    Jauges des sessions, lues à chaque export /metrics
+    """
+    metrics = get_metrics()
+    for name, key, help_text in (
+        ("chat_sessions", "sessions", "Sessions de conversation gardées"),
+        ("chat_sessions_bytes", "bytes", "Mémoire estimée des sessions (octets)"),
+    ):
+        metrics.register_callback(
+            name, "gauge", help_text,
+            lambda key=key: conversation_manager.store.stats().get(key) if conversation_manager is not None else None
+        )
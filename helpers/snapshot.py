@@ -0,0 +1,688 @@
+"""
+Snapshot en lecture seule de la collection, partagé entre plusieurs workers
+
+Un seul processus écrivain (ingestion) exporte la collection ChromaDB dans un
+fichier de version puis le publie atomiquement (renommage du fichier, puis
+remplacement du pointeur CURRENT). Les workers de l'API projettent le fichier
+en mémoire (mmap) sans copie : les pages sont partagées par le cache du
+système, un worker supplémentaire ne coûte donc que sa mémoire propre (modèle...).
+Démarrer depuis un snapshot évite aussi d'ouvrir ChromaDB (index HNSW et
+métadonnées SQLite) : c'est le chemin de démarrage rapide de l'API.
+
+Format (un seul fichier, versionné) :
+  - en-tête : MAGIC, position et taille du manifeste JSON (en fin de fichier)
+  - blocs alignés sur 64 octets, décrits par le manifeste (position, type, forme) :
+      embeddings        matrice (n, d) float32 ou float16
+      norms             normes au carré (float32)
+      strings / string_offsets   table de chaînes : id, question, réponse,
+                                 document (vide s'il se déduit de la question
+                                 et de la réponse) et formulations regroupées
+                                 (alternate_questions) de chaque ligne
+      question_keys / question_rows, id_keys / id_rows   empreintes triées
+                                 (questions et formulations regroupées)
+      lexical_*         index BM25 figé (format CSR), sans reconstruction
+  - manifeste : version, nombre de documents, dimension, type des vecteurs,
+    CRC32 des blocs
+
+Le checksum est contrôlé une fois, en relisant le fichier écrit avant sa
+publication (et à l'import) : les workers ne relisent pas tout le fichier à
+chaque chargement, sauf avec SNAPSHOT_VERIFY=true.
+"""
+
+import os
+import json
+import mmap
+import shutil
+import struct
+import threading
+import time
+import uuid
+import zlib
+import hashlib
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from helpers.lexical_index import LexicalIndex, MappedLexicalIndex
+from helpers.question_index import normalize_question
+from helpers.vector_engine import l2_top_k, l2_top_k_chunked, squared_norms
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_SUFFIX = ".snap"
+
+MAGIC = b"RAGSNAP\x01"
+FORMAT_VERSION = 2
+# Format 1 : sans les formulations regroupées
+SUPPORTED_FORMATS = (1, 2)
+PREFIX = struct.Struct("<8sQQ")
+ALIGNMENT = 64
+DTYPES = ("float32", "float16")
+
+# Champs de la table de chaînes, dans l'ordre, pour chaque ligne
+FIELDS = ("id", "question", "answer", "document", "alternate_questions")
+# Champs des enregistrements retournés par la recherche
+RECORD_FIELDS = FIELDS[:4]
+LEXICAL_ARRAYS = ("term_keys", "term_offsets", "slots", "frequencies", "lengths")
+
+COPY_SIZE = 16 * 1024 * 1024
+
+
+def snapshot_directory() -> str:
+    """
+    Dossier des snapshots (SNAPSHOT_DIR)
+    """
+    return os.getenv("SNAPSHOT_DIR", "./data/snapshots")
+
+
+def snapshot_source() -> str:
+    """
+    Snapshot servi par l'API : fichier SNAPSHOT_FILE s'il est défini, sinon
+    la version pointée par CURRENT dans SNAPSHOT_DIR
+    """
+    return os.getenv("SNAPSHOT_FILE") or snapshot_directory()
+
+
+def snapshot_file(directory: str, version: str) -> str:
+    return os.path.join(directory, version + SNAPSHOT_SUFFIX)
+
+
+def key_hash(text: str) -> int:
+    """
+    Empreinte 64 bits d'une clé (question normalisée ou identifiant)
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def default_document(question: str, answer: str) -> str:
+    return f"Question: {question}\nReponse: {answer}"
+
+
+def _sorted_keys(keys, rows=None) -> tuple:
+    """
+    Empreintes triées et ligne de chacune (rows, ou la position de l'empreinte)
+    """
+    keys = np.frombuffer(keys, dtype=np.uint64) if len(keys) else np.zeros(0, dtype=np.uint64)
+    # Tri stable : à empreinte égale, la première ligne est trouvée en premier
+    order = np.argsort(keys, kind="stable").astype(np.int64)
+    if rows is None:
+        return keys[order], order
+    rows = np.frombuffer(rows, dtype=np.int64) if len(rows) else np.zeros(0, dtype=np.int64)
+    return keys[order], rows[order]
+
+
+def _fsync_directory(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SnapshotWriter:
+    """
+    Écriture d'une nouvelle version, visible des workers seulement après publish()
+    (ou exportée vers un fichier quelconque avec write())
+    """
+
+    def __init__(self, directory: str, count: int, keep: int = 3, dtype: str = "float32"):
+        """
+        Args:
+            directory: Dossier des snapshots (et des fichiers de travail)
+            count: Nombre de documents à écrire
+            keep: Nombre de versions conservées après publication
+            dtype: Type des vecteurs dans le fichier : "float32" ou "float16" (deux fois plus petit)
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Type de vecteurs inconnu: {dtype} (attendu: {', '.join(DTYPES)})")
+        self.directory = directory
+        self.count = count
+        self.keep = keep
+        self.dtype = dtype
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(self.path)
+
+        self.rows = 0
+        self.embeddings = None
+        self.string_offsets = array("q", [0])
+        self.question_keys = array("Q")
+        self.question_rows = array("q")
+        self.id_keys = array("Q")
+        self.lexical_index = LexicalIndex()
+        self.strings = open(os.path.join(self.path, "strings.bin"), "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        return False
+
+    def add(self, ids: List[str], embeddings, metadatas: List[Dict], documents: Optional[List[str]] = None):
+        """
+        Ajoute un lot de documents (dans l'ordre de la collection)
+        """
+        if not ids:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.embeddings is None:
+            self.embeddings = np.lib.format.open_memmap(
+                os.path.join(self.path, "embeddings.npy"), mode="w+",
+                dtype=np.float32, shape=(self.count, embeddings.shape[1])
+            )
+        if self.rows + len(ids) > self.count:
+            raise ValueError(f"Plus de {self.count} documents reçus pour le snapshot")
+
+        self.embeddings[self.rows:self.rows + len(ids)] = embeddings
+        for i, doc_id in enumerate(ids):
+            question = metadatas[i]["question"]
+            answer = metadatas[i]["answer"]
+            alternates = metadatas[i].get("alternate_questions", "")
+            document = documents[i] if documents else ""
+            if document == default_document(question, answer):
+                document = ""
+            for value in (doc_id, question, answer, document, alternates):
+                encoded = value.encode("utf-8")
+                self.strings.write(encoded)
+                self.string_offsets.append(self.string_offsets[-1] + len(encoded))
+            # Correspondance exacte : la question et ses formulations regroupées
+            for text in [question] + alternates.splitlines():
+                self.question_keys.append(key_hash(normalize_question(text)))
+                self.question_rows.append(self.rows + i)
+            self.id_keys.append(key_hash(doc_id))
+        self.lexical_index.add_many(ids, metadatas)
+        self.rows += len(ids)
+
+    def write(self, target: str, version: Optional[str] = None) -> Dict:
+        """
+        Termine l'écriture dans le fichier target (remplacé atomiquement) ; retourne le manifeste
+        Le fichier écrit est relu et son checksum contrôlé avant de remplacer target
+        """
+        if self.rows != self.count:
+            raise ValueError(f"Snapshot incomplet: {self.rows}/{self.count} documents")
+
+        self.strings.close()
+        temporary = f"{target}.tmp-{uuid.uuid4().hex}"
+        try:
+            manifest = self._pack(temporary, version or f"export-{time.strftime('%Y%m%d-%H%M%S')}")
+            verify_file(temporary)
+            os.replace(temporary, target)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        finally:
+            self.abort()
+        return manifest
+
+    def publish(self) -> str:
+        """
+        Termine l'écriture et publie la version atomiquement ; retourne son nom
+        """
+        version = f"v{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.write(snapshot_file(self.directory, version), version)
+
+        # Bascule atomique du pointeur de version
+        pointer = os.path.join(self.directory, f".{CURRENT_FILE}-{uuid.uuid4().hex}")
+        with open(pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, os.path.join(self.directory, CURRENT_FILE))
+        _fsync_directory(self.directory)
+
+        self._remove_old_versions(version)
+        return version
+
+    def abort(self):
+        if not self.strings.closed:
+            self.strings.close()
+        self.embeddings = None
+        self.lexical_index = None
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _pack(self, target: str, version: str) -> Dict:
+        if self.embeddings is None:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        else:
+            self.embeddings.flush()
+            embeddings = self.embeddings
+
+        strings_size = os.path.getsize(os.path.join(self.path, "strings.bin"))
+        strings = (
+            np.memmap(os.path.join(self.path, "strings.bin"), dtype=np.uint8, mode="r")
+            if strings_size else np.zeros(0, dtype=np.uint8)
+        )
+        question_keys, question_rows = _sorted_keys(self.question_keys, self.question_rows)
+        id_keys, id_rows = _sorted_keys(self.id_keys)
+
+        with open(target, "wb") as f:
+            f.write(b"\0" * ALIGNMENT)
+            self._crc = 0
+            self._blocks = {}
+            # Normes calculées sur les vecteurs tels qu'ils sont stockés (arrondis en float16)
+            norms = self._write_block(f, "embeddings", embeddings, self.dtype, with_norms=True)
+            self._write_block(f, "norms", norms)
+            self._write_block(f, "strings", strings)
+            self._write_block(f, "string_offsets", np.frombuffer(self.string_offsets, dtype=np.int64))
+            self._write_block(f, "question_keys", question_keys)
+            self._write_block(f, "question_rows", question_rows)
+            self._write_block(f, "id_keys", id_keys)
+            self._write_block(f, "id_rows", id_rows)
+            for name, values in self.lexical_index.export_arrays().items():
+                self._write_block(f, f"lexical_{name}", values)
+
+            manifest = {
+                "format": FORMAT_VERSION,
+                "version": version,
+                "documents": self.rows,
+                "dimension": int(embeddings.shape[1]) if self.rows else 0,
+                "dtype": self.dtype,
+                "fields": list(FIELDS),
+                "created_at": time.time(),
+                "checksum": self._crc,
+                "blocks": self._blocks
+            }
+            header = json.dumps(manifest).encode("utf-8")
+            header_offset = f.tell()
+            f.write(header)
+            f.seek(0)
+            f.write(PREFIX.pack(MAGIC, header_offset, len(header)))
+            f.flush()
+            os.fsync(f.fileno())
+        return manifest
+
+    def _write_block(self, f, name: str, values: np.ndarray, dtype: Optional[str] = None, with_norms: bool = False):
+        padding = -f.tell() % ALIGNMENT
+        if padding:
+            f.write(b"\0" * padding)
+            self._crc = zlib.crc32(b"\0" * padding, self._crc)
+        dtype = np.dtype(dtype or values.dtype)
+        self._blocks[name] = {"offset": f.tell(), "dtype": dtype.str, "shape": list(values.shape)}
+
+        norms = np.zeros(len(values), dtype=np.float32) if with_norms else None
+        row_bytes = max(1, values[:1].nbytes)
+        step = max(1, COPY_SIZE // row_bytes)
+        for start in range(0, len(values), step):
+            chunk = np.ascontiguousarray(values[start:start + step], dtype=dtype)
+            if with_norms:
+                norms[start:start + len(chunk)] = squared_norms(chunk.astype(np.float32))
+            f.write(chunk.data)
+            self._crc = zlib.crc32(chunk.data, self._crc)
+        return norms
+
+    def _remove_old_versions(self, current: str):
+        # Les workers qui projettent encore une ancienne version gardent
+        # l'accès à son fichier supprimé jusqu'à leur rechargement
+        versions = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.startswith("v")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in versions[:-self.keep] if self.keep > 0 else []:
+            if entry.name == current + SNAPSHOT_SUFFIX:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+
+
+class IndexSnapshot:
+    """
+    Fichier de snapshot projeté en mémoire : recherche exhaustive (distance L2 au carré,
+    comme l'espace par défaut de ChromaDB) et accès aux enregistrements
+    """
+
+    def __init__(self, path: str, verify: bool = False):
+        """
+        Args:
+            path: Fichier de snapshot
+            verify: Contrôler le CRC32 des blocs (lit tout le fichier ; déjà fait à la publication)
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < PREFIX.size:
+            raise ValueError(f"Fichier de snapshot invalide: {path}")
+        magic, header_offset, header_length = PREFIX.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Fichier de snapshot invalide: {path}")
+        self.header_offset = header_offset
+        self.manifest = json.loads(self.buffer[header_offset:header_offset + header_length])
+        if self.manifest["format"] not in SUPPORTED_FORMATS:
+            raise ValueError(f"Format de snapshot non supporté: {self.manifest['format']}")
+        if verify:
+            self.verify()
+        self.fields = tuple(self.manifest.get("fields", RECORD_FIELDS))
+
+        self.version = self.manifest["version"]
+        self.count = self.manifest["documents"]
+        self.dtype = self.manifest["dtype"]
+
+        self.embeddings = self._block("embeddings")
+        self.norms = self._block("norms")
+        self.string_offsets = self._block("string_offsets")
+        self.strings_offset = self.manifest["blocks"]["strings"]["offset"]
+        self.question_keys = self._block("question_keys")
+        self.question_rows = self._block("question_rows")
+        self.id_keys = self._block("id_keys")
+        self.id_rows = self._block("id_rows")
+        self.lexical_index = MappedLexicalIndex(
+            {name: self._block(f"lexical_{name}") for name in LEXICAL_ARRAYS},
+            id_of=self.record_id
+        )
+
+    def _block(self, name: str) -> np.ndarray:
+        # Vue sur les pages du fichier, sans copie
+        spec = self.manifest["blocks"][name]
+        count = int(np.prod(spec["shape"]))
+        return np.frombuffer(
+            self.buffer, dtype=np.dtype(spec["dtype"]), count=count, offset=spec["offset"]
+        ).reshape(spec["shape"])
+
+    def verify(self):
+        """
+        Contrôle le CRC32 des blocs ; ValueError si le fichier est corrompu
+        """
+        crc = 0
+        view = memoryview(self.buffer)
+        for start in range(ALIGNMENT, self.header_offset, COPY_SIZE):
+            crc = zlib.crc32(view[start:min(start + COPY_SIZE, self.header_offset)], crc)
+        view.release()
+        if crc != self.manifest["checksum"]:
+            raise ValueError(f"Snapshot corrompu (checksum): {self.path}")
+
+    def close(self):
+        """
+        Libère la projection (aucune vue sur ses blocs ne doit rester utilisée)
+        """
+        self.embeddings = self.norms = self.string_offsets = None
+        self.question_keys = self.question_rows = self.id_keys = self.id_rows = None
+        self.lexical_index = None
+        self.buffer.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def nbytes(self) -> int:
+        """
+        Taille du fichier (octets)
+        """
+        return len(self.buffer)
+
+    def _string(self, index: int) -> str:
+        start = self.strings_offset + int(self.string_offsets[index])
+        end = self.strings_offset + int(self.string_offsets[index + 1])
+        return self.buffer[start:end].decode("utf-8")
+
+    def record_id(self, row: int) -> str:
+        return self._string(len(self.fields) * row)
+
+    def record(self, row: int) -> Dict:
+        base = len(self.fields) * row
+        record = {field: self._string(base + i) for i, field in enumerate(RECORD_FIELDS)}
+        if not record["document"]:
+            record["document"] = default_document(record["question"], record["answer"])
+        return record
+
+    def alternate_questions(self, row: int) -> str:
+        """
+        Formulations regroupées sous le document (une par ligne, vide sans regroupement)
+        """
+        if "alternate_questions" not in self.fields:
+            return ""
+        return self._string(len(self.fields) * row + self.fields.index("alternate_questions"))
+
+    def iter_records(self) -> Iterator[Dict]:
+        for row in range(self.count):
+            yield self.record(row)
+
+    def _find(self, keys, rows, text: str) -> Iterator[int]:
+        key = np.uint64(key_hash(text))
+        position = int(np.searchsorted(keys, key))
+        while position < len(keys) and keys[position] == key:
+            yield int(rows[position])
+            position += 1
+
+    def lookup_question(self, query: str) -> Optional[Dict]:
+        """
+        Document dont la question normalisée est identique à la requête (distance 0)
+        """
+        normalized = normalize_question(query)
+        if not normalized:
+            return None
+        for row in self._find(self.question_keys, self.question_rows, normalized):
+            record = self.record(row)
+            # Vérification : deux questions peuvent partager une empreinte
+            questions = [record["question"]] + self.alternate_questions(row).splitlines()
+            if any(normalize_question(question) == normalized for question in questions):
+                return {**record, "distance": 0.0}
+        return None
+
+    def get(self, ids: List[str]) -> Dict[str, Dict]:
+        """
+        Identifiant -> enregistrement, pour les identifiants présents
+        """
+        found = {}
+        for doc_id in ids:
+            for row in self._find(self.id_keys, self.id_rows, doc_id):
+                if self.record_id(row) == doc_id:
+                    found[doc_id] = self.record(row)
+                    break
+        return found
+
+    def search(self, query_embeddings: List[List[float]], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Les n_results plus proches voisins de chaque embedding, format de search_by_embeddings
+        """
+        k = min(n_results, self.count)
+        if k <= 0:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if self.embeddings.dtype == np.float32:
+            rows, distances = l2_top_k(self.embeddings, self.norms, queries, k)
+        else:
+            # Vecteurs float16 : convertis par tranches, jamais en entier
+            rows, distances = l2_top_k_chunked(self.embeddings, self.norms, queries, k)
+        return [
+            [{**self.record(row), "distance": float(distance)} for row, distance in zip(query_rows, query_distances)]
+            for query_rows, query_distances in zip(rows, distances)
+        ]
+
+
+class SnapshotReader:
+    """
+    Version courante du snapshot, rechargée quand l'écrivain en publie une nouvelle
+    """
+
+    def __init__(
+        self,
+        path: str,
+        refresh_seconds: float = 5.0,
+        on_load: Optional[Callable[[IndexSnapshot], None]] = None,
+        verify: bool = False
+    ):
+        """
+        Args:
+            path: Dossier des snapshots (version pointée par CURRENT) ou fichier de snapshot
+            refresh_seconds: Intervalle minimal entre deux vérifications de CURRENT (ou du fichier)
+            on_load: Appelé avec chaque nouvelle version chargée (avant qu'elle serve)
+            verify: Contrôler le checksum de chaque version chargée (déjà contrôlé à la publication)
+        """
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.on_load = on_load
+        self.verify = verify
+        self.snapshot: Optional[IndexSnapshot] = None
+        self.reloads = 0
+        self._pointer_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[IndexSnapshot]:
+        """
+        Version à utiliser pour la requête (vérifie au plus toutes les refresh_seconds)
+        """
+        if time.monotonic() >= self._next_check:
+            self.refresh()
+        return self.snapshot
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Charge la version pointée par CURRENT si elle a changé ; retourne True si rechargée
+        Un seul thread recharge, les autres continuent sur la version précédente
+        """
+        if not self._lock.acquire(blocking=self.snapshot is None):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.refresh_seconds
+            single_file = os.path.isfile(self.path)
+            pointer = self.path if single_file else os.path.join(self.path, CURRENT_FILE)
+            try:
+                mtime = os.stat(pointer).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self._pointer_mtime and not force:
+                return False
+
+            if single_file:
+                path = self.path
+            else:
+                with open(pointer, "r", encoding="utf-8") as f:
+                    version = f.read().strip()
+                if self.snapshot is not None and self.snapshot.version == version and not force:
+                    self._pointer_mtime = mtime
+                    return False
+                path = snapshot_file(self.path, version)
+            self._pointer_mtime = mtime
+
+            snapshot = IndexSnapshot(path, verify=self.verify)
+            if self.on_load is not None:
+                self.on_load(snapshot)
+            self.snapshot = snapshot
+            self.reloads += 1
+            return True
+        finally:
+            self._lock.release()
+
+    def stats(self) -> Optional[Dict]:
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        return {
+            "version": snapshot.version,
+            "file": snapshot.path,
+            "documents": len(snapshot),
+            "dtype": snapshot.dtype,
+            "bytes": snapshot.nbytes(),
+            "reloads": self.reloads
+        }
+
+
+def verify_file(path: str):
+    """
+    Relit un fichier de snapshot et contrôle son checksum ; ValueError s'il est corrompu
+    """
+    snapshot = IndexSnapshot(path, verify=True)
+    snapshot.close()
+
+
+def _export_collection(writer: SnapshotWriter, rag, page_size: int):
+    for offset in range(0, writer.count, page_size):
+        page = rag.collection.get(
+            include=["embeddings", "metadatas", "documents"],
+            limit=page_size,
+            offset=offset
+        )
+        writer.add(page['ids'], page['embeddings'], page['metadatas'], page['documents'])
+
+
+def publish_snapshot(rag, directory: Optional[str] = None, page_size: int = 10000) -> str:
+    """
+    Exporte la collection du système RAG (écrivain) et publie une nouvelle version
+    Type des vecteurs : SNAPSHOT_DTYPE (float32 par défaut)
+    """
+    directory = directory or snapshot_directory()
+    with SnapshotWriter(
+        directory,
+        rag.get_collection_count(),
+        keep=int(os.getenv("SNAPSHOT_KEEP", 3)),
+        dtype=os.getenv("SNAPSHOT_DTYPE", "float32")
+    ) as writer:
+        _export_collection(writer, rag, page_size)
+        return writer.publish()
+
+
+def export_snapshot(rag, path: str, dtype: str = "float32", page_size: int = 10000) -> Dict:
+    """
+    Exporte la collection dans un fichier de snapshot autonome ; retourne son manifeste
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with SnapshotWriter(directory, rag.get_collection_count(), dtype=dtype) as writer:
+        _export_collection(writer, rag, page_size)
+        return writer.write(path)
+
+
+def import_snapshot(rag, path: str, page_size: int = 10000) -> int:
+    """
+    Recharge un fichier de snapshot dans la collection ChromaDB (écrivain), sans
+    recalculer les embeddings ; retourne le nombre de documents importés
+    Les formulations regroupées (alternate_questions) sont restaurées avec leur
+    document, et les documents absents du snapshot sont supprimés : la collection
+    reproduit exactement le snapshot
+    """
+    from helpers.chromadb import content_hash
+
+    rag.require_writable()
+    snapshot = IndexSnapshot(path, verify=True)
+    imported = set()
+    for start in range(0, len(snapshot), page_size):
+        rows = range(start, min(start + page_size, len(snapshot)))
+        records = [snapshot.record(row) for row in rows]
+        imported.update(record["id"] for record in records)
+        metadatas = []
+        for row, record in zip(rows, records):
+            metadata = {
+                "question": record["question"],
+                "answer": record["answer"],
+                "index": row,
+                "content_hash": content_hash(record["question"], record["answer"])
+            }
+            alternates = snapshot.alternate_questions(row)
+            if alternates:
+                # Mêmes métadonnées que le regroupement à l'ingestion (helpers.dedup)
+                metadata["alternate_questions"] = alternates
+                metadata["group_size"] = len(alternates.splitlines()) + 1
+                metadata["content_hash"] = content_hash(record["question"], record["answer"] + "\n" + alternates)
+            metadatas.append(metadata)
+        ids = [record["id"] for record in records]
+        # upsert fusionne les métadonnées : un document dont la version actuelle porte
+        # d'autres clés (groupe dissous, members_hash) est supprimé puis réécrit
+        expected = dict(zip(ids, metadatas))
+        current = rag.collection.get(ids=ids, include=["metadatas"])
+        stale = [
+            doc_id for doc_id, metadata in zip(current["ids"], current["metadatas"])
+            if set(metadata or {}) - set(expected[doc_id])
+        ]
+        if stale:
+            rag.collection.delete(ids=stale)
+        rag.collection.upsert(
+            ids=ids,
+            embeddings=np.asarray(snapshot.embeddings[rows.start:rows.stop], dtype=np.float32).tolist(),
+            metadatas=metadatas,
+            documents=[record["document"] for record in records]
+        )
+    
+    # Documents ajoutés depuis le snapshot : supprimés après l'import (jamais de collection vide entre-temps)
+    to_delete = []
+    for offset in range(0, rag.get_collection_count(), page_size):
+        page = rag.collection.get(include=[], limit=page_size, offset=offset)
+        to_delete.extend(doc_id for doc_id in page["ids"] if doc_id not in imported)
+    for i in range(0, len(to_delete), page_size):
+        rag.collection.delete(ids=to_delete[i:i + page_size])
+    rag.rebuild_indexes()
+    rag.notify_change()
+    return len(snapshot)
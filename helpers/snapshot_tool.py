@@ -0,0 +1,65 @@
+"""
+Export et import de la collection au format snapshot (un seul fichier)
+
+Le fichier exporté sert au démarrage rapide de l'API en lecture seule
+(SNAPSHOT_SERVING_ENABLED=true, SNAPSHOT_FILE=chemin), sans ouvrir ChromaDB ;
+l'import recharge un snapshot dans la collection ChromaDB, sans recalculer
+les embeddings, et supprime les documents absents du snapshot (restauration
+d'un écrivain).
+
+Usage:
+    python -m helpers.snapshot_tool export data/snapshots/faq.snap
+    python -m helpers.snapshot_tool export data/snapshots/faq.snap --dtype float16
+    python -m helpers.snapshot_tool import data/snapshots/faq.snap
+    python -m helpers.snapshot_tool info data/snapshots/faq.snap     # manifeste et checksum
+"""
+
+import sys
+import os
+import argparse
+import time
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.snapshot import DTYPES, IndexSnapshot, export_snapshot, import_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import de la collection au format snapshot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Écrire la collection dans un fichier de snapshot")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--dtype", default="float32", choices=DTYPES,
+                               help="Type des vecteurs (float16 : fichier deux fois plus petit)")
+    import_parser = subparsers.add_parser("import", help="Recharger un snapshot dans la collection ChromaDB")
+    import_parser.add_argument("path")
+    info_parser = subparsers.add_parser("info", help="Afficher le manifeste et vérifier le checksum")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        snapshot = IndexSnapshot(args.path, verify=True)
+        print(f"📦 {args.path}: version {snapshot.version}, {len(snapshot)} documents, "
+              f"dimension {snapshot.manifest['dimension']}, {snapshot.dtype}, "
+              f"{snapshot.nbytes() / 1e6:.1f} Mo")
+        print("✅ Checksum valide")
+        return
+
+    from helpers.chromadb import get_rag_system
+
+    rag = get_rag_system()
+    start = time.perf_counter()
+    if args.command == "export":
+        manifest = export_snapshot(rag, args.path, dtype=args.dtype)
+        print(f"📦 Snapshot exporté: {args.path} ({manifest['documents']} documents, {manifest['dtype']}, "
+              f"{os.path.getsize(args.path) / 1e6:.1f} Mo) en {time.perf_counter() - start:.2f}s")
+    else:
+        count = import_snapshot(rag, args.path)
+        print(f"✅ {count} documents importés en {time.perf_counter() - start:.2f}s")
+        print(f"📊 Documents dans la base: {rag.get_collection_count()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Préchauffage au démarrage de l'API
+
+Construit le système RAG et le générateur LLM, puis exécute un embedding
+et une requête factices pour charger le modèle ONNX et l'index HNSW avant
+la première vraie requête. La durée de chaque phase est conservée pour /stats.
+"""
+
+import time
+
+from helpers.chromadb import get_rag_system
+from helpers.concurrency import run_blocking
+from llm import get_llm_generator
+
+# État du démarrage (lu par /ready et /stats)
+startup_state = {
+    "ready": False,
+    "error": None,
+    "phases": {},
+    "total_seconds": None
+}
+
+
+async def timed_phase(name: str, func, *args):
+    """
+    Exécute une phase bloquante dans l'exécuteur et enregistre sa durée
+    """
+    start = time.perf_counter()
+    result = await run_blocking(func, *args)
+    duration = round(time.perf_counter() - start, 4)
+    startup_state["phases"][name] = duration
+    print(f"⏱️  Démarrage - {name}: {duration:.3f}s")
+    return result
+
+
+async def warm_up():
+    """
+    Préchauffe les singletons et le modèle ; marque l'application prête à la fin
+    """
+    start = time.perf_counter()
+    try:
+        rag = await timed_phase("rag_system", get_rag_system)
+        await timed_phase("llm_generator", get_llm_generator)
+        query_embedding = await timed_phase("embedding_warmup", rag.embed_query, "warm-up")
+        await timed_phase("vector_query_warmup", rag.search_by_embedding, query_embedding, 1)
+        if rag.reranker is not None:
+            await timed_phase("rerank_warmup", rag.reranker.scorer.load)
+        startup_state["ready"] = True
+        print("✅ Application prête")
+    except Exception as e:
+        startup_state["error"] = str(e)
+        print(f"❌ Erreur au démarrage: {e}")
+    startup_state["total_seconds"] = round(time.perf_counter() - start, 4)
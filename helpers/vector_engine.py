@@ -0,0 +1,265 @@
+"""
+Moteur de recherche vectorielle en mémoire (NumPy) pour les petites et moyennes collections
+
+Tous les vecteurs de la collection sont chargés dans une matrice float32
+contiguë ; les requêtes (y compris en lot) sont traitées par produits
+matriciels, sans passer par les couches client, SQLite et HNSW de ChromaDB :
+  - numpy : recherche exhaustive, exacte
+  - ivf   : partitionnement en listes (k-means), seules les n_probe listes les
+            plus proches de la requête sont parcourues (approché, pour les
+            collections plus grandes)
+Le moteur est choisi d'après la taille de la collection (VECTOR_ENGINE=auto).
+Distance : L2 au carré, comme l'espace par défaut de ChromaDB.
+"""
+
+import math
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ENGINES = ("auto", "chroma", "numpy", "ivf")
+
+
+def squared_norms(vectors: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", vectors, vectors)
+
+
+def l2_top_k(vectors: np.ndarray, norms: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Les k plus proches voisins exacts de chaque requête
+
+    Returns:
+        Positions (b, k) et distances L2 au carré (b, k), par distance croissante
+    """
+    k = min(k, len(vectors))
+    # |q - x|² = |q|² + |x|² - 2 q.x, les normes des vecteurs étant précalculées
+    distances = queries @ vectors.T
+    distances *= -2
+    distances += norms[None, :]
+    distances += squared_norms(queries)[:, None]
+    np.maximum(distances, 0, out=distances)
+
+    if k < len(vectors):
+        rows = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        rows = np.broadcast_to(np.arange(len(vectors)), (len(queries), len(vectors)))
+    top = np.take_along_axis(distances, rows, axis=1)
+    order = np.argsort(top, axis=1, kind="stable")
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+def l2_top_k_chunked(
+    vectors: np.ndarray, norms: np.ndarray, queries: np.ndarray, k: int, chunk_size: int = 16384
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    l2_top_k sur des vecteurs stockés en float16 : chaque tranche est convertie
+    en float32 le temps du calcul, la matrice complète n'est jamais copiée
+    """
+    candidate_rows, candidate_distances = [], []
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        rows, distances = l2_top_k(chunk, norms[start:start + chunk_size], queries, k)
+        candidate_rows.append(rows + start)
+        candidate_distances.append(distances)
+    rows = np.concatenate(candidate_rows, axis=1)
+    distances = np.concatenate(candidate_distances, axis=1)
+    order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+    norms = squared_norms(centroids)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        rows, _ = l2_top_k(centroids, norms, vectors[start:start + chunk_size], 1)
+        assignments[start:start + chunk_size] = rows[:, 0]
+    return assignments
+
+
+def train_ivf(vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Centroïdes des listes IVF (k-means sur un échantillon de la collection)
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * 64)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=n_lists)
+        filled = counts > 0
+        # Une liste vide garde son centroïde
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class VectorEngine:
+    """
+    Vecteurs et documents de la collection en mémoire, recherche exacte ou IVF
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        records: List[Dict],
+        kind: str = "numpy",
+        n_lists: Optional[int] = None,
+        n_probe: int = 8
+    ):
+        """
+        Args:
+            ids: Identifiants des documents
+            embeddings: Matrice (n, d) des embeddings
+            records: Question, réponse et document de chaque ligne
+            kind: "numpy" (exact) ou "ivf" (approché)
+            n_lists: Nombre de listes IVF (défaut: 4 x racine du nombre de documents)
+            n_probe: Listes parcourues par requête en mode IVF
+        """
+        self.kind = kind
+        self.ids = ids
+        self.records = records
+        self.n_probe = n_probe
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        if kind == "ivf" and len(vectors):
+            self.n_lists = min(n_lists or int(4 * math.sqrt(len(vectors))), len(vectors))
+            self.centroids = train_ivf(vectors, self.n_lists)
+            assignments = _nearest_centroids(vectors, self.centroids)
+            # Vecteurs regroupés par liste : chaque liste est une tranche contiguë
+            self.order = np.argsort(assignments, kind="stable")
+            self.list_offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assignments, minlength=self.n_lists), out=self.list_offsets[1:])
+            vectors = vectors[self.order]
+            self.centroid_norms = squared_norms(self.centroids)
+        else:
+            self.kind = "numpy"
+            self.n_lists = 0
+            self.order = None
+
+        self.vectors = vectors
+        self.norms = squared_norms(vectors) if len(vectors) else np.zeros(0, dtype=np.float32)
+        # Identifiants et textes (dicts et chaînes Python), mesurés une fois : ils ne changent pas
+        self.records_bytes = sys.getsizeof(ids) + sys.getsizeof(records) + sum(
+            sys.getsizeof(doc_id) + sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record.values())
+            for doc_id, record in zip(ids, records)
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def memory_bytes(self) -> int:
+        """
+        Mémoire des tableaux NumPy (vecteurs, normes, listes IVF), des identifiants et des textes
+        """
+        total = self.vectors.nbytes + self.norms.nbytes + self.records_bytes
+        if self.order is not None:
+            total += self.order.nbytes + self.list_offsets.nbytes + self.centroids.nbytes
+        return total
+
+    def search(self, query_embeddings: List[List[float]], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Les n_results plus proches voisins de chaque embedding, format de search_by_embeddings
+        """
+        if len(self) == 0 or n_results <= 0:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if self.kind == "ivf":
+            neighbours = self._search_ivf(queries, n_results)
+        else:
+            rows, distances = l2_top_k(self.vectors, self.norms, queries, n_results)
+            neighbours = list(zip(rows, distances))
+
+        return [
+            [
+                {"id": self.ids[row], **self.records[row], "distance": float(distance)}
+                for row, distance in zip(rows, distances)
+            ]
+            for rows, distances in neighbours
+        ]
+
+    def _search_ivf(self, queries: np.ndarray, n_results: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Tout le lot en une passe sur les listes parcourues : chaque liste est
+        comparée en un produit matriciel à toutes les requêtes qui la sondent
+        (tranche contiguë, sans copie des vecteurs)
+        """
+        probes, _ = l2_top_k(self.centroids, self.centroid_norms, queries, self.n_probe)
+        probed = np.zeros((len(queries), self.n_lists), dtype=bool)
+        np.put_along_axis(probed, probes, True, axis=1)
+
+        # Colonnes des listes parcourues par au moins une requête, hors liste sondée : distance infinie
+        lists = np.flatnonzero(probed.any(axis=0))
+        counts = self.list_offsets[lists + 1] - self.list_offsets[lists]
+        columns = np.cumsum(counts) - counts
+        if counts.sum() == 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        distances = np.full((len(queries), counts.sum()), np.inf, dtype=np.float32)
+        for probe, column, count in zip(lists, columns, counts):
+            rows = np.flatnonzero(probed[:, probe])
+            start = self.list_offsets[probe]
+            block = queries[rows] @ self.vectors[start:start + count].T
+            block *= -2
+            block += self.norms[start:start + count]
+            distances[rows, column:column + count] = block
+        distances += squared_norms(queries)[:, None]
+        np.maximum(distances, 0, out=distances)
+
+        k = min(n_results, distances.shape[1])
+        rows = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(distances, rows, axis=1)
+        order = np.argsort(top, axis=1, kind="stable")
+        rows, top = np.take_along_axis(rows, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+        positions = np.repeat(self.list_offsets[lists] - columns, counts) + np.arange(counts.sum())
+        # Moins de n_results candidats dans les listes d'une requête : les colonnes infinies sont écartées
+        found = np.isfinite(top)
+        return [
+            (self.order[positions[rows[i][found[i]]]], top[i][found[i]])
+            for i in range(len(queries))
+        ]
+
+    def stats(self) -> Dict:
+        return {
+            "engine": self.kind,
+            "documents": len(self),
+            "lists": self.n_lists,
+            "probes": self.n_probe if self.kind == "ivf" else None,
+            "bytes": self.memory_bytes()
+        }
+
+
+def select_engine(mode: str, count: int, numpy_max: int, ivf_max: int) -> str:
+    """
+    Moteur effectif : en mode "auto", recherche exacte en mémoire jusqu'à numpy_max
+    documents, IVF jusqu'à ivf_max, ChromaDB (HNSW) au-delà
+    """
+    if mode not in ENGINES:
+        raise ValueError(f"Moteur de recherche inconnu: {mode} (attendu: {', '.join(ENGINES)})")
+    if mode != "auto":
+        return mode
+    if count <= numpy_max:
+        return "numpy"
+    if count <= ivf_max:
+        return "ivf"
+    return "chroma"
+
+
+def engine_settings_from_env() -> Dict:
+    """
+    Réglages du moteur : VECTOR_ENGINE, VECTOR_ENGINE_NUMPY_MAX, VECTOR_ENGINE_IVF_MAX,
+    IVF_LISTS (0 = automatique) et IVF_PROBES
+    """
+    return {
+        "mode": os.getenv("VECTOR_ENGINE", "auto").lower(),
+        "numpy_max": int(os.getenv("VECTOR_ENGINE_NUMPY_MAX", 10000)),
+        "ivf_max": int(os.getenv("VECTOR_ENGINE_IVF_MAX", 50000)),
+        "n_lists": int(os.getenv("IVF_LISTS", 0)) or None,
+        "n_probe": int(os.getenv("IVF_PROBES", 8))
+    }
@@ -1,35 +1,84 @@
 import os
-from typing import List, Dict
-import google.generativeai as genai
+import time
+import asyncio
+import threading
+from typing import List, Dict, AsyncIterator, Optional
 from dotenv import load_dotenv
+from helpers.concurrency import run_blocking
+from helpers.metrics import get_metrics
+from helpers.llm_guard import LLMCallGuard, LLMOverloadedError
+from helpers.context_builder import context_builder_from_env, estimate_tokens, format_document
+from helpers.answer_store import answer_store_from_env
+from helpers.llm_backends import LLM_BACKENDS, model_from_env
 
 # Charger les variables d'environnement
 load_dotenv()
 
 
+class LLMStreamError(Exception):
+    """
+    Flux de réponse interrompu par une erreur après le premier morceau
+    (la réponse de secours ne peut plus remplacer ce qui a été envoyé)
+    """
+
+
+class FallbackResponse(str):
+    """
+    Réponse de secours (LLM non configuré, en erreur, file pleine ou délai dépassé) :
+    une chaîne comme une réponse du LLM, avec la raison du repli (reason)
+    """
+    
+    def __new__(cls, text: str, reason: str):
+        response = super().__new__(cls, text)
+        response.reason = reason
+        return response
+
+
 class LLMGenerator:
     """
     Générateur de réponses utilisant un LLM (Gemini par défaut)
     """
     
-    def __init__(self, use_gemini: bool = True):
+    def __init__(self, backend: Optional[str] = None):
         """
         Initialise le générateur LLM
         
         Args:
-            use_gemini: Si True, utilise Google Gemini, sinon mode simulation
+            backend: gemini, http (serveur local helpers.llm_standin), simulated ou none
+                (réponse de secours seulement) ; LLM_BACKEND par défaut (gemini)
         """
-        self.use_gemini = use_gemini
+        self.backend = (backend or os.getenv("LLM_BACKEND", "gemini")).lower()
+        if self.backend not in LLM_BACKENDS:
+            raise ValueError(f"Backend LLM inconnu: {self.backend} (attendu: {', '.join(LLM_BACKENDS)})")
+        # Faux avec none ou sans clé Gemini : réponse de secours
+        self.use_model = self.backend != "none"
+        # Regroupement des prompts identiques, concurrence bornée et délai maximal
+        self.guard = LLMCallGuard(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 16)),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", 100)),
+            timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", 20)),
+            coalescing=os.getenv("LLM_COALESCING_ENABLED", "true").lower() == "true"
+        )
+        # Filtrage des documents du contexte (distance, doublons, budget de tokens)
+        self.context_builder = context_builder_from_env()
+        # Réponses canoniques précalculées (helpers.precompute_answers), servies si le document est décisif
+        self.answer_store = answer_store_from_env()
         
-        if self.use_gemini:
+        if self.backend in ("http", "simulated"):
+            self.model = model_from_env(self.backend)
+            print(f"LLM {self.backend} initialisé ({getattr(self.model, 'url', 'simulation en processus')})")
+        elif self.backend == "gemini":
             api_key = os.getenv("GOOGLE_API_KEY")
             if api_key and api_key != "votre_cle_api_ici":
+                # Import différé (~1 s) : payé au préchauffage, pas au démarrage du processus
+                import google.generativeai as genai
+                
                 genai.configure(api_key=api_key)
                 self.model = genai.GenerativeModel('gemini-pro')
                 print("Gemini initialisé avec succès")
             else:
                 print("Clé API Gemini non configurée, passage en mode simulation")
-                self.use_gemini = False
+                self.use_model = False
     
     def generate_response(self, query: str, top_documents: List[Dict]) -> str:
         """
@@ -42,34 +91,254 @@ class LLMGenerator:
         Returns:
             Réponse générée par le LLM
         """
-        # Construire le contexte à partir des documents
-        context = self._build_context(top_documents)
+        # Premier document décisif : réponse FAQ sans appel au LLM
+        decisive_answer = self._decisive_answer(top_documents)
+        if decisive_answer is not None:
+            return decisive_answer
+        
+        # Construire le contexte et le prompt à partir des documents
+        prompt = self._build_prompt(query, top_documents)
+        
+        if self.use_model:
+            try:
+                with get_metrics().stage("llm"):
+                    response = self.model.generate_content(prompt)
+                return response.text
+            except Exception as e:
+                print(f"Erreur lors de la génération avec le LLM: {e}")
+                return self._fallback(query, top_documents, "error")
+        else:
+            return self._fallback(query, top_documents, "not_configured")
+    
+    async def generate_response_async(self, query: str, top_documents: List[Dict]) -> str:
+        """
+        Version asynchrone de generate_response
+        Utilise le client asynchrone natif de Gemini s'il existe,
+        sinon l'appel synchrone est exécuté dans l'exécuteur partagé
+        Les prompts identiques en cours partagent un appel ; si la file est
+        pleine, le délai dépassé ou l'appel en erreur, la réponse de secours
+        est retournée (FallbackResponse)
+        """
+        decisive_answer = await self._decisive_answer_async(top_documents)
+        if decisive_answer is not None:
+            return decisive_answer
         
-        # Créer le prompt
-        prompt = self._create_prompt(query, context)
+        prompt = self._build_prompt(query, top_documents)
         
-        if self.use_gemini:
+        if self.use_model:
             try:
-                response = self.model.generate_content(prompt)
+                with get_metrics().stage("llm"):
+                    response = await self.guard.call(prompt, lambda: self._call_model_async(prompt))
                 return response.text
+            except LLMOverloadedError as e:
+                print(f"File d'attente LLM pleine: {e}")
+                return self._fallback(query, top_documents, "overloaded")
+            except asyncio.TimeoutError:
+                print(f"Délai LLM dépassé ({self.guard.timeout_seconds}s)")
+                return self._fallback(query, top_documents, "timeout")
             except Exception as e:
-                print(f"Erreur lors de la génération avec Gemini: {e}")
-                return self._generate_fallback_response(query, top_documents)
+                print(f"Erreur lors de la génération avec le LLM: {e}")
+                return self._fallback(query, top_documents, "error")
         else:
-            return self._generate_fallback_response(query, top_documents)
+            return self._fallback(query, top_documents, "not_configured")
+    
+    async def generate_response_stream(self, query: str, top_documents: List[Dict]) -> AsyncIterator[str]:
+        """
+        Génère la réponse morceau par morceau avec le mode streaming de Gemini
+        Sans Gemini (ou en cas d'erreur, de file pleine ou de délai dépassé
+        avant le premier morceau), la réponse de secours est envoyée en un seul morceau ;
+        une erreur après le premier morceau lève LLMStreamError
+        Le flux du modèle est fermé dès que celui-ci s'arrête (fin, erreur, délai ou
+        client déconnecté) : la génération en amont ne continue pas pour rien
+        Chaque flux occupe une place de la limite de concurrence (pas de regroupement)
+        """
+        decisive_answer = await self._decisive_answer_async(top_documents)
+        if decisive_answer is not None:
+            yield decisive_answer
+            return
+        
+        prompt = self._build_prompt(query, top_documents)
+        
+        if not self.use_model:
+            yield self._fallback(query, top_documents, "not_configured")
+            return
+        
+        metrics = get_metrics()
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        timeout = self.guard.timeout_seconds
+        deadline = loop.time() + timeout if timeout else None
+        
+        try:
+            await self.guard.acquire(timeout)
+        except LLMOverloadedError as e:
+            print(f"File d'attente LLM pleine: {e}")
+            yield self._fallback(query, top_documents, "overloaded")
+            return
+        except asyncio.TimeoutError:
+            print(f"Délai LLM dépassé ({timeout}s)")
+            yield self._fallback(query, top_documents, "timeout")
+            return
+        
+        started = False
+        chunks = None
+        try:
+            # Le délai s'applique jusqu'au premier morceau
+            remaining = max(deadline - loop.time(), 0.0) if deadline is not None else None
+            chunks = await asyncio.wait_for(self._open_stream(prompt), remaining)
+            remaining = max(deadline - loop.time(), 0.0) if deadline is not None else None
+            first_chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+            started = True
+            metrics.record_stage("llm_first_token", time.perf_counter() - start)
+            yield first_chunk.text
+            async for chunk in chunks:
+                yield chunk.text
+        except StopAsyncIteration:
+            pass
+        except asyncio.TimeoutError:
+            print(f"Délai LLM dépassé ({timeout}s)")
+            self.guard.timeouts += 1
+            yield self._fallback(query, top_documents, "timeout")
+        except Exception as e:
+            print(f"Erreur lors du streaming avec le LLM: {e}")
+            if not started:
+                yield self._fallback(query, top_documents, "error")
+            else:
+                metrics.inc("llm_errors_total")
+                raise LLMStreamError(str(e)) from e
+        finally:
+            if chunks is not None:
+                await self._close_stream(chunks)
+            self.guard.release()
+            if metrics.enabled:
+                metrics.record_stage("llm", time.perf_counter() - start)
+    
+    async def generate_canonical_answer(self, query: str, top_documents: List[Dict]) -> str:
+        """
+        Réponse du LLM pour le précalcul hors ligne : ni raccourci décisif ni
+        réponse de secours, une erreur (file pleine, délai, API) est levée
+        """
+        if not self.use_model:
+            raise RuntimeError("LLM non configuré (GOOGLE_API_KEY)")
+        prompt = self._build_prompt(query, top_documents)
+        with get_metrics().stage("llm"):
+            response = await self.guard.call(prompt, lambda: self._call_model_async(prompt))
+        return response.text
+    
+    async def _call_model_async(self, prompt: str):
+        """
+        Appel LLM non streamé : client asynchrone natif, sinon exécuteur partagé
+        """
+        if hasattr(self.model, "generate_content_async"):
+            return await self.model.generate_content_async(prompt)
+        return await run_blocking(self.model.generate_content, prompt)
+    
+    async def _open_stream(self, prompt: str):
+        """
+        Ouvre un flux de réponse et retourne un itérateur asynchrone de morceaux
+        """
+        if hasattr(self.model, "generate_content_async"):
+            response = await self.model.generate_content_async(prompt, stream=True)
+            return response.__aiter__()
+        response = await run_blocking(self.model.generate_content, prompt, stream=True)
+        return self._iter_blocking_stream(iter(response))
+    
+    async def _iter_blocking_stream(self, chunks):
+        """
+        Parcourt un flux synchrone dans l'exécuteur partagé, morceau par morceau
+        """
+        try:
+            while True:
+                chunk = await run_blocking(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+    
+    @staticmethod
+    async def _close_stream(chunks):
+        """
+        Ferme le flux du modèle (itérateur asynchrone), sans masquer l'issue du flux
+        """
+        close = getattr(chunks, "aclose", None)
+        if close is None:
+            return
+        try:
+            await close()
+        except Exception as e:
+            print(f"Erreur à la fermeture du flux LLM: {e}")
+    
+    def _build_prompt(self, query: str, top_documents: List[Dict]) -> str:
+        """
+        Sélection des documents, contexte puis prompt, mesurés comme une seule étape
+        """
+        metrics = get_metrics()
+        with metrics.stage("prompt_build"):
+            documents, dropped = self.context_builder.select(top_documents)
+            context = self._build_context(documents)
+            prompt = self._create_prompt(query, context)
+        
+        for reason, count in dropped.items():
+            if count:
+                metrics.inc("llm_context_documents_dropped_total", count, reason=reason)
+        metrics.inc("llm_prompts_total")
+        metrics.inc("llm_prompt_tokens_total", estimate_tokens(prompt))
+        return prompt
+    
+    def _decisive_answer(self, top_documents: List[Dict]) -> Optional[str]:
+        """
+        Réponse du premier document s'il est décisif (CONTEXT_DECISIVE_DISTANCE), sinon None :
+        réponse canonique précalculée si elle est à jour, sinon réponse FAQ
+        """
+        document = self.context_builder.decisive_document(top_documents)
+        if document is None:
+            return None
+        precomputed = self.answer_store.lookup(document) if self.answer_store is not None else None
+        return self._skip_llm(document, precomputed)
+    
+    async def _decisive_answer_async(self, top_documents: List[Dict]) -> Optional[str]:
+        """
+        Version asynchrone de _decisive_answer : la lecture du store (SQLite)
+        est exécutée dans l'exécuteur partagé, hors de la boucle d'événements
+        """
+        document = self.context_builder.decisive_document(top_documents)
+        if document is None:
+            return None
+        precomputed = None
+        if self.answer_store is not None:
+            precomputed = await run_blocking(self.answer_store.lookup, document)
+        return self._skip_llm(document, precomputed)
+    
+    @staticmethod
+    def _skip_llm(document: Dict, precomputed: Optional[str]) -> str:
+        """
+        Réponse sans appel au LLM, comptée : précalculée si elle est à jour, sinon réponse FAQ
+        """
+        if precomputed is not None:
+            get_metrics().inc("llm_skipped_total", reason="precomputed")
+            return precomputed
+        get_metrics().inc("llm_skipped_total", reason="decisive")
+        return document["answer"]
+    
+    def _fallback(self, query: str, top_documents: List[Dict], reason: str) -> FallbackResponse:
+        """
+        Réponse de secours, comptée par raison (non configuré, erreur, file pleine, délai)
+        Le type FallbackResponse permet à l'appelant de la distinguer d'une réponse du LLM
+        """
+        metrics = get_metrics()
+        metrics.inc("llm_fallbacks_total", reason=reason)
+        if reason == "error":
+            metrics.inc("llm_errors_total")
+        return FallbackResponse(self._generate_fallback_response(query, top_documents), reason)
     
     def _build_context(self, top_documents: List[Dict]) -> str:
         """
         Construit le contexte à partir des documents récupérés
         """
-        context_parts = []
-        for i, doc in enumerate(top_documents, 1):
-            context_parts.append(f"Document {i}:")
-            context_parts.append(f"Question: {doc['question']}")
-            context_parts.append(f"Réponse: {doc['answer']}")
-            context_parts.append("")
-        
-        return "\n".join(context_parts)
+        return "\n".join(format_document(i, doc) for i, doc in enumerate(top_documents, 1))
     
     def _create_prompt(self, query: str, context: str) -> str:
         """
@@ -107,6 +376,7 @@ Réponse:"""
 
 # Instance globale du générateur
 llm_generator = None
+llm_generator_lock = threading.Lock()
 
 
 def get_llm_generator() -> LLMGenerator:
@@ -115,5 +385,47 @@ def get_llm_generator() -> LLMGenerator:
     """
     global llm_generator
     if llm_generator is None:
-        llm_generator = LLMGenerator()
-    return llm_generator
\ No newline at end of file
+        # Le préchauffage au démarrage construit l'instance depuis un thread
+        with llm_generator_lock:
+            if llm_generator is None:
+                llm_generator = LLMGenerator()
+                register_metrics()
+    return llm_generator
+
+
+async def get_llm_generator_async() -> LLMGenerator:
+    """
+    Instance globale depuis la boucle d'événements : construite ou attendue
+    dans l'exécuteur (import de google.generativeai hors de la boucle)
+    """
+    if llm_generator is not None:
+        return llm_generator
+    return await run_blocking(get_llm_generator)
+
+
+def register_metrics():
+    """
+    File d'attente et regroupement des appels LLM, lus à chaque export /metrics
+    """
+    metrics = get_metrics()
+    for name, kind, key, help_text in (
+        ("llm_queue_depth", "gauge", "queue_depth", "Appels LLM en attente d'une place"),
+        ("llm_running", "gauge", "running", "Appels LLM en cours"),
+        ("llm_calls_total", "counter", "calls", "Appels LLM effectivement envoyés"),
+        ("llm_coalesced_total", "counter", "coalesced", "Requêtes servies par un appel identique en cours"),
+        ("llm_coalescing_ratio", "gauge", "coalescing_ratio", "Part des requêtes regroupées"),
+        ("llm_timeouts_total", "counter", "timeouts", "Appels LLM ayant dépassé le délai"),
+        ("llm_rejected_total", "counter", "rejected", "Appels LLM refusés (file pleine)"),
+    ):
+        metrics.register_callback(
+            name, kind, help_text,
+            lambda key=key: llm_generator.guard.stats()[key] if llm_generator is not None else None
+        )
+    for name, key, help_text in (
+        ("answer_store_hits_total", "hits", "Réponses servies depuis le store précalculé"),
+        ("answer_store_stale_total", "stale", "Entrées précalculées périmées (Q/R source modifiée)"),
+    ):
+        metrics.register_callback(
+            name, "counter", help_text,
+            lambda key=key: getattr(getattr(llm_generator, "answer_store", None), key, None)
+        )
\ No newline at end of file
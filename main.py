@@ -1,32 +1,240 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional, Literal
 import uvicorn
-from helpers.chromadb import get_rag_system
-from llm import get_llm_generator
+import os
+import asyncio
+from helpers.chromadb import get_rag_system_async, with_exact_match
+from helpers.collection_registry import get_collection_registry
+from helpers.concurrency import run_blocking
+from llm import FallbackResponse, LLMStreamError, get_llm_generator_async
+from helpers.answer_cache import get_answer_cache
+from helpers.batcher import get_query_batcher
+from helpers.startup import startup_state, warm_up
+from helpers.metrics import MetricsMiddleware, get_metrics
+from helpers.sessions import get_conversation_manager
+from helpers.serialization import FastJSONResponse, dumps, json_response, select_fields
+
+# Répondre directement avec la FAQ quand la question correspond exactement
+EXACT_MATCH_SKIP_LLM = os.getenv("EXACT_MATCH_SKIP_LLM", "false").lower() == "true"
+
+# Regrouper les recherches concurrentes en lots (opt-in)
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "false").lower() == "true"
+
+# Préchauffer les singletons et le modèle au démarrage
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Démarrage : le préchauffage tourne en tâche de fond pour que /health
+    réponde immédiatement ; /ready indique quand il est terminé
+    """
+    if STARTUP_WARMUP:
+        app.state.warmup_task = asyncio.create_task(warm_up())
+    else:
+        startup_state["ready"] = True
+    yield
+
 
 # Créer l'application FastAPI
 app = FastAPI(
     title="Chatbot Intelligent E-commerce",
     description="API RAG pour un chatbot FAQ e-commerce",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Encodage orjson, sans jsonable_encoder pour les réponses déjà prêtes
+    default_response_class=FastJSONResponse
 )
 
+# Durée et nombre des requêtes par route, en-tête Server-Timing (STAGE_TIMING_HEADER)
+app.add_middleware(MetricsMiddleware)
+
+
+# Mode de recherche : vectorielle, lexicale (BM25) ou hybride (RRF) ; RETRIEVAL_MODE par défaut
+SearchMode = Optional[Literal["dense", "lexical", "hybrid"]]
+
+# Nom de collection ChromaDB (boutique, langue) ; absent : DEFAULT_COLLECTION
+COLLECTION_PATTERN = r"^[a-zA-Z0-9][a-zA-Z0-9._-]{1,61}[a-zA-Z0-9]$"
+
+# Identifiant de session de conversation, choisi par le client
+SESSION_ID_PATTERN = r"^[a-zA-Z0-9_-]{1,128}$"
+
+
+# Champs d'un document retournés par /search ; absent : tous
+DocumentField = Literal["id", "question", "answer", "document", "distance", "score", "rerank_score"]
+
 
 # Modèles Pydantic pour la validation des données
 class SearchQuery(BaseModel):
     query: str
     n_results: Optional[int] = 5
+    mode: SearchMode = None
+    collection: Optional[str] = Field(None, pattern=COLLECTION_PATTERN)
+    fields: Optional[List[DocumentField]] = None
+
+
+class BatchSearchQuery(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=256)
+    n_results: Optional[int] = 5
+    mode: SearchMode = None
+    collection: Optional[str] = Field(None, pattern=COLLECTION_PATTERN)
+    fields: Optional[List[DocumentField]] = None
 
 
 class ChatQuery(BaseModel):
     query: str
+    mode: SearchMode = None
+    collection: Optional[str] = Field(None, pattern=COLLECTION_PATTERN)
+    session_id: Optional[str] = Field(None, pattern=SESSION_ID_PATTERN)
+
+
+# Modèles des réponses : schéma OpenAPI uniquement, les endpoints retournent
+# directement une FastJSONResponse (pas de revalidation des dicts)
+class SearchDocument(BaseModel):
+    id: Optional[str] = None
+    question: Optional[str] = None
+    answer: Optional[str] = None
+    document: Optional[str] = None
+    distance: Optional[float] = None
+    score: Optional[float] = None
+    rerank_score: Optional[float] = None
+
+
+class SearchResponse(BaseModel):
+    query: str
+    mode: str
+    n_results: int
+    documents: List[SearchDocument]
+
+
+class BatchSearchResult(BaseModel):
+    query: str
+    n_results: int
+    documents: List[SearchDocument]
+
+
+class BatchSearchResponse(BaseModel):
+    n_queries: int
+    results: List[BatchSearchResult]
 
 
 class ChatResponse(BaseModel):
     query: str
-    top_documents: List[Dict]
+    top_documents: List[SearchDocument]
     response: str
+    session: Optional[Dict] = None
+
+
+async def resolve_rag(collection: Optional[str] = None):
+    """
+    Système RAG de la collection demandée (collection par défaut si absente),
+    chargé dans l'exécuteur s'il n'est pas en mémoire ; 404 si elle n'existe pas
+    Une collection autre que celle par défaut est comptée comme utilisée
+    jusqu'à release_rag (pas de libération par le registre entre-temps)
+    """
+    if not collection:
+        return await get_rag_system_async()
+    try:
+        return await run_blocking(get_collection_registry().acquire, collection)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+
+async def run_session(store, func, *args):
+    """
+    Opération sur les sessions : dans l'exécuteur si le store fait des
+    entrées/sorties (fichiers), directement pour les sessions en mémoire
+    """
+    if store.blocking:
+        return await run_blocking(func, *args)
+    return func(*args)
+
+
+async def release_rag(rag):
+    """
+    Rend le système pris par resolve_rag ; s'il a été évincé pendant la
+    requête, il est libéré dans l'exécuteur (verrou des requêtes ChromaDB)
+    """
+    registry = get_collection_registry()
+    if rag is not registry.default:
+        await run_blocking(registry.release, rag)
+
+
+async def retrieve(rag, query: str, n_results: int, mode: Optional[str] = None):
+    """
+    Embedding de la requête puis recherche selon le mode (dense, lexical, hybride),
+    via le micro-batcher s'il est activé (collection par défaut)
+    En mode lexical, aucun embedding n'est calculé (None)
+    """
+    mode = rag.resolve_search_mode(mode)
+    # Sur-échantillonnage pour le re-ranking (RERANK_ENABLED)
+    first_stage = rag.rerank_candidates(n_results)
+    if mode == "lexical":
+        top_documents = await rag.search_lexical_async(query, first_stage)
+        return None, await rag.rerank_async(query, top_documents, n_results)
+    
+    candidates = max(first_stage, rag.hybrid_candidates) if mode == "hybrid" else first_stage
+    if MICRO_BATCH_ENABLED and get_query_batcher().rag is rag:
+        query_embedding, top_documents = await get_query_batcher().search(query, candidates)
+    else:
+        query_embedding = await rag.embed_query_async(query)
+        top_documents = await rag.search_by_embedding_async(
+            query_embedding=query_embedding,
+            n_results=candidates
+        )
+    
+    if mode == "hybrid":
+        top_documents = await rag.search_hybrid_async(
+            query, query_embedding, first_stage, dense_results=top_documents
+        )
+    return query_embedding, await rag.rerank_async(query, top_documents, n_results)
+
+
+def is_cacheable(response: str) -> bool:
+    """
+    Seules les réponses du LLM (ou précalculées) entrent dans le cache de réponses :
+    une réponse de secours (LLM non configuré, en erreur, file pleine ou délai
+    dépassé) n'est jamais mise en cache, la question suivante retentera le LLM
+    """
+    return not isinstance(response, FallbackResponse)
+
+
+def collect_stats(rag, llm) -> dict:
+    """
+    Statistiques de /stats (appels bloquants : exécuté dans l'exécuteur partagé)
+    """
+    return {
+        "total_documents": rag.get_collection_count(),
+        "collection_name": rag.collection_name,
+        "status": "active",
+        "answer_cache": get_answer_cache().stats(),
+        "llm": llm.guard.stats(),
+        "answer_store": llm.answer_store.stats() if llm.answer_store is not None else None,
+        "micro_batching": get_query_batcher().stats() if MICRO_BATCH_ENABLED else None,
+        "retrieval": {
+            "default_mode": rag.resolve_search_mode(),
+            "lexical_documents": len(rag.lexical_index),
+            "lexical_index_bytes": rag.lexical_index.memory_bytes(),
+            "vector_engine": rag.vector_engine_stats()
+        },
+        "snapshot": rag.snapshot_reader.stats() if rag.snapshot_reader is not None else None,
+        "embedding": rag.embedding_stats(),
+        "collections": get_collection_registry().stats(),
+        "rerank": rag.reranker.stats() if rag.reranker is not None else None,
+        "sessions": get_conversation_manager().store.stats(),
+        "startup": startup_state
+    }
+
+
+def sse_event(event: str, data) -> str:
+    """
+    Formate un événement Server-Sent Events
+    """
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
 
 
 # ENDPOINT 1 : Route racine
@@ -42,31 +250,88 @@ async def root():
 
 
 # ENDPOINT 2 : Recherche de documents
-@app.post("/search")
-async def search_documents(search_query: SearchQuery):
+@app.post("/search", response_model=SearchResponse)
+async def search_documents(search_query: SearchQuery, request: Request):
     """
     Recherche les documents les plus pertinents pour une requête
     
     Args:
-        search_query: Objet contenant la requête et le nombre de résultats souhaités
+        search_query: Objet contenant la requête, le nombre de résultats souhaités
+                      et éventuellement les champs à retourner (fields)
+        request: Requête HTTP (Accept-Encoding, pour la compression gzip)
         
     Returns:
         Liste des documents les plus pertinents
     """
+    rag = await resolve_rag(search_query.collection)
     try:
-        rag = get_rag_system()
-        results = rag.search_documents(
-            query=search_query.query,
-            n_results=search_query.n_results
-        )
+        if MICRO_BATCH_ENABLED:
+            exact_match = rag.lookup_question(search_query.query)
+            if exact_match is not None and search_query.n_results <= 1:
+                results = [exact_match]
+            else:
+                _, results = await retrieve(
+                    rag, search_query.query, search_query.n_results, search_query.mode
+                )
+                if exact_match is not None:
+                    results = with_exact_match(exact_match, results, search_query.n_results)
+        else:
+            results = await rag.search_documents_async(
+                query=search_query.query,
+                n_results=search_query.n_results,
+                mode=search_query.mode
+            )
         
-        return {
+        return json_response({
             "query": search_query.query,
+            "mode": rag.resolve_search_mode(search_query.mode),
             "n_results": len(results),
-            "documents": results
-        }
+            "documents": select_fields(results, search_query.fields)
+        }, request.headers.get("accept-encoding"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
+    finally:
+        await release_rag(rag)
+
+
+# ENDPOINT 2 bis : Recherche par lot
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_documents_batch(batch_query: BatchSearchQuery, request: Request):
+    """
+    Recherche les documents pertinents pour plusieurs requêtes
+    en un seul passage d'embedding et une seule requête vectorisée
+    
+    Args:
+        batch_query: Objet contenant la liste des requêtes, le nombre de résultats
+                     par requête et éventuellement les champs à retourner (fields)
+        request: Requête HTTP (Accept-Encoding, pour la compression gzip)
+        
+    Returns:
+        Liste des résultats, dans l'ordre des requêtes
+    """
+    rag = await resolve_rag(batch_query.collection)
+    try:
+        batch_results = await rag.search_documents_batch_async(
+            queries=batch_query.queries,
+            n_results=batch_query.n_results,
+            mode=batch_query.mode
+        )
+        
+        return json_response({
+            "n_queries": len(batch_query.queries),
+            "results": [
+                {
+                    "query": query,
+                    "n_results": len(results),
+                    "documents": select_fields(results, batch_query.fields)
+                }
+                for query, results in zip(batch_query.queries, batch_results)
+            ]
+        }, request.headers.get("accept-encoding"))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche par lot: {str(e)}")
+    finally:
+        await release_rag(rag)
 
 
 # ENDPOINT 3 : Chat complet (recherche + génération)
@@ -82,49 +347,189 @@ async def chat(chat_query: ChatQuery):
     Returns:
         Réponse complète avec la query, les documents et la réponse générée
     """
+    # Récupérer le système RAG de la collection et le générateur LLM
+    rag = await resolve_rag(chat_query.collection)
     try:
-        # Récupérer le système RAG et le générateur LLM
-        rag = get_rag_system()
-        llm = get_llm_generator()
+        llm = await get_llm_generator_async()
         
-        # Rechercher les documents pertinents
-        top_documents = rag.search_documents(
-            query=chat_query.query,
-            n_results=5
-        )
+        cache = get_answer_cache()
         
-        # Générer la réponse
-        generated_response = llm.generate_response(
-            query=chat_query.query,
-            top_documents=top_documents
-        )
+        # Chemin rapide : question identique à une question de la FAQ
+        exact_match = rag.lookup_question(chat_query.query)
         
-        return ChatResponse(
-            query=chat_query.query,
-            top_documents=top_documents,
-            response=generated_response
-        )
+        # Session : une relance est réécrite avec les questions du sujet en cours,
+        # et les documents du tour précédent sont réutilisés s'ils la couvrent
+        session = None
+        search_query = chat_query.query
+        reused_documents = None
+        if chat_query.session_id:
+            manager = get_conversation_manager()
+            session_key = f"{rag.collection_name}/{chat_query.session_id}"
+            state, follow_up, search_query, reused_documents = await run_session(
+                manager.store, manager.plan, session_key, chat_query.query
+            )
+            if exact_match is not None:
+                # Une question de la FAQ ouvre un nouveau sujet
+                follow_up, search_query, reused_documents = False, chat_query.query, None
+        
+        if exact_match is not None:
+            top_documents = [exact_match]
+            if EXACT_MATCH_SKIP_LLM:
+                generated_response = exact_match["answer"]
+            else:
+                generated_response = await llm.generate_response_async(
+                    query=chat_query.query,
+                    top_documents=top_documents
+                )
+        elif reused_documents is not None:
+            # Relance couverte par les documents du tour précédent : pas de recherche
+            top_documents = reused_documents
+            generated_response = await llm.generate_response_async(
+                query=search_query,
+                top_documents=top_documents
+            )
+        else:
+            # Rechercher les documents pertinents
+            query_embedding, top_documents = await retrieve(rag, search_query, 5, chat_query.mode)
+            
+            # Réutiliser une réponse en cache (question proche, mêmes documents de la même collection)
+            # Le mode lexical ne calcule pas d'embedding : pas de cache sémantique
+            document_ids = [f"{rag.collection_name}/{doc['id']}" for doc in top_documents]
+            generated_response = None
+            if query_embedding is not None:
+                generated_response = cache.get(query_embedding, document_ids)
+            
+            if generated_response is None:
+                # Générer la réponse
+                generated_response = await llm.generate_response_async(
+                    query=search_query,
+                    top_documents=top_documents
+                )
+                # Jamais de réponse de secours dans le cache (voir is_cacheable)
+                if query_embedding is not None and is_cacheable(generated_response):
+                    cache.put(query_embedding, document_ids, generated_response)
+        
+        if chat_query.session_id:
+            await run_session(
+                manager.store, manager.record, session_key, state, chat_query.query, follow_up,
+                None if reused_documents is not None else top_documents
+            )
+            session = {
+                "id": chat_query.session_id,
+                "follow_up": follow_up,
+                "search_query": search_query,
+                "reused_documents": reused_documents is not None
+            }
+        
+        return FastJSONResponse({
+            "query": chat_query.query,
+            "top_documents": top_documents,
+            "response": generated_response,
+            "session": session
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors du chat: {str(e)}")
+    finally:
+        await release_rag(rag)
+
+
+# ENDPOINT 3 bis : Chat en streaming (Server-Sent Events)
+@app.post("/chat/stream")
+async def chat_stream(chat_query: ChatQuery, request: Request):
+    """
+    Version streaming de /chat : envoie d'abord les documents retrouvés
+    (événement "documents"), puis les morceaux de réponse au fil de la génération
+    (événements "token") et enfin un événement "done", ou un événement "error"
+    si la génération s'interrompt après le premier morceau
+    
+    Args:
+        chat_query: Objet contenant la question de l'utilisateur
+        request: Requête HTTP, utilisée pour détecter la déconnexion du client
+        
+    Returns:
+        Flux text/event-stream
+    """
+    rag = await resolve_rag(chat_query.collection)
+    try:
+        llm = await get_llm_generator_async()
+        
+        exact_match = rag.lookup_question(chat_query.query)
+        if exact_match is not None:
+            top_documents = [exact_match]
+        else:
+            _, top_documents = await retrieve(rag, chat_query.query, 5, chat_query.mode)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors du chat: {str(e)}")
+    finally:
+        await release_rag(rag)
+    
+    async def event_stream():
+        yield sse_event("documents", {
+            "query": chat_query.query,
+            "top_documents": top_documents
+        })
+        
+        if exact_match is not None and EXACT_MATCH_SKIP_LLM:
+            yield sse_event("token", {"text": exact_match["answer"]})
+        else:
+            tokens = llm.generate_response_stream(chat_query.query, top_documents)
+            try:
+                async for token in tokens:
+                    # Arrêter la génération si le client s'est déconnecté
+                    if await request.is_disconnected():
+                        return
+                    yield sse_event("token", {"text": token})
+            except LLMStreamError as e:
+                # Réponse incomplète : pas d'événement done
+                yield sse_event("error", {"detail": f"Génération interrompue: {e}"})
+                return
+            finally:
+                await tokens.aclose()
+        
+        yield sse_event("done", {})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ENDPOINT 3 ter : Fin d'une session de conversation
+@app.delete("/sessions/{session_id}")
+async def delete_session(
+    session_id: str,
+    collection: Optional[str] = Query(None, pattern=COLLECTION_PATTERN)
+):
+    """
+    Oublie l'état d'une session de conversation (404 si elle n'existe pas ou a expiré)
+    """
+    rag = await resolve_rag(collection)
+    try:
+        store = get_conversation_manager().store
+        if not await run_session(store, store.delete, f"{rag.collection_name}/{session_id}"):
+            raise HTTPException(status_code=404, detail=f"Session inconnue: {session_id}")
+    finally:
+        await release_rag(rag)
+    return {"session_id": session_id, "deleted": True}
 
 
 # ENDPOINT 4 : Statistiques de la base de données
 @app.get("/stats")
-async def get_stats():
+async def get_stats(collection: Optional[str] = Query(None, pattern=COLLECTION_PATTERN)):
     """
     Retourne des statistiques sur la base de données vectorielle
+    (collection par défaut, ou ?collection=nom)
     """
+    rag = await resolve_rag(collection)
     try:
-        rag = get_rag_system()
-        count = rag.get_collection_count()
-        
-        return {
-            "total_documents": count,
-            "collection_name": rag.collection_name,
-            "status": "active"
-        }
+        llm = await get_llm_generator_async()
+        # Comptage ChromaDB et tailles des index (verrous) hors de la boucle d'événements
+        return await run_blocking(collect_stats, rag, llm)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des stats: {str(e)}")
+    finally:
+        await release_rag(rag)
 
 
 # ENDPOINT 5 : Santé de l'application
@@ -139,6 +544,36 @@ async def health_check():
     }
 
 
+# ENDPOINT 6 : Disponibilité (préchauffage terminé)
+@app.get("/ready")
+async def readiness_check():
+    """
+    Indique si l'application est prête à servir le trafic
+    (503 tant que le préchauffage n'est pas terminé)
+    """
+    if startup_state["ready"]:
+        return {"status": "ready", "startup": startup_state}
+    
+    return JSONResponse(
+        status_code=503,
+        content={
+            "status": "error" if startup_state["error"] else "starting",
+            "startup": startup_state
+        }
+    )
+
+
+# ENDPOINT 7 : Métriques au format Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Histogrammes par étape, compteurs (fallbacks et erreurs LLM) et jauges
+    (taille de la collection et des caches) au format texte Prometheus
+    """
+    content = await run_blocking(get_metrics().render)
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     # Lancer le serveur
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Fixtures des tests : API en mémoire (httpx + ASGI) sur une collection
+temporaire du dataset de la FAQ, avec un embedding par hachage (hors ligne)
+
+Usage:
+    python -m pytest -q
+"""
+
+import sys
+import os
+import asyncio
+import shutil
+import tempfile
+
+# Ajouter le dossier parent au PYTHONPATH
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Configuration lue à l'import des modules : base temporaire, ni modèle ni clé API
+WORKDIR = tempfile.mkdtemp(prefix="tests_rag_")
+os.environ.update({
+    "CHROMA_PATH": os.path.join(WORKDIR, "chroma"),
+    "SNAPSHOT_SERVING_ENABLED": "false",
+    "EMBEDDING_CACHE_PATH": "",
+    "ANSWER_STORE_PATH": "",
+    "STARTUP_WARMUP": "false",
+    "LLM_BACKEND": "none",
+    "ANONYMIZED_TELEMETRY": "False",
+})
+
+import httpx
+import pytest
+from chromadb.utils import embedding_functions
+
+from benchmarks.bench_ingestion import HashEmbeddingFunction
+
+# Pas de téléchargement du modèle ONNX par défaut de ChromaDB
+embedding_functions.DefaultEmbeddingFunction = HashEmbeddingFunction
+
+import llm
+from helpers import answer_cache as cache_module
+from helpers import chromadb as rag_module
+from helpers.answer_cache import SemanticAnswerCache
+from helpers.llm_backends import Chunk
+from llm import LLMGenerator
+
+DATASET = os.path.join(ROOT, "ecommerce_faq_dataset.csv")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+class ScriptedModel:
+    """
+    LLM de substitution : chaque appel attend le délai suivant de delays
+    (le dernier est répété) puis répond "Réponse du LLM" (en morceaux si stream)
+    """
+
+    def __init__(self, delays=(0.0,), tokens: int = 1, token_delay: float = 0.0):
+        self.delays = list(delays)
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        if stream:
+            return self._chunks()
+        return Chunk("Réponse du LLM")
+
+    async def _chunks(self):
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield Chunk(f"mot{i} ")
+
+
+@pytest.fixture(scope="session")
+def rag():
+    """
+    Système RAG de la collection par défaut, alimenté avec le dataset de la FAQ
+    """
+    import pandas as pd
+    from helpers.dataset_loader import iter_records
+
+    system = rag_module.get_rag_system()
+    if system.get_collection_count() == 0:
+        df = pd.DataFrame(list(iter_records(DATASET)), columns=["Questions", "Answers"])
+        system.populate_vectorstore(df)
+    return system
+
+
+@pytest.fixture(autouse=True)
+def answer_cache():
+    """
+    Cache de réponses vide pour chaque test
+    """
+    cache_module.answer_cache = SemanticAnswerCache()
+    yield cache_module.answer_cache
+    cache_module.answer_cache = None
+
+
+@pytest.fixture
+def generator():
+    """
+    Générateur LLM global sans modèle ; les tests y branchent un ScriptedModel
+    """
+    previous = llm.llm_generator
+    llm.llm_generator = LLMGenerator(backend="none")
+    yield llm.llm_generator
+    llm.llm_generator = previous
+
+
+def use_model(generator: LLMGenerator, model):
+    generator.model = model
+    generator.use_model = True
+    return model
+
+
+def request(method: str, path: str, **kwargs) -> httpx.Response:
+    """
+    Requête sur l'application en mémoire (réponse lue en entier)
+    """
+    from main import app
+
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(send())
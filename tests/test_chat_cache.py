@@ -0,0 +1,48 @@
+"""
+Cache sémantique des réponses de /chat : seules les réponses du LLM y entrent
+"""
+
+from conftest import ScriptedModel, request, use_model
+
+QUERY = "I would like to know how to track my package please"
+
+
+def test_timeout_fallback_is_not_cached(rag, generator, answer_cache):
+    # Premier appel au-delà du délai du garde, puis le LLM répond à temps
+    model = use_model(generator, ScriptedModel(delays=[0.5, 0.0]))
+    generator.guard.timeout_seconds = 0.1
+
+    degraded = request("POST", "/chat", json={"query": QUERY})
+    assert degraded.status_code == 200
+    assert degraded.json()["response"].startswith("Basé sur notre FAQ")
+    assert answer_cache.stats()["entries"] == 0
+
+    recovered = request("POST", "/chat", json={"query": QUERY})
+    assert recovered.json()["response"] == "Réponse du LLM"
+    assert model.calls == 2
+    assert answer_cache.stats()["entries"] == 1
+
+
+class FailingModel:
+    """
+    LLM de substitution toujours en erreur
+    """
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        raise RuntimeError("LLM indisponible")
+
+
+def test_not_configured_fallback_is_not_cached(rag, generator, answer_cache):
+    response = request("POST", "/chat", json={"query": QUERY})
+    assert response.status_code == 200
+    assert response.json()["response"].startswith("Basé sur notre FAQ")
+    assert answer_cache.stats()["entries"] == 0
+
+
+def test_error_fallback_is_not_cached(rag, generator, answer_cache):
+    use_model(generator, FailingModel())
+
+    response = request("POST", "/chat", json={"query": QUERY})
+    assert response.status_code == 200
+    assert response.json()["response"].startswith("Basé sur notre FAQ")
+    assert answer_cache.stats()["entries"] == 0
@@ -0,0 +1,66 @@
+"""
+/chat/stream : les événements partent au fil de la génération
+"""
+
+import asyncio
+import json
+import time
+
+from conftest import ScriptedModel, use_model
+
+QUERY = "I would like to know how to track my package please"
+
+
+async def stream_events(path: str, payload: dict):
+    """
+    Appelle l'application ASGI directement (httpx.ASGITransport lit la réponse
+    en entier) et retourne les morceaux du corps avec leur instant d'arrivée
+    """
+    from main import app
+
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "server": ("test", 80), "client": ("test", 1234),
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())],
+    }
+    received = []
+    done = asyncio.Event()
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    chunks = []
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            if message.get("body"):
+                chunks.append((time.perf_counter(), message["body"].decode("utf-8")))
+            if not message.get("more_body"):
+                done.set()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return [(at - start, text) for at, text in chunks]
+
+
+def test_first_event_is_sent_before_the_completion(rag, generator):
+    # 5 morceaux espacés de 0,2 s : la réponse complète arrive après ~0,8 s
+    use_model(generator, ScriptedModel(tokens=5, token_delay=0.2))
+
+    chunks = asyncio.run(stream_events("/chat/stream", {"query": QUERY}))
+    events = [(at, text.split("\n", 1)[0]) for at, text in chunks]
+    tokens = [at for at, event in events if event == "event: token"]
+
+    assert events[0][1] == "event: documents"
+    assert events[-1][1] == "event: done"
+    assert len(tokens) == 5
+    # Documents et premier morceau envoyés bien avant la fin de la génération
+    assert events[0][0] < tokens[-1] - 0.6
+    assert tokens[0] < tokens[-1] - 0.6
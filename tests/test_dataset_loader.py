@@ -0,0 +1,73 @@
+"""
+Chargement en flux du dataset : mémoire bornée, élément invalide signalé
+"""
+
+import io
+import json
+import os
+
+import pytest
+
+from conftest import WORKDIR
+from helpers import dataset_loader
+from helpers.dataset_loader import _iter_json_array, iter_dataframes
+
+
+def record(i: int) -> str:
+    return json.dumps({"question": f"Question {i} about order {i}?", "answer": f"Answer {i}: " + "details " * 20})
+
+
+class CountingReader(io.StringIO):
+    """
+    Fichier en mémoire qui compte les caractères lus
+    """
+
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.read_chars = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.read_chars += len(chunk)
+        return chunk
+
+
+@pytest.fixture
+def small_reads(monkeypatch):
+    monkeypatch.setattr(dataset_loader, "READ_SIZE", 4096)
+    monkeypatch.setattr(dataset_loader, "MAX_ELEMENT_SIZE", 4 * 4096)
+
+
+def test_generated_file_is_read_in_bounded_chunks(small_reads):
+    path = os.path.join(WORKDIR, "generated.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"questions": [' + ",\n".join(record(i) for i in range(5000)) + "]}")
+
+    chunks = list(iter_dataframes(path, chunk_size=1000))
+    assert [len(chunk) for chunk in chunks] == [1000] * 5
+    assert chunks[-1].index[-1] == 4999
+
+    # Lecture en avance bornée : jamais plus de deux lectures devant l'élément produit
+    text = open(path, encoding="utf-8").read()
+    reader = CountingReader(text)
+    position = 0
+    for item in _iter_json_array(reader, '"questions"'):
+        position = text.index(json.dumps(item), position)
+        assert reader.read_chars - position <= 2 * 4096 + len(json.dumps(item))
+
+
+def test_malformed_element_stops_with_a_clear_error(small_reads):
+    valid = ",".join(record(i) for i in range(10))
+    malformed = '{"question": "Broken?", "answer": "missing comma" "oops": 1}'
+    text = "[" + valid + "," + malformed + "," + ",".join(record(i) for i in range(1000)) + "]"
+    reader = CountingReader(text)
+
+    items = []
+    with pytest.raises(ValueError, match="Élément JSON invalide"):
+        for item in _iter_json_array(reader):
+            items.append(item)
+
+    assert len(items) == 10
+    # Le tampon n'a pas grossi jusqu'à la fin du fichier
+    assert reader.read_chars <= text.index(malformed) + 4 * 4096 + 2 * 4096
+    assert reader.read_chars < len(text)
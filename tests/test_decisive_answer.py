@@ -0,0 +1,47 @@
+"""
+Réponses sans LLM pour un premier document décisif : le store précalculé
+(SQLite) est lu hors de la boucle d'événements
+"""
+
+import asyncio
+import os
+import threading
+
+from conftest import WORKDIR
+from helpers.answer_store import PrecomputedAnswerStore
+from helpers.chromadb import content_hash
+
+DOCUMENTS = [
+    {"id": "faq_1", "question": "How do I track my order?", "answer": "Use the tracking link.", "distance": 0.05},
+    {"id": "faq_2", "question": "Can I cancel my order?", "answer": "Yes, before shipping.", "distance": 0.6},
+]
+
+
+class ThreadRecordingStore(PrecomputedAnswerStore):
+    """
+    Store qui note le thread de chaque lecture
+    """
+
+    def lookup(self, document):
+        self.threads.append(threading.get_ident())
+        return super().lookup(document)
+
+
+def test_precomputed_answer_is_read_off_the_event_loop(generator):
+    store = ThreadRecordingStore(os.path.join(WORKDIR, "answers.sqlite"))
+    store.threads = []
+    first = DOCUMENTS[0]
+    store.put_many([(first["id"], content_hash(first["question"], first["answer"]), "Réponse précalculée")])
+    generator.answer_store = store
+    generator.context_builder.decisive_distance = 0.2
+
+    async def ask():
+        response = await generator.generate_response_async("Where is my order?", DOCUMENTS)
+        streamed = [chunk async for chunk in generator.generate_response_stream("Where is my order?", DOCUMENTS)]
+        return response, streamed, threading.get_ident()
+
+    response, streamed, loop_thread = asyncio.run(ask())
+    assert response == "Réponse précalculée"
+    assert streamed == ["Réponse précalculée"]
+    assert len(store.threads) == 2
+    assert loop_thread not in store.threads
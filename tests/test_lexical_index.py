@@ -0,0 +1,49 @@
+"""
+Index BM25 : estimation de la mémoire tenue à jour à l'indexation
+"""
+
+import sys
+
+from conftest import request
+from helpers.lexical_index import LexicalIndex
+
+
+def walk_bytes(index: LexicalIndex) -> int:
+    """
+    Estimation par parcours complet de l'index (référence du test)
+    """
+    postings = sys.getsizeof(index._postings) + sum(
+        sys.getsizeof(term) + sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[1])
+        for term, entry in index._postings.items()
+    )
+    ids = sys.getsizeof(index._ids) + sys.getsizeof(index._slots) + sum(
+        sys.getsizeof(doc_id) for doc_id in index._slots
+    )
+    return postings + ids + sys.getsizeof(index._lengths) + sys.getsizeof(index._alive)
+
+
+def metadata(i: int) -> dict:
+    return {"question": f"question {i} commande {i % 7}", "answer": f"réponse {i} livraison suivi colis"}
+
+
+def test_memory_bytes_tracks_index():
+    index = LexicalIndex()
+    index.add_many([f"doc{i}" for i in range(2000)], [metadata(i) for i in range(2000)])
+    # Seule l'allocation en avance des tableaux n'est pas comptée
+    assert 0.9 * walk_bytes(index) <= index.memory_bytes() <= walk_bytes(index)
+
+    # Remplacement : de nouveaux postings, pas de nouvel identifiant
+    before = index.memory_bytes()
+    index.add("doc0", metadata(1))
+    assert index.memory_bytes() > before
+
+    index.clear()
+    assert index.memory_bytes() == walk_bytes(index)
+
+
+def test_stats_reports_lexical_index_bytes(rag):
+    response = request("GET", "/stats")
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["total_documents"] == rag.get_collection_count()
+    assert stats["retrieval"]["lexical_index_bytes"] == rag.lexical_index.memory_bytes()
@@ -0,0 +1,42 @@
+"""
+/search et /search/batch : une question exacte de la FAQ en tête, complétée par la recherche
+"""
+
+import pytest
+
+from conftest import request
+import main
+
+
+@pytest.fixture(params=[False, True], ids=["direct", "micro-batch"])
+def micro_batch(request, monkeypatch):
+    monkeypatch.setattr(main, "MICRO_BATCH_ENABLED", request.param)
+    return request.param
+
+
+def test_exact_match_first_then_retrieval(rag, micro_batch):
+    question = rag.collection.get(limit=1, include=["metadatas"])["metadatas"][0]["question"]
+    match = rag.lookup_question(question)
+
+    documents = request("POST", "/search", json={"query": question, "n_results": 5}).json()["documents"]
+    ids = [doc["id"] for doc in documents]
+    assert len(ids) == 5
+    assert ids[0] == match["id"]
+    assert documents[0]["distance"] == 0.0
+    assert len(set(ids)) == 5
+
+    single = request("POST", "/search", json={"query": question, "n_results": 1}).json()["documents"]
+    assert [doc["id"] for doc in single] == [match["id"]]
+
+
+def test_batch_exact_match_first(rag):
+    question = rag.collection.get(limit=1, include=["metadatas"])["metadatas"][0]["question"]
+    match = rag.lookup_question(question)
+
+    results = request(
+        "POST", "/search/batch", json={"queries": [question, "where is my parcel"], "n_results": 3}
+    ).json()["results"]
+    ids = [doc["id"] for doc in results[0]["documents"]]
+    assert ids[0] == match["id"]
+    assert len(ids) == len(set(ids)) == 3
+    assert len(results[1]["documents"]) == 3
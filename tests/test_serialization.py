@@ -0,0 +1,42 @@
+"""
+Compression gzip des réponses JSON selon Accept-Encoding
+"""
+
+import gzip
+
+import pytest
+
+from helpers import serialization
+from helpers.serialization import accepts_gzip, json_response
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("br;q=1.0, GZIP;q=0.5", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.0, deflate", False),
+    ("identity;q=1, *;q=0", False),
+    ("*", True),
+    ("br, *;q=0.1", True),
+    ("*;q=1, gzip;q=0", False),
+    ("x-gzip", True),
+    ("gzipped", False),
+    ("gzip;q=abc", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_json_response_respects_q_zero(monkeypatch):
+    monkeypatch.setattr(serialization, "GZIP_MIN_BYTES", 10)
+    content = {"documents": [{"id": f"faq_{i}", "answer": "réponse " * 10} for i in range(20)]}
+
+    refused = json_response(content, "gzip;q=0, identity")
+    assert "content-encoding" not in refused.headers
+
+    accepted = json_response(content, "deflate;q=0.5, gzip;q=0.8")
+    assert accepted.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(accepted.body) == refused.body
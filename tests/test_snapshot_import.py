@@ -0,0 +1,45 @@
+"""
+Restauration d'un snapshot : la collection reproduit exactement le snapshot
+"""
+
+import os
+
+import pandas as pd
+
+from conftest import DATASET, WORKDIR
+from helpers.chromadb import RAGSystem
+from helpers.dataset_loader import iter_records
+from helpers.snapshot import export_snapshot, import_snapshot
+
+
+def collection_state(system: RAGSystem):
+    page = system.collection.get(include=["metadatas", "documents"])
+    return {
+        doc_id: (metadata, document)
+        for doc_id, metadata, document in zip(page["ids"], page["metadatas"], page["documents"])
+    }
+
+
+def test_import_restores_snapshot_exactly():
+    system = RAGSystem("tests_snapshot_import")
+    rows = list(iter_records(DATASET))[:20]
+    system.populate_vectorstore(pd.DataFrame(rows, columns=["Questions", "Answers"]))
+    path = os.path.join(WORKDIR, "restore.snapshot")
+    export_snapshot(system, path)
+    # État de référence : un premier import (index des lignes du snapshot)
+    import_snapshot(system, path)
+    expected = collection_state(system)
+
+    # Après le snapshot : un document ajouté, un autre regroupé avec une formulation
+    system.populate_vectorstore(pd.DataFrame([("Is there a gift card?", "Yes, from 10 to 500 euros.")],
+                                             columns=["Questions", "Answers"]))
+    doc_id, (metadata, _) = next(iter(expected.items()))
+    system.collection.update(ids=[doc_id], metadatas=[{
+        **metadata, "alternate_questions": "Another wording?", "group_size": 2, "members_hash": "x"
+    }])
+    assert len(collection_state(system)) == len(expected) + 1
+
+    assert import_snapshot(system, path) == len(expected)
+    assert collection_state(system) == expected
+    assert system.lookup_question("Is there a gift card?") is None
+    assert system.lookup_question("Another wording?") is None
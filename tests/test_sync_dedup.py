@@ -0,0 +1,67 @@
+"""
+Synchronisation avec regroupement des quasi-doublons : les groupes inchangés
+ne sont pas réembeddés
+"""
+
+import pandas as pd
+import pytest
+
+from conftest import DATASET
+from helpers.chromadb import RAGSystem
+from helpers.dataset_loader import iter_records
+from helpers.ingestion import BulkIngestor
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    """
+    Nombre de documents embeddés par le pipeline d'ingestion
+    """
+    counter = {"documents": 0}
+    embed_batches = BulkIngestor._embed_batches
+
+    def counting(self, documents):
+        counter["documents"] += len(documents)
+        return embed_batches(self, documents)
+
+    monkeypatch.setattr(BulkIngestor, "_embed_batches", counting)
+    return counter
+
+
+def faq_with_rephrasings() -> pd.DataFrame:
+    """
+    FAQ du dataset, plus deux reformulations de chacune des 5 premières questions
+    """
+    rows = list(iter_records(DATASET))
+    for question, answer in rows[:5]:
+        rows.append((f"{question} (please)", answer))
+        rows.append((f"Quick question: {question}", answer))
+    return pd.DataFrame(rows, columns=["Questions", "Answers"])
+
+
+def test_second_sync_embeds_nothing(embedded):
+    system = RAGSystem("tests_sync_dedup")
+    # Embedding par hachage : les groupes sont décidés par les réponses
+    system.dedup_settings = {**system.dedup_settings, "enabled": True, "embedding_threshold": 0.0}
+    df = faq_with_rephrasings()
+
+    first = system.sync_vectorstore(df, workers=1)
+    assert first["near_duplicates_collapsed"] >= 10
+    assert embedded["documents"] == len(df)
+
+    embedded["documents"] = 0
+    second = system.sync_vectorstore(df, workers=1)
+    assert embedded["documents"] == 0
+    assert (second["added"], second["updated"], second["deleted"]) == (0, 0, 0)
+    assert second["near_duplicates_collapsed"] == first["near_duplicates_collapsed"]
+    assert system.get_collection_count() == len(df) - first["near_duplicates_collapsed"]
+
+    # Nouvelle reformulation : seul son groupe est regroupé à nouveau
+    question, answer = df.iloc[0]["Questions"], df.iloc[0]["Answers"]
+    grown = pd.concat([df, pd.DataFrame([(f"Hello, {question}", answer)], columns=["Questions", "Answers"])])
+    grown.index = range(len(grown))
+    third = system.sync_vectorstore(grown, workers=1)
+    assert embedded["documents"] == 4
+    assert third["near_duplicates_collapsed"] == first["near_duplicates_collapsed"] + 1
+    assert system.get_collection_count() == len(df) - first["near_duplicates_collapsed"]
+    assert system.lookup_question(f"Hello, {question}") is not None